@@ -45,6 +45,13 @@ package memory_loader_pkg is
     open_status      : in file_open_status;
     fail_if_notfound : in boolean);
 
+  -- Read a word from a line of an initialization file.  The line has either
+  -- one binary digit per bit of WORD ("bram" format of mem_init_gen.py), or
+  -- one hexadecimal digit per 4 bits ("hex" format), most significant first.
+  procedure f_read_init_word (
+    l    : inout line;
+    word : out std_logic_vector);
+
   impure function f_load_mem_from_file
     (file_name : in string;
      mem_size  : in integer;
@@ -98,6 +105,77 @@ package body memory_loader_pkg is
     end if;
   end procedure f_file_open_check;
 
+  function f_hex_digit (
+    c : character)
+    return std_logic_vector is
+  begin
+    case c is
+      when '0'       => return "0000";
+      when '1'       => return "0001";
+      when '2'       => return "0010";
+      when '3'       => return "0011";
+      when '4'       => return "0100";
+      when '5'       => return "0101";
+      when '6'       => return "0110";
+      when '7'       => return "0111";
+      when '8'       => return "1000";
+      when '9'       => return "1001";
+      when 'a' | 'A' => return "1010";
+      when 'b' | 'B' => return "1011";
+      when 'c' | 'C' => return "1100";
+      when 'd' | 'D' => return "1101";
+      when 'e' | 'E' => return "1110";
+      when 'f' | 'F' => return "1111";
+      when others =>
+        report "f_load_mem_from_file(): invalid hexadecimal digit '"&c&"'" severity FAILURE;
+        return "0000";
+    end case;
+  end function f_hex_digit;
+
+  procedure f_read_init_word (
+    l    : inout line;
+    word : out std_logic_vector) is
+    constant c_width  : integer := word'length;
+    constant c_digits : integer := (c_width+3)/4;
+    variable res      : std_logic_vector(4*c_digits-1 downto 0) := (others => '0');
+    variable buf      : string(1 to c_width);
+    variable n        : integer := 0;
+    variable c        : character;
+    variable good     : boolean;
+  begin
+    loop
+      read (l, c, good);
+      exit when not good;
+      if c /= ' ' and c /= HT and c /= CR then
+        if n = c_width then
+          report "f_load_mem_from_file(): more than "&integer'image(c_width)&" digits in a line" severity FAILURE;
+          exit;
+        end if;
+        n      := n + 1;
+        buf(n) := c;
+      end if;
+    end loop;
+
+    if n = c_width then
+      for I in 1 to n loop
+        if buf(I) = '1' then
+          res(n-I) := '1';
+        elsif buf(I) /= '0' then
+          report "f_load_mem_from_file(): invalid binary digit '"&buf(I)&"'" severity FAILURE;
+        end if;
+      end loop;
+    elsif n = c_digits then
+      -- 4 bits at once
+      for I in 1 to n loop
+        res(4*(n-I)+3 downto 4*(n-I)) := f_hex_digit(buf(I));
+      end loop;
+    else
+      report "f_load_mem_from_file(): "&integer'image(n)&" digits in a line for "
+        &integer'image(c_width)&"-bit words" severity FAILURE;
+    end if;
+    word := res(c_width-1 downto 0);
+  end procedure f_read_init_word;
+
   impure function f_load_mem_from_file
     (file_name        : in string;
      mem_size         : in integer;
@@ -107,7 +185,6 @@ package body memory_loader_pkg is
 
     FILE f_in  : text;
     variable l : line;
-    variable tmp_bv : bit_vector(mem_width-1 downto 0);
     variable tmp_sv : std_logic_vector(mem_width-1 downto 0);
     variable mem: t_meminit_array(0 to mem_size-1, mem_width-1 downto 0) := (others => (others => '0'));
     variable status   : file_open_status;
@@ -123,12 +200,10 @@ package body memory_loader_pkg is
     for I in 0 to mem_size-1 loop
       if not endfile(f_in) then
         readline (f_in, l);
-        -- read function gives us bit_vector
-        read (l, tmp_bv);
+        f_read_init_word (l, tmp_sv);
       else
-        tmp_bv := (others => '0');
+        tmp_sv := (others => '0');
       end if;
-      tmp_sv := to_stdlogicvector(tmp_bv);
       for J in 0 to mem_width-1 loop
         mem(i, j) := tmp_sv(j);
       end loop;
@@ -154,7 +229,6 @@ package body memory_loader_pkg is
 
     FILE f_in  : text;
     variable l : line;
-    variable tmp_bv : bit_vector(31 downto 0);
     variable mem: t_ram32_type(0 to mem_size-1) := (others => (others => '0'));
     variable status   : file_open_status;
   begin
@@ -167,14 +241,10 @@ package body memory_loader_pkg is
     f_file_open_check (file_name, status, fail_if_notfound);
 
     for I in 0 to mem_size-1 loop
-      if not endfile(f_in) then
-        readline (f_in, l);
-        -- read function gives us bit_vector
-        read (l, tmp_bv);
-      else
-        tmp_bv := (others => '0');
-      end if;
-      mem(I) := to_stdlogicvector(tmp_bv);
+      exit when endfile(f_in);
+      readline (f_in, l);
+      -- whole words, the rest of the memory is already cleared
+      f_read_init_word (l, mem(I));
     end loop;
 
     if not endfile(f_in) then
@@ -195,7 +265,6 @@ package body memory_loader_pkg is
 
     FILE f_in  : text;
     variable l : line;
-    variable tmp_bv : bit_vector(15 downto 0);
     variable mem: t_ram16_type(0 to mem_size-1) := (others => (others => '0'));
     variable status   : file_open_status;
   begin
@@ -208,14 +277,10 @@ package body memory_loader_pkg is
     f_file_open_check (file_name, status, fail_if_notfound);
 
     for I in 0 to mem_size-1 loop
-      if not endfile(f_in) then
-        readline (f_in, l);
-        -- read function gives us bit_vector
-        read (l, tmp_bv);
-      else
-        tmp_bv := (others => '0');
-      end if;
-      mem(I) := to_stdlogicvector(tmp_bv);
+      exit when endfile(f_in);
+      readline (f_in, l);
+      -- whole words, the rest of the memory is already cleared
+      f_read_init_word (l, mem(I));
     end loop;
 
     if not endfile(f_in) then
@@ -236,7 +301,6 @@ package body memory_loader_pkg is
 
     FILE f_in  : text;
     variable l : line;
-    variable tmp_bv : bit_vector(7 downto 0);
     variable mem: t_ram8_type(0 to mem_size-1) := (others => (others => '0'));
     variable status   : file_open_status;
   begin
@@ -249,14 +313,10 @@ package body memory_loader_pkg is
     f_file_open_check (file_name, status, fail_if_notfound);
 
     for I in 0 to mem_size-1 loop
-      if not endfile(f_in) then
-        readline (f_in, l);
-        -- read function gives us bit_vector
-        read (l, tmp_bv);
-      else
-        tmp_bv := (others => '0');
-      end if;
-      mem(I) := to_stdlogicvector(tmp_bv);
+      exit when endfile(f_in);
+      readline (f_in, l);
+      -- whole words, the rest of the memory is already cleared
+      f_read_init_word (l, mem(I));
     end loop;
 
     if not endfile(f_in) then
@@ -280,7 +340,7 @@ package body memory_loader_pkg is
 
     FILE f_in  : text;
     variable l : line;
-    variable tmp_bv : bit_vector(31 downto 0);
+    variable tmp_sv : std_logic_vector(31 downto 0);
     variable mem: t_ram8_type(0 to mem_size-1) := (others => (others => '0'));
     variable status   : file_open_status;
   begin
@@ -293,14 +353,10 @@ package body memory_loader_pkg is
     f_file_open_check (file_name, status, fail_if_notfound);
 
     for I in 0 to mem_size-1 loop
-      if not endfile(f_in) then
-        readline (f_in, l);
-        -- read function gives us bit_vector
-        read (l, tmp_bv);
-      else
-        tmp_bv := (others => '0');
-      end if;
-      mem(I) := to_stdlogicvector( tmp_bv((byte_idx+1)*8-1 downto byte_idx*8) );
+      exit when endfile(f_in);
+      readline (f_in, l);
+      f_read_init_word (l, tmp_sv);
+      mem(I) := tmp_sv((byte_idx+1)*8-1 downto byte_idx*8);
     end loop;
 
     if not endfile(f_in) then
@@ -101,8 +101,8 @@ architecture syn of generic_dpram_inst_7series is
     for I in 0 to mem_size-1 loop
       if not endfile(f_in) then
         readline (f_in, l);
-        -- read function gives us bit_vector
-        read (l, tmp_bv);
+        f_read_init_word (l, tmp_sv);
+        tmp_bv := to_bitvector(tmp_sv);
       else
         tmp_bv := (others => '0');
       end if;
@@ -96,15 +96,27 @@ architecture syn of generic_dpram_sameclock is
       return tmp;
     end if;
 
-    arr := f_load_mem_from_file(g_init_file, g_size, g_data_width, g_fail_if_file_not_found);
+    -- Whole words for the common widths, bit per bit otherwise
+    case g_data_width is
+      when 32     => mem32 := f_load_mem32_from_file(g_init_file, g_size, g_fail_if_file_not_found);
+      when 16     => mem16 := f_load_mem16_from_file(g_init_file, g_size, g_fail_if_file_not_found);
+      when 8      => mem8  := f_load_mem8_from_file(g_init_file, g_size, g_fail_if_file_not_found);
+      when others => arr   := f_load_mem_from_file(g_init_file, g_size, g_data_width, g_fail_if_file_not_found);
+    end case;
     pos := 0;
     while(pos < g_size)loop
       n := 0;
       -- avoid ISE loop iteration limit
       while (pos < g_size and n < 4096) loop
-        for i in 0 to g_data_width-1 loop
-          tmp(pos)(i) := arr(pos, i);
-        end loop;  -- i
+        case g_data_width is
+          when 32 => tmp(pos) := std_logic_vector(resize(unsigned(mem32(pos)), g_data_width));
+          when 16 => tmp(pos) := std_logic_vector(resize(unsigned(mem16(pos)), g_data_width));
+          when 8  => tmp(pos) := std_logic_vector(resize(unsigned(mem8(pos)), g_data_width));
+          when others =>
+            for i in 0 to g_data_width-1 loop
+              tmp(pos)(i) := arr(pos, i);
+            end loop;  -- i
+        end case;
         n   := n+1;
         pos := pos + 1;
       end loop;
@@ -0,0 +1,140 @@
+# Generated by wb_regs.py from wb_fpgen_regs.cheby; do not edit
+#
+# Needs wb_regs.py (tools directory of general-cores) in the Python path.
+
+import wb_regs
+from wb_regs import Field
+
+
+class wb_fpgen_regs(wb_regs.Block):
+    """Generic Fine Pulse Generator Unit"""
+
+    _size = 0x38
+    _big_endian = True
+
+    class csr(wb_regs.Reg):
+        """Control/Status Register"""
+        _address = 0x0
+        _volatile = True
+        TRIG0 = Field(0, 1, 'Trigger Pulse @ Output 0 at next PPS', pulse=True)
+        TRIG1 = Field(1, 1, 'Trigger Pulse @ Output 1 at next PPS', pulse=True)
+        TRIG2 = Field(2, 1, 'Trigger Pulse @ Output 2 at next PPS', pulse=True)
+        TRIG3 = Field(3, 1, 'Trigger Pulse @ Output 3 at next PPS', pulse=True)
+        TRIG4 = Field(4, 1, 'Trigger Pulse @ Output 4 at next PPS', pulse=True)
+        TRIG5 = Field(5, 1, 'Trigger Pulse @ Output 5 at next PPS', pulse=True)
+        TRIG6 = Field(6, 1, 'Trigger Pulse @ Output 6 at next PPS', pulse=True)
+        TRIG7 = Field(7, 1, 'Trigger Pulse @ Output 7 at next PPS', pulse=True)
+        FORCE0 = Field(8, 1, 'Trigger Pulse @ Output 0 immediately', pulse=True)
+        FORCE1 = Field(9, 1, 'Trigger Pulse @ Output 1 immediately', pulse=True)
+        FORCE2 = Field(10, 1, 'Trigger Pulse @ Output 2 immediately', pulse=True)
+        FORCE3 = Field(11, 1, 'Trigger Pulse @ Output 3 immediately', pulse=True)
+        FORCE4 = Field(12, 1, 'Trigger Pulse @ Output 4 immediately', pulse=True)
+        FORCE5 = Field(13, 1, 'Trigger Pulse @ Output 5 immediately', pulse=True)
+        READY = Field(14, 6, 'Pulse Generator Ready')
+        PLL_RST = Field(20, 1, 'PLL Reset')
+        SERDES_RST = Field(21, 1, 'Serdes Reset')
+        PLL_LOCKED = Field(22, 1, 'PLL Locked')
+
+    class OCR0A(wb_regs.Reg):
+        """Output 0 Control Register A"""
+        _address = 0x4
+        FINE = Field(0, 12, 'Fine delay adjust')
+        POL = Field(12, 1, 'Polarity')
+        COARSE = Field(13, 5, 'Serdes Bitmask')
+        CONT = Field(18, 1, 'Continuous mode select')
+        TRIG_SEL = Field(19, 1, 'Trigger select\n\n1: external trigger; 0: PPS')
+
+    class OCR0B(wb_regs.Reg):
+        """Output 0 Control Register B"""
+        _address = 0x8
+        PPS_OFFS = Field(0, 16, 'WR PPS offset in reference clock cycles')
+        LENGTH = Field(16, 16, 'Pulse Length (target platform specific, 0 = minimum possible pulse width)')
+
+    class OCR1A(wb_regs.Reg):
+        """Output 0 Control Register A"""
+        _address = 0xc
+        FINE = Field(0, 12, 'Fine delay adjust')
+        POL = Field(12, 1, 'Polarity')
+        COARSE = Field(13, 5, 'Serdes Bitmask')
+        CONT = Field(18, 1, 'Continuous mode select')
+        TRIG_SEL = Field(19, 1, 'Trigger select\n\n1: external trigger; 0: PPS')
+
+    class OCR1B(wb_regs.Reg):
+        """Output 1 Control Register B"""
+        _address = 0x10
+        PPS_OFFS = Field(0, 16, 'WR PPS offset in reference clock cycles')
+        LENGTH = Field(16, 16, 'Pulse Length (target platform specific, 0 = minimum possible pulse width)')
+
+    class OCR2A(wb_regs.Reg):
+        """Output 2 Control Register A"""
+        _address = 0x14
+        FINE = Field(0, 12, 'Fine delay adjust')
+        POL = Field(12, 1, 'Polarity')
+        COARSE = Field(13, 5, 'Serdes Bitmask')
+        CONT = Field(18, 1, 'Continuous mode select')
+        TRIG_SEL = Field(19, 1, 'Trigger select\n\n1: external trigger; 0: PPS')
+
+    class OCR2B(wb_regs.Reg):
+        """Output 2 Control Register B"""
+        _address = 0x18
+        PPS_OFFS = Field(0, 16, 'WR PPS offset in reference clock cycles')
+        LENGTH = Field(16, 16, 'Pulse Length (target platform specific, 0 = minimum possible pulse width)')
+
+    class OCR3A(wb_regs.Reg):
+        """Output 3 Control Register A"""
+        _address = 0x1c
+        FINE = Field(0, 12, 'Fine delay adjust')
+        POL = Field(12, 1, 'Polarity')
+        COARSE = Field(13, 5, 'Serdes Bitmask')
+        CONT = Field(18, 1, 'Continuous mode select')
+        TRIG_SEL = Field(19, 1, 'Trigger select\n\n1: external trigger; 0: PPS')
+
+    class OCR3B(wb_regs.Reg):
+        """Output 3 Control Register B"""
+        _address = 0x20
+        PPS_OFFS = Field(0, 16, 'WR PPS offset in reference clock cycles')
+        LENGTH = Field(16, 16, 'Pulse Length (target platform specific, 0 = minimum possible pulse width)')
+
+    class OCR4A(wb_regs.Reg):
+        """Output 4 Control Register A"""
+        _address = 0x24
+        FINE = Field(0, 12, 'Fine delay adjust')
+        POL = Field(12, 1, 'Polarity')
+        COARSE = Field(13, 5, 'Serdes Bitmask')
+        CONT = Field(18, 1, 'Continuous mode select')
+        TRIG_SEL = Field(19, 1, 'Trigger select\n\n1: external trigger; 0: PPS')
+
+    class OCR4B(wb_regs.Reg):
+        """Output 4 Control Register B"""
+        _address = 0x28
+        PPS_OFFS = Field(0, 16, 'WR PPS offset in reference clock cycles')
+        LENGTH = Field(16, 16, 'Pulse Length (target platform specific, 0 = minimum possible pulse width)')
+
+    class OCR5A(wb_regs.Reg):
+        """Output 5 Control Register A"""
+        _address = 0x2c
+        FINE = Field(0, 12, 'Fine delay adjust')
+        POL = Field(12, 1, 'Polarity')
+        COARSE = Field(13, 5, 'Serdes Bitmask')
+        CONT = Field(18, 1, 'Continuous mode select')
+        TRIG_SEL = Field(19, 1, 'Trigger select\n\n1: external trigger; 0: PPS')
+
+    class OCR5B(wb_regs.Reg):
+        """Output 5 Control Register B"""
+        _address = 0x30
+        PPS_OFFS = Field(0, 16, 'WR PPS offset in reference clock cycles')
+        LENGTH = Field(16, 16, 'Pulse Length (target platform specific, 0 = minimum possible pulse width)')
+
+    class odelay_calib(wb_regs.Reg):
+        """Output Delay Calibration (Ultrascale-specific)"""
+        _address = 0x34
+        _volatile = True
+        rst_idelayctrl = Field(0, 1, 'Reset Output IDELAYCTRL')
+        rst_odelay = Field(1, 1, 'Reset Output ODELAY')
+        rst_oserdes = Field(2, 1, 'Reset Output OSERDES')
+        rdy = Field(3, 1, 'Output Delay Ready')
+        value = Field(4, 9, 'Output Delay Value\n\nDelay value in taps')
+        value_update = Field(13, 1, 'Delay value update', pulse=True)
+        en_vtc = Field(14, 1, 'Enable VT compensation\n\nEnable VT compensation')
+        cal_latch = Field(15, 1, 'Latch calibration taps', pulse=True)
+        taps = Field(16, 9, 'n Taps\n\nValue in number of taps')
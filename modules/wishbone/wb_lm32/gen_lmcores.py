@@ -4,8 +4,19 @@
 # in 'lm32.profiles' file. 
 # The outputs are a single Verilog file containing all customized modules and 
 # a vhdl top-level wrapper with a set of generics allowing to choose the profile from within a Verilog/VHDL design
+#
+# Each profile is preprocessed in its own temporary directory, in parallel (see -j). The preprocessed
+# profiles are kept in a cache directory (see --cache-dir) together with a hash of their features and
+# of the sources, so that only new or modified profiles are regenerated (unless -f is given).
+# The sources are preprocessed by verilog_pp.py, or by ModelSim's vlog with --vlog.
 
-import os, glob, tokenize, copy
+import os, glob, tokenize, copy, re
+import argparse, hashlib, io, shutil, subprocess, tempfile
+from concurrent.futures import ProcessPoolExecutor
+import verilog_pp
+
+# Bump when the generated code changes for the same profiles and sources.
+CACHE_VERSION = 3
 
 LM32_features = [ "CFG_PL_MULTIPLY_ENABLED",
 								  "CFG_PL_BARREL_SHIFT_ENABLED",
@@ -53,14 +64,15 @@ def tobin(x, count=16):
 			s=s+"0";
 	return s
 	        
+# Matches whole module identifiers only (not longer identifiers, nor already mangled names).
+LM32_mods_re = re.compile(r"\b(" + "|".join(sorted(LM32_mods, key = len, reverse = True)) + r")\b")
+
 def mangle_names(string, profile_name):
-	for pattern in LM32_mods:
-		string = string.replace(pattern, pattern + "_"+profile_name)
-	return string;
+	return LM32_mods_re.sub(lambda m: m.group(1) + "_" + profile_name, string)
 
 def remove_unsynthetizable(code):
   syn_on = True
-  r=""
+  r=[]
   for l in code.split("\n"):
     if l.lstrip("\t ").startswith("// synthesis translate_off"):
       syn_on = False
@@ -68,26 +80,12 @@ def remove_unsynthetizable(code):
       syn_on = True
 
     if syn_on:
-      r=r+l+"\n"
+      r.append(l)
+      r.append("\n")
 
-  return r
+  return "".join(r)
                                         
-def gen_customized_version(profile_name, feats):
-	print("GenCfg ", profile_name);
-
-	tmp_dir = "/tmp/lm32-customizer";
-	try:
-		os.mkdir(tmp_dir);
-	except:
-		pass
-
-	f = open(tmp_dir + "/system_conf.v", "w");
-	f.write("`ifndef __system_conf_v\n`define __system_conf_v\n");
-	
-	for feat in feats:
-			f.write("`define " + feat + "\n");
-
-	f.write("`define CFG_EBA_RESET  32'h00000000\n\
+SYSTEM_CONF = "`define CFG_EBA_RESET  32'h00000000\n\
 	`define CFG_SDB  32'h00000000\n\
 	`define CFG_DEBA_RESET 32'h10000000\n\
 	`define CFG_EBR_POSEDGE_REGISTER_FILE\n\
@@ -110,29 +108,114 @@ def gen_customized_version(profile_name, feats):
 	`define CFG_JTAG_UART_ENABLED\n\
 	`define CFG_DEBUG_ENABLED\n\
 	`define CFG_HW_DEBUG_ENABLED\n\
-	`endif\n");
-	
-
-	f.write("`endif\n");
-	f.close();
-
-	file_list = LM32_files;
-	
-	ftmp = open(tmp_dir + "/tmp.v", "w");
-	
-	for fname in file_list:
-		f = open(fname, "r");
-		contents = f.read();
-		mangled = mangle_names(contents, profile_name)
-		code = remove_unsynthetizable(mangled)
-		ftmp.write(code);
+	`endif\n"
+
+def gen_customized_version(profile_name, feats, use_vlog = False):
+	"""Preprocess the LM32 sources for the given profile, return the Verilog code.
+	The preprocessing is done by verilog_pp, or by ModelSim's vlog if use_vlog is set."""
+	print("GenCfg ", profile_name);
+
+	src_dir = os.path.abspath("src")
+	tmp_dir = tempfile.mkdtemp(prefix = "lm32-customizer-" + profile_name + "-")
+	try:
+		f = open(tmp_dir + "/system_conf.v", "w");
+		f.write("`ifndef __system_conf_v\n`define __system_conf_v\n");
+
+		for feat in feats:
+				f.write("`define " + feat + "\n");
+
+		f.write(SYSTEM_CONF);
+		f.write("`endif\n");
 		f.close();
 
-	ftmp.close();		
-	
-	os.system("vlog -quiet -nologo -E " + tmp_dir+"/lm32_"+profile_name+".v " + tmp_dir + "/tmp.v  +incdir+" +tmp_dir+" +incdir+src");
-	os.system("cat "+tmp_dir+"/lm32_*.v | egrep -v '`line' > generated/lm32_allprofiles.v")
-	
+		file_list = LM32_files;
+
+		ftmp = open(tmp_dir + "/tmp.v", "w");
+
+		for fname in file_list:
+			f = open(fname, "r");
+			contents = f.read();
+			mangled = mangle_names(contents, profile_name)
+			code = remove_unsynthetizable(mangled)
+			ftmp.write(code);
+			f.close();
+
+		ftmp.close();
+
+		if not use_vlog:
+			pp = verilog_pp.Preprocessor(incdirs = [tmp_dir, src_dir])
+			return pp.preprocess_file(tmp_dir + "/tmp.v")
+
+		out = tmp_dir + "/lm32_" + profile_name + ".v"
+		subprocess.check_call(["vlib", "work"], cwd = tmp_dir)
+		subprocess.check_call(["vlog", "-quiet", "-nologo", "-E", out, tmp_dir + "/tmp.v",
+													 "+incdir+" + tmp_dir, "+incdir+" + src_dir], cwd = tmp_dir)
+		with open(out, "r") as f:
+			return "".join(l for l in f if "`line" not in l)
+	finally:
+		shutil.rmtree(tmp_dir, ignore_errors = True)
+
+def profile_hash(profile_name, feats, sources, use_vlog):
+	"""Hash of everything the preprocessed code of a profile depends on."""
+	h = hashlib.sha1()
+	h.update(repr((CACHE_VERSION, profile_name, feats, SYSTEM_CONF, LM32_mods, use_vlog)).encode())
+	for fname in sorted(sources):
+		h.update(fname.encode() + b"\0" + sources[fname] + b"\0")
+	return h.hexdigest()
+
+def _gen_profile(args):
+	return gen_customized_version(*args)
+
+def gen_all_profiles(prof, cache_dir, jobs = None, force = False, use_vlog = False):
+	"""Regenerate the profiles whose hash changed, then generated/lm32_allprofiles.v"""
+	sources = {}
+	for fname in glob.glob("src/*.v") + ["verilog_pp.py"]:
+		with open(fname, "rb") as f:
+			sources[fname] = f.read()
+
+	if not os.path.isdir(cache_dir):
+		os.makedirs(cache_dir)
+
+	hashes = {}
+	stale = []
+	for p in prof:
+		hashes[p[0]] = profile_hash(p[0], p[1:], sources, use_vlog)
+		try:
+			with open(os.path.join(cache_dir, "lm32_" + p[0] + ".sha1")) as f:
+				cached = f.read().strip()
+		except IOError:
+			cached = None
+		if force or cached != hashes[p[0]] or \
+			 not os.path.exists(os.path.join(cache_dir, "lm32_" + p[0] + ".v")):
+			stale.append(p)
+
+	if stale:
+		with ProcessPoolExecutor(max_workers = jobs) as pool:
+			codes = pool.map(_gen_profile, [(p[0], p[1:], use_vlog) for p in stale])
+			for p, code in zip(stale, codes):
+				with open(os.path.join(cache_dir, "lm32_" + p[0] + ".v"), "w") as f:
+					f.write(code)
+				with open(os.path.join(cache_dir, "lm32_" + p[0] + ".sha1"), "w") as f:
+					f.write(hashes[p[0]] + "\n")
+
+	# Same order as the original 'cat lm32_*.v'
+	code = ""
+	for fname in sorted("lm32_" + p[0] + ".v" for p in prof):
+		with open(os.path.join(cache_dir, fname), "r") as f:
+			code += f.read()
+	write_if_changed("generated/lm32_allprofiles.v", code)
+
+def write_if_changed(fname, code):
+	"""Avoid touching outputs (and triggering recompilations) when unchanged."""
+	try:
+		with open(fname, "r") as f:
+			if f.read() == code:
+				return
+	except IOError:
+		pass
+	with open(fname, "w") as f:
+		f.write(code)
+
 def parse_profiles():
 	f = open("lm32.profiles", "r")
 	p = map(lambda x: x.rstrip(" \n").rsplit(' '), f.readlines())
@@ -188,7 +271,7 @@ def gen_burst_eval_func(f, prof, cache):
 	f.write("return 0;\nend function;\n");
    
 def gen_vhdl_wrapper(prof):
-	f=open("generated/xwb_lm32.vhd","w");
+	f=io.StringIO();
 	f.write("""--auto-generated by gen_lmcores.py. Don't hand-edit please
 library ieee;
 use ieee.std_logic_1164.all;
@@ -415,14 +498,25 @@ port map(
 	end rtl;
 """);
 
-	f.close()
+	write_if_changed("generated/xwb_lm32.vhd", f.getvalue())
 
-os.system("vlib work")
+def main():
+	parser = argparse.ArgumentParser(description = "Generate the LM32 profiles listed in lm32.profiles")
+	parser.add_argument("-j", "--jobs", type = int, default = None,
+											help = "number of profiles generated in parallel (default is the number of CPUs)")
+	parser.add_argument("-f", "--force", action = "store_true",
+											help = "regenerate all the profiles, even the unchanged ones")
+	parser.add_argument("--vlog", action = "store_true",
+											help = "preprocess the sources with ModelSim's vlog instead of the built-in preprocessor")
+	parser.add_argument("--cache-dir", default = ".lm32-cache",
+											help = "directory of the preprocessed profiles (default is .lm32-cache)")
+	args = parser.parse_args()
 
-profiles = parse_profiles()
+	profiles = parse_profiles()
 
-for p in profiles:
-	gen_customized_version(p[0], p[1:])
+	gen_all_profiles(profiles, args.cache_dir, args.jobs, args.force, args.vlog)
 
-gen_vhdl_wrapper(profiles)
+	gen_vhdl_wrapper(profiles)
 
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,162 @@
+# Minimal Verilog preprocessor, used by gen_lmcores.py in place of 'vlog -E'.
+#
+# It handles the subset of the language used by the LM32 sources:
+#  - `define (object-like macros, with '\' line continuations) and `undef
+#  - `ifdef / `ifndef / `elsif / `else / `endif
+#  - `include "file", searched in the directory of the including file and
+#    then in the include directories (like +incdir+)
+#  - macro expansion (recursive)
+# Comments are removed and `line directives are not generated.  Lines are
+# kept, so that line numbers of the output follow the input.
+
+import os
+import re
+
+_TOKEN = re.compile(r'''
+    (?P<lcomment>//[^\n]*)
+  | (?P<bcomment>/\*.*?\*/)
+  | (?P<string>"(?:\\.|[^"\\\n])*")
+  | (?P<directive>`[A-Za-z_]\w*)
+  | (?P<text>[^/"`]+|/|`)
+''', re.S | re.X)
+
+_NAME = re.compile(r'[ \t]*([A-Za-z_]\w*)')
+_DEFINE = re.compile(r'[ \t]+([A-Za-z_]\w*)(\(?)((?:[^\n\\]|\\.)*)', re.S)
+_INCLUDE = re.compile(r'[ \t]*"([^"\n]*)"')
+
+# Directives kept in the output (vlog -E passes them through too).
+_PASSTHROUGH = ("timescale", "resetall", "celldefine", "endcelldefine",
+                "default_nettype")
+
+
+class PreprocessorError(Exception):
+    pass
+
+
+class Preprocessor(object):
+    """Preprocess Verilog files with the given include directories and
+    initial macro definitions (a dict name -> body)."""
+
+    def __init__(self, incdirs=(), defines=None):
+        self.incdirs = list(incdirs)
+        self.defines = dict(defines or {})
+
+    def preprocess_file(self, fname):
+        with open(fname, "r") as f:
+            return self.preprocess(f.read(), fname)
+
+    def preprocess(self, text, fname="<string>"):
+        out = []
+        self._run(text, fname, out, [])
+        return "".join(out)
+
+    def _find_include(self, name, fname):
+        dirs = [os.path.dirname(os.path.abspath(fname))] + self.incdirs
+        for d in dirs:
+            path = os.path.join(d, name)
+            if os.path.isfile(path):
+                return path
+        raise PreprocessorError("{}: cannot find include file '{}'".format(fname, name))
+
+    def _expand(self, name, fname, depth):
+        if depth > 64:
+            raise PreprocessorError("{}: recursive expansion of macro '{}'".format(fname, name))
+        if name not in self.defines:
+            raise PreprocessorError("{}: undefined macro '{}'".format(fname, name))
+        out = []
+        self._run(self.defines[name], fname, out, [], depth + 1)
+        return "".join(out)
+
+    def _run(self, text, fname, out, conds, depth=0):
+        """Preprocess TEXT into the list OUT.  CONDS is the stack of the
+        `ifdef states: (emitting, some branch already taken)."""
+        level = len(conds)
+        pos = 0
+        while pos < len(text):
+            m = _TOKEN.match(text, pos)
+            kind = m.lastgroup
+            tok = m.group()
+            pos = m.end()
+            emitting = all(c[0] for c in conds)
+
+            if kind == "lcomment":
+                continue
+            if kind == "bcomment":
+                out.append("\n" * tok.count("\n"))
+                continue
+            if kind in ("string", "text"):
+                if emitting:
+                    out.append(tok)
+                else:
+                    out.append("\n" * tok.count("\n"))
+                continue
+
+            name = tok[1:]
+            if name in ("ifdef", "ifndef", "elsif"):
+                arg = _NAME.match(text, pos)
+                if not arg:
+                    raise PreprocessorError("{}: missing macro name after `{}".format(fname, name))
+                pos = arg.end()
+                defined = arg.group(1) in self.defines
+                if name == "elsif":
+                    if len(conds) == level:
+                        raise PreprocessorError("{}: `elsif without `ifdef".format(fname))
+                    taken = conds[-1][1]
+                    conds[-1] = (not taken and defined, taken or defined)
+                else:
+                    cond = defined if name == "ifdef" else not defined
+                    conds.append((cond, cond))
+            elif name == "else":
+                if len(conds) == level:
+                    raise PreprocessorError("{}: `else without `ifdef".format(fname))
+                taken = conds[-1][1]
+                conds[-1] = (not taken, True)
+            elif name == "endif":
+                if len(conds) == level:
+                    raise PreprocessorError("{}: `endif without `ifdef".format(fname))
+                conds.pop()
+            elif not emitting:
+                # Skip the arguments of other directives in inactive code.
+                if name == "define":
+                    d = _DEFINE.match(text, pos)
+                    if d:
+                        out.append("\n" * d.group(3).count("\n"))
+                        pos = d.end()
+            elif name == "define":
+                d = _DEFINE.match(text, pos)
+                if not d:
+                    raise PreprocessorError("{}: malformed `define".format(fname))
+                if d.group(2):
+                    raise PreprocessorError(
+                        "{}: macros with arguments are not supported ('{}')".format(fname, d.group(1)))
+                body = d.group(3)
+                out.append("\n" * body.count("\n"))
+                body = re.sub(r"\\\n", "\n", body)
+                body = re.sub(r"//[^\n]*", "", body)
+                self.defines[d.group(1)] = body.strip()
+                pos = d.end()
+            elif name == "undef":
+                arg = _NAME.match(text, pos)
+                if not arg:
+                    raise PreprocessorError("{}: missing macro name after `undef".format(fname))
+                self.defines.pop(arg.group(1), None)
+                pos = arg.end()
+            elif name == "include":
+                inc = _INCLUDE.match(text, pos)
+                if not inc:
+                    raise PreprocessorError("{}: malformed `include".format(fname))
+                pos = inc.end()
+                path = self._find_include(inc.group(1), fname)
+                with open(path, "r") as f:
+                    self._run(f.read(), path, out, [], depth)
+            elif name == "line":
+                # Drop the directive and its arguments.
+                eol = text.find("\n", pos)
+                pos = len(text) if eol < 0 else eol
+            elif name in _PASSTHROUGH:
+                out.append(tok)
+            else:
+                out.append(self._expand(name, fname, depth))
+
+        if len(conds) != level:
+            raise PreprocessorError("{}: missing `endif".format(fname))
@@ -0,0 +1,94 @@
+# Generated by wb_regs.py from wb_vic_regs.cheby; do not edit
+#
+# Needs wb_regs.py (tools directory of general-cores) in the Python path.
+
+import wb_regs
+from wb_regs import Field
+
+
+class wb_vic_regs(wb_regs.Block):
+    """Vectored Interrupt Controller (VIC)
+
+    Module implementing a 2 to 32-input prioritized interrupt controller with internal interrupt vector storage support."""
+
+    _size = 0x100
+    _big_endian = True
+
+    class CTL(wb_regs.Reg):
+        """VIC Control Register"""
+        _address = 0x0
+        _strobe = True
+        _volatile = True
+        ENABLE = Field(0, 1, 'VIC Enable\n\n- 1: enables VIC operation\n- 0: disables VIC operation')
+        POL = Field(1, 1, 'VIC output polarity\n\n- 1: IRQ output is active high\n- 0: IRQ output is active low')
+        EMU_EDGE = Field(2, 1, 'Emulate Edge sensitive output\n\n- 1: Forces a low pulse of <code>EMU_LEN</code> clock cycles at each write to <code>EOIR</code>. Deprecated.\n- 0: Normal IRQ master line behavior')
+        EMU_LEN = Field(3, 16, 'Emulated Edge pulse timer\n\nLength of the delay (in <code>clk_sys_i</code> cycles) between write to <code>EOIR</code> and re-assertion of <code>irq_master_o</code>.')
+
+    class RISR(wb_regs.Reg):
+        """Raw Interrupt Status Register
+
+        Each bit reflects the current state of corresponding IRQ input line, irrespective of the state of the IMR register.
+        - read 1: interrupt line is currently active
+        - read 0: interrupt line is inactive"""
+        _address = 0x4
+        _access = "ro"
+
+    class IER(wb_regs.Reg):
+        """Interrupt Enable Register
+
+        - write 1: enables interrupt associated with written bit
+        - write 0: no effect"""
+        _address = 0x8
+        _access = "wo"
+        _strobe = True
+        _volatile = True
+
+    class IDR(wb_regs.Reg):
+        """Interrupt Disable Register
+
+        - write 1: enables interrupt associated with written bit
+        - write 0: no effect"""
+        _address = 0xc
+        _access = "wo"
+        _strobe = True
+        _volatile = True
+
+    class IMR(wb_regs.Reg):
+        """Interrupt Mask Register
+
+        - read 1: interrupt associated with read bit is enabled
+        - read 0: interrupt is disabled"""
+        _address = 0x10
+        _access = "ro"
+
+    class VAR(wb_regs.Reg):
+        """Vector Address Register
+
+        Address of pending interrupt vector, read from Interrupt Vector Table"""
+        _address = 0x14
+        _access = "ro"
+
+    class SWIR(wb_regs.Reg):
+        """Software Interrupt Register
+
+        Writing 1 to one of bits of this register causes a software emulation of the respective interrupt."""
+        _address = 0x18
+        _access = "wo"
+        _strobe = True
+        _volatile = True
+
+    class EOIR(wb_regs.Reg):
+        """End Of Interrupt Acknowledge Register
+
+        Any write operation acknowledges the pending interrupt. Then, VIC advances to another pending interrupt(s) or releases the master interrupt output."""
+        _address = 0x1c
+        _access = "wo"
+        _strobe = True
+        _volatile = True
+
+    class IVT_RAM(wb_regs.Memory):
+        """Interrupt Vector Table
+
+        Vector Address Table. Word at offset N stores the vector address of IRQ N. When interrupt is requested, VIC reads it's vector address from this memory and stores it in VAR register. The contents of this table can be pre-initialized during synthesis through <code>g_init_vectors</code> generic parameter. This is used to auto-enumerate interrupts in SDB-based designs."""
+        _address = 0x80
+        _size = 0x80
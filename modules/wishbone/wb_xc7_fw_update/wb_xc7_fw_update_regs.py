@@ -0,0 +1,27 @@
+# Generated by wb_regs.py from wb_xc7_fw_update_regs.cheby; do not edit
+#
+# Needs wb_regs.py (tools directory of general-cores) in the Python path.
+
+import wb_regs
+from wb_regs import Field
+
+
+class wb_xc7_fw_update_regs(wb_regs.Block):
+    """System Control Registers"""
+
+    _size = 0x4
+    _big_endian = True
+
+    class far(wb_regs.Reg):
+        """Provides direct access to the SPI flash memory containing the bitstream.
+
+        Flash Access Register"""
+        _address = 0x0
+        _strobe = True
+        _volatile = True
+        data = Field(0, 8, 'Data to be written / read to/from the flash SPI controller.\n\nSPI Data')
+        xfer = Field(8, 1, 'write 1: initiate an SPI transfer with an 8-bit data word taken from the DATA field. write 0: no effect\n\nSPI Start Transfer')
+        ready = Field(9, 1, 'read 1: Core is ready to initiate another transfer. DATA field contains the data read during previous transaction. read 0: core is busy\n\nSPI Ready')
+        cs = Field(10, 1, 'write 1: Enable target SPI controller. write 0: Disable target SPI controller\n\nSPI Chip Select')
+        ovf = Field(11, 1, 'read 1: a received byte was lost because the RX FIFO was full (burst mode). write 1: clear the flag, the write is not queued\n\nRX FIFO Overflow')
+        depth = Field(16, 16, 'read: depth of the FIFOs of the burst mode (g_fifo_depth), 0 without the burst mode. write: ignored\n\nFIFO Depth')
@@ -28,6 +28,12 @@ entity wb_xc7_fw_update_regs is
     -- SPI Chip Select
     far_cs_i             : in    std_logic;
     far_cs_o             : out   std_logic;
+    -- RX FIFO Overflow
+    far_ovf_i            : in    std_logic;
+    far_ovf_o            : out   std_logic;
+    -- FIFO Depth
+    far_depth_i          : in    std_logic_vector(15 downto 0);
+    far_depth_o          : out   std_logic_vector(15 downto 0);
     far_wr_o             : out   std_logic
   );
 end wb_xc7_fw_update_regs;
@@ -101,6 +107,8 @@ begin
   far_xfer_o <= wr_dat_d0(8);
   far_ready_o <= wr_dat_d0(9);
   far_cs_o <= wr_dat_d0(10);
+  far_ovf_o <= wr_dat_d0(11);
+  far_depth_o <= wr_dat_d0(31 downto 16);
   far_wr_o <= far_wreq;
 
   -- Process for write requests.
@@ -112,7 +120,7 @@ begin
   end process;
 
   -- Process for read requests.
-  process (rd_req_int, far_data_i, far_xfer_i, far_ready_i, far_cs_i) begin
+  process (rd_req_int, far_data_i, far_xfer_i, far_ready_i, far_cs_i, far_ovf_i, far_depth_i) begin
     -- By default ack read requests
     rd_dat_d0 <= (others => 'X');
     -- Reg far
@@ -121,6 +129,8 @@ begin
     rd_dat_d0(8) <= far_xfer_i;
     rd_dat_d0(9) <= far_ready_i;
     rd_dat_d0(10) <= far_cs_i;
-    rd_dat_d0(31 downto 11) <= (others => '0');
+    rd_dat_d0(11) <= far_ovf_i;
+    rd_dat_d0(15 downto 12) <= (others => '0');
+    rd_dat_d0(31 downto 16) <= far_depth_i;
   end process;
 end syn;
@@ -28,6 +28,10 @@ use unisim.vcomponents.all;
 use work.wishbone_pkg.all;
 
 entity xwb_xc7_fw_update is
+  generic (
+    --  Depth of the FIFOs of the burst mode (see xwb_xc7_fw_update_v2).
+    g_fifo_depth : natural := 0
+  );
   port (
     clk_i           : in std_logic;
     rst_n_i         : in std_logic;
@@ -45,6 +49,8 @@ architecture rtl of xwb_xc7_fw_update is
   signal flash_sclk        : std_logic;
 begin
   i_inst: entity work.xwb_xc7_fw_update_v2
+    generic map (
+      g_fifo_depth => g_fifo_depth)
     port map (
       clk_i  => clk_i,
       rst_n_i => rst_n_i,
@@ -4,6 +4,25 @@
 -------------------------------------------------------------------------------
 -- Note: Contrary to V1, this version doesn't include the STARTUPE2 module
 --  so the spi clock port is added.
+--
+-- With g_fifo_depth > 0 (burst mode), the writes to FAR are queued in a FIFO
+--  and executed back to back, so that the host doesn't poll READY after each
+--  byte:
+--  - a write queues a transfer of DATA (if XFER is set) or a change of CS
+--    only, in order.  The bus is stalled while the FIFO is full,
+--  - bit 9 (READY) of a write keeps the received byte: it is queued in the RX
+--    FIFO.  The transfers never wait for the RX FIFO (so that the bus cannot
+--    stall for good): a byte received while it is full is lost, and OVF is
+--    set until a write with OVF set (which is not queued),
+--  - a read returns the first byte of the RX FIFO in DATA, with XFER set if
+--    it is valid (then the read removes it), and READY set when all the queued
+--    transfers are done,
+--  - when a write releases CS, the next one is executed at least g_cs_gap
+--    clock cycles later, so that CS stays inactive as long as the flash needs
+--    between two commands (tSHSL, 20 to 100 ns).
+--  DEPTH reads g_fifo_depth (0 without the burst mode): the host keeps at
+--  most that many received bytes waiting to be read.
+--  g_fifo_depth is a power of 2, below 2**16.
 -------------------------------------------------------------------------------
 -- Copyright (c) 2020-2021 CERN
 --
@@ -21,10 +40,19 @@
 
 library ieee;
 use ieee.std_logic_1164.all;
+use ieee.numeric_std.all;
 
 use work.wishbone_pkg.all;
+use work.genram_pkg.all;
 
 entity xwb_xc7_fw_update_v2 is
+  generic (
+    --  Depth of the FIFOs of the burst mode, 0 for one transfer at a time.
+    g_fifo_depth : natural := 0;
+    --  Minimum number of cycles CS is inactive between two commands in
+    --  burst mode.
+    g_cs_gap     : natural := 16
+  );
   port (
     clk_i           : in std_logic;
     rst_n_i         : in std_logic;
@@ -42,51 +70,226 @@ end xwb_xc7_fw_update_v2;
 architecture rtl of xwb_xc7_fw_update_v2 is
   signal far_data_in    : std_logic_vector(7 downto 0);
   signal far_data_out   : std_logic_vector(7 downto 0);
+  signal far_xfer_in    : std_logic;
   signal far_xfer_out   : std_logic;
   signal far_ready_in   : std_logic;
+  signal far_ready_out  : std_logic;
   signal far_cs_out     : std_logic;
+  signal far_ovf_in     : std_logic;
+  signal far_ovf_out    : std_logic;
   signal far_wr_out     : std_logic;
 
+  signal wb_in             : t_wishbone_slave_in;
+  signal wb_out            : t_wishbone_slave_out;
+
   signal flash_spi_cs      : std_logic;
   signal flash_spi_start   : std_logic;
   signal flash_spi_wdata   : std_logic_vector(7 downto 0);
+  signal flash_spi_ready   : std_logic;
+  signal flash_spi_rdata   : std_logic_vector(7 downto 0);
   signal flash_sclk        : std_logic;
 begin
   inst_regs: entity work.wb_xc7_fw_update_regs
     port map (
       clk_i => clk_i,
       rst_n_i => rst_n_i,
-      wb_i => wb_i,
-      wb_o => wb_o,
+      wb_i => wb_in,
+      wb_o => wb_out,
       far_data_i => far_data_in,
       far_data_o => far_data_out,
-      far_xfer_i => '0',
+      far_xfer_i => far_xfer_in,
       far_xfer_o => far_xfer_out,
       far_ready_i => far_ready_in,
-      far_ready_o => open,
+      far_ready_o => far_ready_out,
       far_cs_i => '0',
       far_cs_o => far_cs_out,
+      far_ovf_i => far_ovf_in,
+      far_ovf_o => far_ovf_out,
+      far_depth_i => std_logic_vector(to_unsigned(g_fifo_depth, 16)),
+      far_depth_o => open,
       far_wr_o => far_wr_out
     );
 
-  --  Need to capture cs and data_out, and need to delay start.
-  p_host_spi_registers : process(clk_i)
+  gen_direct: if g_fifo_depth = 0 generate
+    wb_in <= wb_i;
+    wb_o  <= wb_out;
+
+    far_data_in  <= flash_spi_rdata;
+    far_xfer_in  <= '0';
+    far_ready_in <= flash_spi_ready;
+    far_ovf_in   <= '0';
+
+    --  Need to capture cs and data_out, and need to delay start.
+    p_host_spi_registers : process(clk_i)
+    begin
+      if rising_edge(clk_i) then
+        if rst_n_i = '0' then
+          flash_spi_start <= '0';
+          flash_spi_wdata <= (others => '0');
+          flash_spi_cs <= '0';
+        elsif far_wr_out = '1' then
+          flash_spi_wdata <= far_data_out;
+          flash_spi_start <= far_xfer_out;
+          flash_spi_cs    <= far_cs_out;
+        else
+          --  Pulse for start.
+          flash_spi_start <= '0';
+        end if;
+      end if;
+    end process;
+  end generate gen_direct;
+
+  gen_burst: if g_fifo_depth > 0 generate
+    type t_state is (S_IDLE, S_START, S_WAIT, S_GAP);
+
+    signal state         : t_state;
+    signal gap_cnt       : natural range 0 to g_cs_gap;
+    signal tx_fifo_wr    : std_logic;
+    signal tx_fifo_d     : std_logic_vector(10 downto 0);
+    signal tx_fifo_q     : std_logic_vector(10 downto 0);
+    signal tx_fifo_rd    : std_logic;
+    signal tx_fifo_empty : std_logic;
+    signal tx_fifo_full  : std_logic;
+    signal rx_fifo_wr    : std_logic;
+    signal rx_fifo_rd    : std_logic;
+    signal rx_fifo_empty : std_logic;
+    signal rx_fifo_full  : std_logic;
+    signal rx_keep       : std_logic;
+    signal rx_ovf        : std_logic;
+    signal tx_wr_d       : std_logic;
   begin
-    if rising_edge(clk_i) then
-      if rst_n_i = '0' then
-        flash_spi_start <= '0';
-        flash_spi_wdata <= (others => '0');
-        flash_spi_cs <= '0';
-      elsif far_wr_out = '1' then
-        flash_spi_wdata <= far_data_out;
-        flash_spi_start <= far_xfer_out;
-        flash_spi_cs    <= far_cs_out;
-      else
-        --  Pulse for start.
-        flash_spi_start <= '0';
+    assert g_fifo_depth < 2**16
+      report "xwb_xc7_fw_update_v2: g_fifo_depth must be below 2**16" severity failure;
+
+    --  Stall the writes while the TX FIFO is full.  An accepted write is
+    --  queued on the next cycle, and the next one is accepted after its ack.
+    p_wb_in : process (wb_i, tx_fifo_full)
+    begin
+      wb_in     <= wb_i;
+      wb_in.stb <= wb_i.stb and not (wb_i.we and tx_fifo_full);
+    end process;
+
+    p_wb_out : process (wb_i, wb_out, tx_fifo_full)
+    begin
+      wb_o       <= wb_out;
+      wb_o.stall <= wb_out.stall or (wb_i.cyc and wb_i.stb and wb_i.we and tx_fifo_full);
+    end process;
+
+    --  Keep, cs, xfer and data of the write.  A write with OVF set only
+    --  clears the flag.
+    tx_fifo_d  <= far_ready_out & far_cs_out & far_xfer_out & far_data_out;
+    tx_fifo_wr <= far_wr_out and not far_ovf_out;
+
+    U_TX_FIFO : generic_sync_fifo
+      generic map (
+        g_data_width             => 11,
+        g_size                   => g_fifo_depth,
+        g_show_ahead             => true,
+        g_show_ahead_legacy_mode => false)
+      port map (
+        rst_n_i => rst_n_i,
+        clk_i   => clk_i,
+        d_i     => tx_fifo_d,
+        we_i    => tx_fifo_wr,
+        q_o     => tx_fifo_q,
+        rd_i    => tx_fifo_rd,
+        empty_o => tx_fifo_empty,
+        full_o  => tx_fifo_full);
+
+    --  Next write.
+    tx_fifo_rd <= '1' when state = S_IDLE and tx_fifo_empty = '0' else '0';
+
+    p_sequencer : process(clk_i)
+    begin
+      if rising_edge(clk_i) then
+        if rst_n_i = '0' then
+          state           <= S_IDLE;
+          flash_spi_start <= '0';
+          flash_spi_wdata <= (others => '0');
+          flash_spi_cs    <= '0';
+          rx_keep         <= '0';
+          tx_wr_d         <= '0';
+          gap_cnt         <= 0;
+        else
+          tx_wr_d         <= tx_fifo_wr;
+          --  Pulse for start.
+          flash_spi_start <= '0';
+          case state is
+            when S_IDLE =>
+              if tx_fifo_rd = '1' then
+                flash_spi_cs    <= tx_fifo_q(9);
+                flash_spi_wdata <= tx_fifo_q(7 downto 0);
+                rx_keep         <= tx_fifo_q(10);
+                if tx_fifo_q(8) = '1' then
+                  flash_spi_start <= '1';
+                  state           <= S_START;
+                elsif flash_spi_cs = '1' and tx_fifo_q(9) = '0' then
+                  --  End of a command: keep CS inactive.
+                  gap_cnt         <= g_cs_gap;
+                  state           <= S_GAP;
+                end if;
+              end if;
+            when S_START =>
+              --  The SPI master leaves its idle state.
+              state <= S_WAIT;
+            when S_WAIT =>
+              if flash_spi_ready = '1' then
+                state <= S_IDLE;
+              end if;
+            when S_GAP =>
+              if gap_cnt = 0 then
+                state <= S_IDLE;
+              else
+                gap_cnt <= gap_cnt - 1;
+              end if;
+          end case;
+        end if;
+      end if;
+    end process;
+
+    rx_fifo_wr <= '1' when state = S_WAIT and flash_spi_ready = '1' and rx_keep = '1'
+                  and rx_fifo_full = '0' else '0';
+
+    --  A kept byte lost: the RX FIFO was full.
+    p_overflow : process(clk_i)
+    begin
+      if rising_edge(clk_i) then
+        if rst_n_i = '0' then
+          rx_ovf <= '0';
+        elsif state = S_WAIT and flash_spi_ready = '1' and rx_keep = '1'
+          and rx_fifo_full = '1' then
+          rx_ovf <= '1';
+        elsif far_wr_out = '1' and far_ovf_out = '1' then
+          rx_ovf <= '0';
+        end if;
       end if;
-    end if;
-  end process;
+    end process;
+
+    U_RX_FIFO : generic_sync_fifo
+      generic map (
+        g_data_width             => 8,
+        g_size                   => g_fifo_depth,
+        g_show_ahead             => true,
+        g_show_ahead_legacy_mode => false)
+      port map (
+        rst_n_i => rst_n_i,
+        clk_i   => clk_i,
+        d_i     => flash_spi_rdata,
+        we_i    => rx_fifo_wr,
+        q_o     => far_data_in,
+        rd_i    => rx_fifo_rd,
+        empty_o => rx_fifo_empty,
+        full_o  => rx_fifo_full);
+
+    --  Remove the byte returned by a read (with XFER set).
+    rx_fifo_rd <= wb_out.ack and wb_i.cyc and wb_i.stb and not wb_i.we and wb_out.dat(8);
+
+    far_xfer_in  <= not rx_fifo_empty;
+    far_ovf_in   <= rx_ovf;
+    --  The empty flag of the TX FIFO is updated two cycles after a write.
+    far_ready_in <= '1' when state = S_IDLE and tx_fifo_empty = '1'
+                    and tx_fifo_wr = '0' and tx_wr_d = '0' else '0';
+  end generate gen_burst;
 
   U_SPI_Master : entity work.gc_simple_spi_master
     generic map (
@@ -99,8 +302,8 @@ begin
       start_i    => flash_spi_start,
       cpol_i     => '0',
       data_i     => flash_spi_wdata,
-      ready_o    => far_ready_in,
-      data_o     => far_data_in,
+      ready_o    => flash_spi_ready,
+      data_o     => flash_spi_rdata,
       spi_cs_n_o => flash_cs_n_o,
       spi_sclk_o => flash_sclk,
       spi_mosi_o => flash_mosi_o,
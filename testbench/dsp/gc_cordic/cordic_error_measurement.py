@@ -1,174 +1,194 @@
-import matplotlib.pyplot as plt
-import pandas as pd
+"""Error analysis of the gc_cordic testbench results (res.txt or res.bin).
+
+The file (see cordic_results.py for the formats) is read in chunks, so that
+exhaustive sweeps of hundreds of millions of rows can be analysed in constant
+memory.  For each mode/submode and each output, the absolute error is
+accumulated into:
+ - its maximum (with the inputs that produced it) and RMS value,
+ - a histogram of the error values, from which the percentiles are exact,
+ - 2D histograms of the error against each input (and against y/x),
+which are printed as a summary and drawn as density plots.
+"""
+
+import argparse
+
+import numpy as np
+
+import cordic_results
+from cordic_model import error
+
+GROUPS = ["vector/circular", "vector/linear", "vector/hyperbolic",
+          "rotate/circular", "rotate/linear", "rotate/hyperbolic"]
+
+# Index in GROUPS of mode * 4 + submode
+_GROUP_INDEX = np.array([0, 1, -1, 2, 3, 4, -1, 5] + [-1] * 248, dtype=np.int8)
+
+OUTPUTS = ["x", "y", "z"]
+
+# Outputs whose error wraps around (angles), as in f_check_error
+WRAPPED = {("vector/circular", "z"), ("vector/linear", "y")}
+
+INPUTS = ["ix", "iy", "iz", "ratio"]
+
+PERCENTILES = [50, 99, 99.9]
+
+
+class ErrorStats(object):
+    """Error statistics of one mode/submode, accumulated chunk by chunk."""
+
+    def __init__(self, name, width, bins, max_error):
+        self.name = name
+        self.width = width
+        self.bins = bins
+        self.max_error = max_error
+        self.count = 0
+        self.sumsq = np.zeros(3)
+        self.max = np.zeros(3, dtype=np.int64)
+        self.worst = [None] * 3
+        # Errors >= max_error are counted in the last bin.
+        self.hist = np.zeros((3, max_error + 1), dtype=np.int64)
+        self.heat = None
+
+    def _input_bins(self, chunk):
+        half = 1 << (self.width - 1)
+        ix = chunk["ix"].astype(np.int64)
+        iy = chunk["iy"].astype(np.int64)
+        res = [np.clip(((v + half) * self.bins) >> self.width, 0, self.bins - 1)
+               for v in (ix, iy, chunk["iz"].astype(np.int64))]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.nan_to_num(iy / ix, posinf=1.0, neginf=-1.0)
+        res.append(np.clip(((ratio + 1) / 2 * self.bins).astype(np.int64),
+                           0, self.bins - 1))
+        return res
+
+    def update(self, chunk):
+        """Add the rows of CHUNK, a dict of column arrays."""
+        n = len(chunk["ix"])
+        if n == 0:
+            return
+        self.count += n
+        if self.heat is None:
+            self.heat = np.zeros((3, len(INPUTS), self.bins, self.max_error + 1),
+                                 dtype=np.int64)
+        inputs = self._input_bins(chunk)
+        for k, out in enumerate(OUTPUTS):
+            err = error(chunk["o" + out], chunk["e" + out].astype(np.int64),
+                        (self.name, out) in WRAPPED, self.width)
+            self.sumsq[k] += np.dot(err, err.astype(float))
+            i = int(np.argmax(err))
+            if self.worst[k] is None or err[i] > self.max[k]:
+                self.max[k] = err[i]
+                self.worst[k] = tuple(int(chunk[c][i]) for c in ("ix", "iy", "iz"))
+            err = np.minimum(err, self.max_error)
+            self.hist[k] += np.bincount(err, minlength=self.max_error + 1)
+            for j, b in enumerate(inputs):
+                self.heat[k, j] += np.bincount(
+                    b * (self.max_error + 1) + err,
+                    minlength=self.bins * (self.max_error + 1)).reshape(
+                        self.bins, self.max_error + 1)
+
+    def rms(self, k):
+        return np.sqrt(self.sumsq[k] / self.count)
+
+    def percentile(self, k, q):
+        """Exact percentile Q of the error of output K, None if it is above
+        the histogram range."""
+        cum = np.cumsum(self.hist[k])
+        v = int(np.searchsorted(cum, q / 100.0 * self.count))
+        return None if v >= self.max_error else v
+
+
+def analyse(filename, width, bins, max_error, chunksize):
+    """Read FILENAME and return the list of ErrorStats with data."""
+    stats = [ErrorStats(g, width, bins, max_error) for g in GROUPS]
+    for chunk in cordic_results.iter_chunks(filename, chunksize):
+        group = _GROUP_INDEX[chunk["mode"] * 4 + chunk["submode"]]
+        if (group == group[0]).all():
+            # The testbench runs each mode in turn: avoid copies.
+            if group[0] >= 0:
+                stats[group[0]].update(chunk)
+            continue
+        for g in np.unique(group[group >= 0]):
+            sel = group == g
+            stats[g].update(dict((c, v[sel]) for c, v in chunk.items()))
+    return [s for s in stats if s.count]
+
+
+def report(stats):
+    print("{:<18} {:>10} {:>3} {:>6} {:>8} {}  {}".format(
+        "mode", "count", "out", "max", "rms",
+        " ".join("{:>6}".format("p{}".format(q)) for q in PERCENTILES),
+        "worst input (x, y, z)"))
+    for s in stats:
+        for k, out in enumerate(OUTPUTS):
+            pct = [s.percentile(k, q) for q in PERCENTILES]
+            print("{:<18} {:>10} {:>3} {:>6} {:>8.3f} {}  {}".format(
+                s.name if k == 0 else "", s.count if k == 0 else "", out,
+                s.max[k], s.rms(k),
+                " ".join("{:>6}".format(">" + str(s.max_error) if p is None else p)
+                         for p in pct),
+                s.worst[k]))
+
+
+def plot(stats, against, output):
+    import matplotlib
+    if output:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
+
+    fig, axes = plt.subplots(len(stats), 3, squeeze=False,
+                             figsize=(15, 3.5 * len(stats)))
+    for row, s in zip(axes, stats):
+        inp = against or ("ratio" if s.name == "vector/linear" else "iz")
+        j = INPUTS.index(inp)
+        if inp == "ratio":
+            edges = np.linspace(-1, 1, s.bins + 1)
+        else:
+            half = 1 << (s.width - 1)
+            edges = np.linspace(-half, half, s.bins + 1)
+        for k, ax in enumerate(row):
+            nerr = int(min(s.max[k], s.max_error)) + 1
+            heat = s.heat[k, j, :, :nerr].T
+            mesh = ax.pcolormesh(edges, np.arange(nerr + 1) - 0.5,
+                                 np.ma.masked_equal(heat, 0),
+                                 norm=LogNorm(), shading="flat")
+            fig.colorbar(mesh, ax=ax)
+            ax.set_title("{}: err_{} vs {}".format(s.name, OUTPUTS[k], inp))
+            ax.set_xlabel(inp)
+            ax.set_ylabel("error")
+    fig.tight_layout()
+    if output:
+        fig.savefig(output)
+    else:
+        plt.show()
+
 
 def main():
-    filename = "res.txt"
-    data = pd.read_csv(filename, header=None, names=["ix", "iy", "iz","ox", "oy", "oz", "ex", "ey", "ez", "mode", "submode"])
-    
-    data["mode"][data["mode"] == 0] = "vector"
-    data["mode"][data["mode"] == 1] = "rotate"
-
-    data["submode"][data["submode"] == 0] = "circular"
-    data["submode"][data["submode"] == 1] = "linear"
-
-    data.insert(len(data.columns), "err_x",abs(data["ox"]-data["ex"]))
-    data.insert(len(data.columns), "err_y",abs(data["oy"]-data["ey"]))
-    data.insert(len(data.columns), "err_z",abs(data["oz"]-data["ez"]))
-
-    print(data)
-    
-    rotcirc      = data[data["mode"] == "rotate"]
-    rotcirc      = rotcirc[rotcirc["submode"] == "circular"]
-
-    rotlinear      = data[data["mode"] == "rotate"]
-    rotlinear      = rotlinear[rotlinear["submode"] == "linear"]
-    
-    vectcirc      = data[data["mode"] == "vector"]
-    vectcirc      = vectcirc[vectcirc["submode"] == "circular"]
-
-    vectlinear      = data[data["mode"] == "vector"]
-    vectlinear      = vectlinear[vectlinear["submode"] == "linear"]
-    
-    print(rotcirc      )
-    print(rotlinear    )
-    print(vectcirc   )
-    print(vectlinear )
-
-    # How is error defined ?
-    # rotate/Circular -> 2 errors, xo and yo
-    # rotate/linear -> 2 errors, x and y
-    # vector/circular -> 2 errors, x and z
-    # vector/linear -> 2 errors, x and z
-    
-    
-    import numpy as np
-     
-    fig = plt.figure()
-     
-    # syntax for 3-D projection
-    ax = plt.axes(projection ='3d')
-     
-    # defining axes
-    x = vectcirc["ix"]
-    y = vectcirc["iy"]
-    z = vectcirc["iz"]
-    err_x = vectcirc["err_x"]
-    err_y = vectcirc["err_y"]
-    err_z = vectcirc["err_z"]
-
-    
-    plt.subplot(4,3,1)
-    plt.plot(x, err_x, 'x')
-    plt.plot(y, err_x, 'x')
-    plt.plot(z, err_x, 'x')
-    #plt.legend(["errx = f(x)", "errx = f(y)", "errx = f(z)"])
-    plt.title("vect/circle : magnitude error")
-
-    plt.subplot(4,3,2)
-    plt.plot(x, err_y, 'x')
-    plt.plot(y, err_y, 'x')
-    plt.plot(z, err_y, 'x')
-    #plt.legend(["erry = f(x)", "erry = f(y)", "erry = f(z)"])
-    plt.title("vector/circle")
-
-    plt.subplot(4,3,3)
-    plt.plot(x, err_z, 'x')
-    plt.plot(y, err_z, 'x')
-    plt.plot(z, err_z, 'x')
-    #plt.legend(["errz = f(x)", "errz = f(y)", "errz = f(z)"])
-    plt.title("vector/circle : angle error")
-
-    x = rotcirc["ix"]
-    y = rotcirc["iy"]
-    z = rotcirc["iz"]
-    err_x = rotcirc["err_x"]
-    err_y = rotcirc["err_y"]
-    err_z = rotcirc["err_z"]
-
-    
-    plt.subplot(4,3,4)
-    plt.plot(x, err_x, 'x')
-    plt.plot(y, err_x, 'x')
-    plt.plot(z, err_x, 'x')
-    #plt.legend(["errx = f(x)", "errx = f(y)", "errx = f(z)"])
-    plt.title("rotate/circle")
-
-    plt.subplot(4,3,5)
-    plt.plot(x, err_y, 'x')
-    plt.plot(y, err_y, 'x')
-    plt.plot(z, err_y, 'x')
-    #plt.legend(["erry = f(x)", "erry = f(y)", "erry = f(z)"])
-    plt.title("rotate/circle")
-
-    plt.subplot(4,3,6)
-    plt.plot(x, err_z, 'x')
-    plt.plot(y, err_z, 'x')
-    plt.plot(z, err_z, 'x')
-    #plt.legend(["errz = f(x)", "errz = f(y)", "errz = f(z)"])
-    plt.title("rotate/circle")
-
-    x = rotlinear["ix"]
-    y = rotlinear["iy"]
-    z = rotlinear["iz"]
-    err_x = rotlinear["err_x"]
-    err_y = rotlinear["err_y"]
-    err_z = rotlinear["err_z"]
-    
-    plt.subplot(4,3,7)
-    plt.plot(x, err_x, 'x')
-    plt.plot(y, err_x, 'x')
-    plt.plot(z, err_x, 'x')
-    #plt.legend(["errx = f(x)", "errx = f(y)", "errx = f(z)"])
-    plt.title("rotate/linear")
-
-    plt.subplot(4,3,8)
-    plt.plot(x, err_y, 'x')
-    plt.plot(y, err_y, 'x')
-    plt.plot(z, err_y, 'x')
-    #plt.legend(["erry = f(x)", "erry = f(y)", "erry = f(z)"])
-    plt.title("rotate/linear")
-
-    plt.subplot(4,3,9)
-    plt.plot(x, err_z, 'x')
-    plt.plot(y, err_z, 'x')
-    plt.plot(z, err_z, 'x')
-    #plt.legend(["errz = f(x)", "errz = f(y)", "errz = f(z)"])
-    plt.title("rotate/linear")
-
-    x = vectlinear["ix"]
-    y = vectlinear["iy"]
-    z = vectlinear["iz"]
-    xy = vectlinear["iy"]/vectlinear["ix"]
-    err_x = vectlinear["err_x"]
-    err_y = vectlinear["err_y"]
-    err_z = vectlinear["err_z"]
-
-    
-    plt.subplot(4,3,10)
-    plt.plot(xy, err_x, 'x')
-    plt.plot(xy, err_y, 'x')
-    plt.plot(xy, err_z, 'x')
-    #plt.legend(["errx = f(y/x)", "erry = f(y/x)", "errz = f(y/x)"])
-    plt.title("vector/linear: ratio error = f(ratio)")
-
-    plt.subplot(4,3,11)
-    plt.plot(x, err_y, 'x')
-    plt.plot(y, err_y, 'x')
-    plt.plot(z, err_y, 'x')
-    #plt.legend(["erry = f(x)", "erry = f(y)", "erry = f(z)"])
-    plt.title("vector/linear")
-
-    plt.subplot(4,3,12)
-    plt.plot(x, err_z, 'x')
-    plt.plot(y, err_z, 'x')
-    plt.plot(z, err_z, 'x')
-    #plt.legend(["errz = f(x)", "errz = f(y)", "errz = f(z)"])
-    plt.title("vector/linear: ratio error")
-
-     
-     
-    plt.show()
-    
+    parser = argparse.ArgumentParser(description="Analyse the gc_cordic testbench results")
+    parser.add_argument("filename", nargs="?", default="res.txt",
+                        help="result file, CSV or binary (default is res.txt)")
+    parser.add_argument("-w", "--width", type=int,
+                        help="width of the inputs (default is the one of a binary file,"
+                        " 14 for CSV as in gc_cordic_tb)")
+    parser.add_argument("-b", "--bins", type=int, default=64,
+                        help="number of input bins of the density plots (default is 64)")
+    parser.add_argument("-m", "--max-error", type=int, default=256,
+                        help="range of the error histograms (default is 256)")
+    parser.add_argument("-c", "--chunk", type=int, default=1 << 20,
+                        help="number of rows read at once (default is 1M)")
+    parser.add_argument("-a", "--against", choices=INPUTS,
+                        help="input of the density plots (default is iz, y/x for vector/linear)")
+    parser.add_argument("-o", "--output", help="save the plots to this file instead of showing them")
+    parser.add_argument("-n", "--no-plot", action="store_true", help="only print the summary")
+    args = parser.parse_args()
+
+    width = args.width or cordic_results.file_width(args.filename) or 14
+    stats = analyse(args.filename, width, args.bins, args.max_error, args.chunk)
+    report(stats)
+    if stats and not args.no_plot:
+        plot(stats, args.against, args.output)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,406 @@
+"""Bit-accurate NumPy models of gc_cordic and gc_cordic_top.
+
+Both models compute, for arrays of input samples, the values the RTL outputs
+after its pipeline latency.  All the arithmetic is done on int64 arrays with
+the same widths, wrap-arounds and saturations as the VHDL (gc_cordic_pkg,
+cordic_init, cordic_xy_logic_hd/nhd/nmhd, cordic_modulo_360 and
+gc_cordic_top), so that whole input spaces can be swept without a simulator.
+
+The mode and submode may be scalars or per-sample arrays.  In gc_cordic they
+are not pipelined with the data: the models assume they are stable while a
+sample goes through the pipeline.
+
+The init stage of gc_cordic has no hyperbolic branch, its registers keep the
+values of the previous sample.  This is modelled by reusing the last
+non-hyperbolic sample of the batch (or INIT_STATE for the first ones).
+
+Run this file to sweep random inputs and report the errors against the
+floating-point expectations used by gc_cordic_tb.vhd.
+"""
+
+import argparse
+import math
+import sys
+
+import numpy as np
+
+import cordic_results
+
+MODE_VECTOR = 0
+MODE_ROTATE = 1
+
+SUBMODE_CIRCULAR = 0
+SUBMODE_LINEAR = 1
+SUBMODE_HYPERBOLIC = 3
+
+ANGLE_FORMAT_S8_7 = 0
+ANGLE_FORMAT_FULL_SCALE_180 = 1
+
+MODES = {"vector": MODE_VECTOR, "rotate": MODE_ROTATE}
+SUBMODES = {"circular": SUBMODE_CIRCULAR, "linear": SUBMODE_LINEAR,
+            "hyperbolic": SUBMODE_HYPERBOLIC}
+
+# f_phi_lookup tables (32-bit signed values).
+LUT_LIN = [0x7fffffff] + [1 << (30 - i) for i in range(31)]
+
+LUT_CIRC_A0 = [
+    0x16800000, 0x0D485398, 0x0704A3A0, 0x03900089, 0x01C9C553, 0x00E51BCA,
+    0x0072950D, 0x00394B6B, 0x001CA5D2, 0x000E52EC, 0x00072976, 0x000394BB,
+    0x0001CA5D, 0x0000E52E, 0x00007297, 0x0000394B, 0x00001CA5, 0x00000E52,
+    0x00000729, 0x00000394, 0x000001CA, 0x000000E5, 0x00000072, 0x00000039,
+    0x0000001C, 0x0000000E, 0x00000007, 0x00000003, 0x00000001, 0x00000000,
+    0x00000000, 0x00000000]
+
+LUT_CIRC_A1 = [
+    0x20000000, 0x12E4051E, 0x09FB385B, 0x051111D4, 0x028B0D43, 0x0145D7E1,
+    0x00A2F61E, 0x00517C55, 0x0028BE53, 0x00145F2F, 0x000A2F98, 0x000517CC,
+    0x00028BE6, 0x000145F3, 0x0000A2FA, 0x0000517D, 0x000028BE, 0x0000145F,
+    0x00000A30, 0x00000518, 0x0000028C, 0x00000146, 0x000000A3, 0x00000051,
+    0x00000029, 0x00000014, 0x0000000A, 0x00000005, 0x00000003, 0x00000001,
+    0x00000001, 0x00000000]
+
+# 33-bit angle constants (c_[FS]Deg*HD_X), as signed values.
+_ANGLES_X = {
+    ANGLE_FORMAT_S8_7: {
+        "p90": 0x2D000000, "m90": -0x2D000000,
+        "p180": 0x5A000000, "m180": -0x5A000000,
+        "p360": 0xB4000000, "m360": -0xB4000000},
+    ANGLE_FORMAT_FULL_SCALE_180: {
+        "p90": 0x40000000, "m90": -0x40000000,
+        "p180": 0x80000000, "m180": -0x80000000,
+        "p360": 0xFFFFFFFF, "m360": -0x100000000},
+}
+
+
+def wrap(v, bits):
+    """Two's complement wrap-around of V to BITS bits."""
+    half = 1 << (bits - 1)
+    return ((v + half) & ((1 << bits) - 1)) - half
+
+
+def limit(v, bits, saturate):
+    """f_limit_add/f_limit_subtract result stage: return (value, lim)."""
+    if not saturate:
+        return wrap(v, bits), np.zeros(np.shape(v), dtype=bool)
+    hi = (1 << (bits - 1)) - 1
+    lo = -(1 << (bits - 1))
+    return np.clip(v, lo, hi), (v > hi) | (v < lo)
+
+
+def limit_negate(v, neg, bits, saturate):
+    """f_limit_negate: negate V where NEG is set."""
+    lo = -(1 << (bits - 1))
+    if saturate:
+        negv = np.where(v == lo, -lo - 1, -v)
+    else:
+        negv = wrap(-v, bits)
+    return np.where(neg, negv, v)
+
+
+def compute_an(nbits):
+    """f_compute_an: 1/An as a NBITS signed integer."""
+    an = 1.0
+    for i in range(nbits):
+        an *= math.sqrt(1.0 + 2.0 ** (-2 * i))
+    return vhdl_round(1.0 / an * 2.0 ** (nbits - 1))
+
+
+def vhdl_round(v):
+    """VHDL real to integer conversion (nearest, ties away from zero)."""
+    if np.isscalar(v):
+        return int(math.copysign(math.floor(abs(v) + 0.5), v))
+    return (np.sign(v) * np.floor(np.abs(v) + 0.5)).astype(np.int64)
+
+
+def _as_arrays(*args):
+    arrs = np.broadcast_arrays(*[np.asarray(a, dtype=np.int64) for a in args])
+    return [np.array(a) for a in arrs]
+
+
+def _cordic_init(x0, y0, z0, mode, submode, m, angle_format, init_state):
+    """cordic_init: quadrant pre-rotation, returns (x1, y1, z1, d1)."""
+    a = dict((k, v >> (32 - m)) for k, v in _ANGLES_X[angle_format].items())
+    nx0 = wrap(-x0, m)
+    ny0 = wrap(-y0, m)
+    z_p90 = wrap(z0 + a["p90"], m + 1)
+    z_m90 = wrap(z0 + a["m90"], m + 1)
+    z_p180 = wrap(z0 + a["p180"], m + 1)
+    z_m180 = wrap(z0 + a["m180"], m + 1)
+
+    x1, y1, z1 = x0.copy(), y0.copy(), z0.copy()
+    d1 = np.zeros(x0.shape, dtype=bool)
+
+    vc = (mode == MODE_VECTOR) & (submode == SUBMODE_CIRCULAR)
+    rc = (mode == MODE_ROTATE) & (submode == SUBMODE_CIRCULAR)
+    vl = (mode == MODE_VECTOR) & (submode == SUBMODE_LINEAR)
+    rl = (mode == MODE_ROTATE) & (submode == SUBMODE_LINEAR)
+
+    # vector / circular
+    sel = vc & (x0 >= 0) & (y0 < 0)
+    d1[sel] = True
+    sel = vc & (x0 < 0) & (y0 >= 0)
+    x1[sel], y1[sel], z1[sel] = y0[sel], nx0[sel], z_p90[sel]
+    sel = vc & (x0 < 0) & (y0 < 0)
+    x1[sel], y1[sel], z1[sel], d1[sel] = ny0[sel], x0[sel], z_m90[sel], True
+
+    # rotate / circular
+    sel = rc & (z0 <= a["p90"]) & (z0 >= 0)
+    d1[sel] = True
+    sel = rc & (z0 < a["m90"]) & (z0 >= a["m180"])
+    x1[sel], y1[sel], z1[sel] = y0[sel], nx0[sel], z_p90[sel]
+    sel = rc & (z0 <= a["p180"]) & (z0 > a["p90"])
+    x1[sel], y1[sel], z1[sel], d1[sel] = ny0[sel], x0[sel], z_m90[sel], True
+    sel = rc & (z0 < a["m180"])
+    x1[sel], y1[sel], z1[sel] = nx0[sel], ny0[sel], z_p180[sel]
+    sel = rc & (z0 > a["p180"])
+    x1[sel], y1[sel], z1[sel], d1[sel] = nx0[sel], ny0[sel], z_m180[sel], True
+
+    # vector / linear, rotate / linear
+    d1[vl & (y0 < 0)] = True
+    d1[rl & (z0 >= 0)] = True
+
+    # No branch for the hyperbolic submode: the registers keep their values.
+    hold = ~(vc | rc | vl | rl)
+    if hold.any():
+        last = np.where(hold, -1, np.arange(x0.size))
+        last = np.maximum.accumulate(last)
+        state = np.array(init_state, dtype=np.int64)
+        x1 = np.where(last < 0, state[0], x1[np.maximum(last, 0)])
+        y1 = np.where(last < 0, state[1], y1[np.maximum(last, 0)])
+        z1 = np.where(last < 0, state[2], z1[np.maximum(last, 0)])
+        d1 = np.where(last < 0, bool(state[3]), d1[np.maximum(last, 0)])
+    return x1, y1, z1, d1
+
+
+def _phi(stage, submode, m, angle_format):
+    """f_phi_lookup(stage)(31 downto 32-m), per sample."""
+    circ = LUT_CIRC_A0 if angle_format == ANGLE_FORMAT_S8_7 else LUT_CIRC_A1
+    return np.where(submode == SUBMODE_CIRCULAR,
+                    circ[stage] >> (32 - m), LUT_LIN[stage] >> (32 - m))
+
+
+def gc_cordic(x0, y0, z0, mode, submode, n=12, m=16,
+              angle_format=ANGLE_FORMAT_FULL_SCALE_180, saturate=False,
+              lim_x=0, lim_y=0, init_state=(0, 0, 0, 0)):
+    """Model of gc_cordic with generics g_N=N, g_M=M,
+    g_ANGLE_FORMAT=ANGLE_FORMAT and g_USE_SATURATED_MATH=SATURATE.
+
+    X0, Y0, Z0 are signed M-bit integers.  Return (xn, yn, zn, lim_x, lim_y)
+    as int64 arrays (and boolean arrays for the limits)."""
+    if not 3 <= n <= 33:
+        raise ValueError("g_N must be between 3 and 33")
+    if not 3 <= m <= 32:
+        raise ValueError("g_M must be between 3 and 32")
+    x0, y0, z0, mode, submode, lim_x, lim_y = _as_arrays(
+        x0, y0, z0, mode, submode, lim_x, lim_y)
+    shape = x0.shape
+    x0, y0, z0, mode, submode, lim_x, lim_y = [
+        a.ravel() for a in (x0, y0, z0, mode, submode, lim_x, lim_y)]
+
+    x, y, z, d = _cordic_init(wrap(x0, m), wrap(y0, m), wrap(z0, m),
+                              mode, submode, m, angle_format, init_state)
+    lx = lim_x != 0
+    ly = lim_y != 0
+
+    # cordic_xy_logic_nmhd: cell 0 (hd, d from init) then n-2 nhd cells.
+    for j in range(n - 1):
+        if j > 0:
+            d = np.where(mode == MODE_VECTOR, y < 0, z >= 0)
+        if j <= m - 2:
+            xs, ys = x >> j, y >> j
+        else:
+            xs, ys = np.zeros_like(x), np.zeros_like(y)
+        ym = np.where(submode == SUBMODE_CIRCULAR,
+                      limit_negate(ys, ~d, m, saturate),
+                      np.where(submode == SUBMODE_HYPERBOLIC,
+                               limit_negate(ys, d, m, saturate), 0))
+        xm = limit_negate(xs, ~d, m, saturate)
+        fi = limit_negate(_phi(j, submode, m, angle_format), ~d, m, saturate)
+        x, limx = limit(x - ym, m, saturate)
+        y, limy = limit(y + xm, m, saturate)
+        z = wrap(z - fi, m + 1)
+        lx |= limx
+        ly |= limy
+
+    # cordic_modulo_360
+    a = dict((k, v >> (32 - m)) for k, v in _ANGLES_X[angle_format].items())
+    offs = np.where(z < a["m180"], a["p360"], np.where(z > a["p180"], a["m360"], 0))
+    offs = np.where(submode == SUBMODE_CIRCULAR, offs, 0)
+    zn, _ = limit(z + offs, m + 1, saturate)
+    zn = wrap(zn, m)
+
+    return (x.reshape(shape), y.reshape(shape), zn.reshape(shape),
+            lx.reshape(shape), ly.reshape(shape))
+
+
+def gc_cordic_top(x, y, z, mode, submode, width=16, iterations=16):
+    """Model of gc_cordic_top with generics g_WIDTH=WIDTH and
+    g_ITERATIONS=ITERATIONS.  Return (x_o, y_o, z_o, lim_x_o, lim_y_o).
+
+    The hyperbolic submode is not modelled: its first rotation angle,
+    arctanh(1), is infinite."""
+    w = width
+    x, y, z, mode, submode = _as_arrays(x, y, z, mode, submode)
+    shape = x.shape
+    x, y, z, mode, submode = [wrap(a.ravel(), w) if i < 3 else a.ravel()
+                              for i, a in enumerate((x, y, z, mode, submode))]
+    if (submode == SUBMODE_HYPERBOLIC).any():
+        raise ValueError("the hyperbolic submode of gc_cordic_top is not modelled")
+
+    fs = 2.0 ** (w - 1) - 1.0
+    p90 = 2 ** (w - 2) - 1
+
+    # p_cordic_init
+    quad = (z >> (w - 2)) & 3
+    nx, ny = wrap(-x, w), wrap(-y, w)
+    x1, y1, z1 = x.copy(), y.copy(), z.copy()
+    rc = (mode == MODE_ROTATE) & (submode == SUBMODE_CIRCULAR)
+    vc = (mode == MODE_VECTOR) & (submode == SUBMODE_CIRCULAR)
+    sel = rc & (quad == 1)
+    x1[sel], y1[sel], z1[sel] = ny[sel], x[sel], wrap(z - p90, w)[sel]
+    sel = rc & (quad == 2)
+    x1[sel], y1[sel], z1[sel] = y[sel], nx[sel], wrap(z + p90, w)[sel]
+    sel = vc & (x < 0) & (y >= 0)
+    x1[sel], y1[sel], z1[sel] = y[sel], nx[sel], wrap(z + p90, w)[sel]
+    sel = vc & (x < 0) & (y < 0)
+    x1[sel], y1[sel], z1[sel] = ny[sel], x[sel], wrap(z - p90, w)[sel]
+    x, y, z = x1, y1, z1
+
+    limx = np.zeros(x.shape, dtype=bool)
+    limy = np.zeros(x.shape, dtype=bool)
+    sat_z = (mode != MODE_VECTOR) & (submode != SUBMODE_CIRCULAR)
+    for i in range(iterations - 1):
+        alpha_c = vhdl_round(math.atan(1.0 / 2.0 ** i) * fs / math.pi)
+        alpha_l = vhdl_round(1.0 / 2.0 ** i * fs)
+        neg = np.where(mode == MODE_ROTATE, z < 0, (x < 0) == (y < 0))
+        if i >= w - 1:
+            xs, ys = np.zeros_like(x), np.zeros_like(y)
+        else:
+            xs, ys = x >> i, y >> i
+        circ = submode == SUBMODE_CIRCULAR
+        alpha = limit_negate(np.where(circ, alpha_c, alpha_l), neg, w, True)
+        ym = np.where(circ, limit_negate(ys, neg, w, True), 0)
+        xm = limit_negate(xs, neg, w, True)
+        x, limx = limit(x - ym, w, True)
+        y, limy = limit(y + xm, w, True)
+        zs, _ = limit(z - alpha, w, True)
+        z = np.where(sat_z, zs, wrap(z - alpha, w))
+
+    return (x.reshape(shape), y.reshape(shape), z.reshape(shape),
+            limx.reshape(shape), limy.reshape(shape))
+
+
+def expected(x, y, z, mode, submode, nbits):
+    """Floating point expectations of gc_cordic_tb.vhd (f_check_result) for
+    the circular and linear submodes, as (ex, ey, ez) int64 arrays."""
+    x, y, z, mode, submode = _as_arrays(x, y, z, mode, submode)
+    xf, yf, zf = x.astype(float), y.astype(float), z.astype(float)
+    s = 2.0 ** (nbits - 1) - 1.0
+    k = compute_an(nbits) / s
+    ex = np.zeros(x.shape, dtype=np.int64)
+    ey = np.zeros(x.shape, dtype=np.int64)
+    ez = np.zeros(x.shape, dtype=np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ang = zf / s * np.pi
+        sel = (mode == MODE_ROTATE) & (submode == SUBMODE_CIRCULAR)
+        ex[sel] = vhdl_round(1.0 / k * (xf * np.cos(ang) - yf * np.sin(ang)))[sel]
+        ey[sel] = vhdl_round(1.0 / k * (yf * np.cos(ang) + xf * np.sin(ang)))[sel]
+
+        sel = (mode == MODE_ROTATE) & (submode == SUBMODE_LINEAR)
+        ex[sel] = x[sel]
+        ey[sel] = vhdl_round((yf / s + xf * zf / (s * s)) * s)[sel]
+
+        sel = (mode == MODE_VECTOR) & (submode == SUBMODE_CIRCULAR)
+        ex[sel] = vhdl_round(1.0 / k * np.sqrt(xf * xf + yf * yf))[sel]
+        half = vhdl_round(0.5 * s)
+        zz = np.where(x == 0,
+                      np.where(x * y >= 0, z - half, z + half),
+                      z + vhdl_round(np.nan_to_num(np.arctan(yf / xf)) * s / np.pi))
+        zz = np.where(x < 0, zz - vhdl_round(s), zz)
+        for _ in range(2):
+            zz = np.where(zz > vhdl_round(s), zz - vhdl_round(2.0 * s), zz)
+            zz = np.where(zz < -vhdl_round(s), zz + vhdl_round(2.0 * s), zz)
+        ez[sel] = zz[sel]
+
+        sel = (mode == MODE_VECTOR) & (submode == SUBMODE_LINEAR) & (x != 0)
+        ex[sel] = x[sel]
+        ez[sel] = vhdl_round(zf + yf / xf * s)[sel]
+    return ex, ey, ez
+
+
+def error(res, target, overflow_ok, nbits):
+    """Absolute error of RES, wrapped to NBITS when OVERFLOW_OK (like
+    f_check_error of gc_cordic_tb.vhd for the angles)."""
+    d = np.asarray(res, dtype=np.int64) - target
+    if overflow_ok:
+        d = wrap(d, nbits)
+    return np.abs(d)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep the gc_cordic_top model against the testbench expectations")
+    parser.add_argument("--mode", choices=MODES, default="rotate")
+    parser.add_argument("--submode", choices=["circular", "linear"], default="circular")
+    parser.add_argument("-w", "--width", type=int, default=14,
+                        help="g_WIDTH (default is 14, as in gc_cordic_tb)")
+    parser.add_argument("-n", "--iterations", type=int, default=14,
+                        help="g_ITERATIONS (default is 14, as in gc_cordic_tb)")
+    parser.add_argument("-s", "--samples", type=int, default=1000000,
+                        help="number of random samples (default is 1000000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output",
+                        help="also write the samples in the testbench format"
+                        " (binary if the name ends with .bin, CSV otherwise)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    w = args.width
+    fs = 2 ** (w - 1) - 1
+    mode = MODES[args.mode]
+    submode = SUBMODES[args.submode]
+    # Same input ranges as gc_cordic_tb.vhd
+    if submode == SUBMODE_CIRCULAR:
+        mag = rng.random(args.samples) / 1.646760258121
+        ang = (rng.random(args.samples) * 2 - 1) * np.pi
+        x = vhdl_round(mag * np.cos(ang) * 2.0 ** (w - 1) - 1.0)
+        y = vhdl_round(mag * np.sin(ang) * 2.0 ** (w - 1) - 1.0)
+        z = vhdl_round((rng.random(args.samples) * 2 - 1) * 2.0 ** (w - 1) - 1.0)
+    elif mode == MODE_ROTATE:
+        x = rng.integers(-fs, fs, args.samples, endpoint=True)
+        y = np.zeros(args.samples, dtype=np.int64)
+        z = rng.integers(-fs, fs, args.samples, endpoint=True)
+    else:
+        xf = rng.random(args.samples) * 2 - 1
+        yf = (rng.random(args.samples) * 2 - 1) * xf
+        zf = (rng.random(args.samples) * 2 - 1) * (1 - np.abs(yf / xf))
+        x = vhdl_round(xf * 2.0 ** (w - 1) - 1.0)
+        y = vhdl_round(yf * 2.0 ** (w - 1) - 1.0)
+        z = vhdl_round(zf * 2.0 ** (w - 1) - 1.0)
+
+    # The testbench fails on out of range values, skip them.
+    x, y, z = [np.clip(v, -fs - 1, fs) for v in (x, y, z)]
+
+    ox, oy, oz, _, _ = gc_cordic_top(x, y, z, mode, submode, w, args.iterations)
+    ex, ey, ez = expected(x, y, z, mode, submode, w)
+    vector = mode == MODE_VECTOR
+    for name, o, e, ovf in (("x", ox, ex, False),
+                            ("y", oy, ey, vector and submode == SUBMODE_LINEAR),
+                            ("z", oz, ez, vector and submode == SUBMODE_CIRCULAR)):
+        err = error(o, e, ovf, w)
+        i = int(np.argmax(err))
+        print("{}: max error {} (in = {}, {}, {}), mean error {:.3f}".format(
+            name, err[i], x[i], y[i], z[i], err.mean()))
+
+    if args.output:
+        cols = dict(zip(cordic_results.COLUMNS,
+                        (x, y, z, ox, oy, oz, ex, ey, ez,
+                         np.full_like(x, mode), np.full_like(x, submode))))
+        if args.output.endswith(".bin"):
+            cordic_results.write_binary(args.output, w, cols)
+        else:
+            data = np.stack([cols[c] for c in cordic_results.COLUMNS], axis=1)
+            np.savetxt(args.output, data, fmt="%d", delimiter=",")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Result files of gc_cordic_tb.vhd.
+
+Two formats are written by the testbench:
+ - CSV (res.txt, the default): one line per sample,
+   "ix,iy,iz,ox,oy,oz,ex,ey,ez,mode,submode" with the mode and submode in
+   hexadecimal.
+ - binary (res.bin, if g_BINARY_RESULTS is set): an 8 bytes header ("GCCR",
+   the format version, the input width and two reserved bytes) followed by
+   20 bytes records: the nine values as little endian int16 (saturated), then
+   the mode and the submode as bytes.
+
+Binary files are mapped with numpy.memmap: the columns are returned as views
+of the file, without any copy or parsing.
+"""
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["ix", "iy", "iz", "ox", "oy", "oz", "ex", "ey", "ez", "mode", "submode"]
+
+MAGIC = b"GCCR"
+VERSION = 1
+HEADER_SIZE = 8
+
+RECORD = np.dtype([(c, "<i2") for c in COLUMNS[:9]]
+                  + [("mode", "u1"), ("submode", "u1")])
+
+# mode and submode are written with to_hstring
+_MODE_DTYPE = pd.CategoricalDtype(["0", "1"])
+_SUBMODE_DTYPE = pd.CategoricalDtype(["0", "1", "3"])
+_CSV_DTYPES = dict([(c, np.int32) for c in COLUMNS[:9]]
+                   + [("mode", _MODE_DTYPE), ("submode", _SUBMODE_DTYPE)])
+
+
+def is_binary(filename):
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def open_binary(filename):
+    """Return (width, records) of a binary result file, records being a
+    read-only memmap of RECORD."""
+    with open(filename, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) != HEADER_SIZE or header[:4] != MAGIC:
+        raise ValueError("{}: not a gc_cordic binary result file".format(filename))
+    if header[4] != VERSION:
+        raise ValueError("{}: unsupported version {}".format(filename, header[4]))
+    records = np.memmap(filename, dtype=RECORD, mode="r", offset=HEADER_SIZE)
+    return header[5], records
+
+
+def write_binary(filename, width, columns):
+    """Write the dict of arrays COLUMNS as a binary result file."""
+    n = len(columns["ix"])
+    records = np.zeros(n, dtype=RECORD)
+    for c in COLUMNS[:9]:
+        records[c] = np.clip(columns[c], -0x8000, 0x7fff)
+    records["mode"] = columns["mode"]
+    records["submode"] = columns["submode"]
+    with open(filename, "wb") as f:
+        f.write(MAGIC + bytes([VERSION, width, 0, 0]))
+        records.tofile(f)
+
+
+def iter_chunks(filename, chunksize):
+    """Yield the results of FILENAME, in either format, as dicts of column
+    arrays of at most CHUNKSIZE rows."""
+    if is_binary(filename):
+        _, records = open_binary(filename)
+        for start in range(0, len(records), chunksize):
+            chunk = records[start:start + chunksize]
+            yield dict((c, chunk[c]) for c in COLUMNS)
+        return
+
+    reader = pd.read_csv(filename, header=None, names=COLUMNS, dtype=_CSV_DTYPES,
+                         chunksize=chunksize, engine="c")
+    for chunk in reader:
+        cols = dict((c, chunk[c].to_numpy()) for c in COLUMNS[:9])
+        for c, dtype in (("mode", _MODE_DTYPE), ("submode", _SUBMODE_DTYPE)):
+            values = np.array([int(v, 16) for v in dtype.categories], dtype=np.uint8)
+            codes = chunk[c].cat.codes.to_numpy()
+            cols[c] = np.where(codes < 0, 0xff, values[codes]).astype(np.uint8)
+        yield cols
+
+
+def file_width(filename):
+    """Input width recorded in a binary result file, None for CSV."""
+    if is_binary(filename):
+        return open_binary(filename)[0]
+    return None
@@ -15,6 +15,12 @@ use std.textio.all;
 use work.gc_cordic_pkg.all;
 
 entity gc_cordic_tb is
+  generic (
+    -- Write the results as binary records in res.bin instead of text in
+    -- res.txt (see cordic_results.py for the formats).  The bytes of a file
+    -- of character are not written the same way by all the simulators, check
+    -- the header of res.bin before relying on it.
+    g_BINARY_RESULTS : boolean := false);
 end gc_cordic_tb;
 
 architecture tb of gc_cordic_tb is
@@ -29,6 +35,11 @@ architecture tb of gc_cordic_tb is
 
   signal s_done, s_done_shifted : std_logic := '0';
 
+  -- Binary result file: 8 bytes header, then records of nine little endian
+  -- int16 and the mode and submode bytes.
+  type t_BYTE_FILE is file of character;
+  constant c_RES_VERSION : integer := 1;
+
   signal s_cor_mode : t_CORDIC_MODE;
   signal s_cor_submode : t_CORDIC_SUBMODE;
 
@@ -468,10 +479,43 @@ begin
     variable v_vector_linear : integer := 0;
     variable v_exp_out : t_CORDIC_INT;
 
-    file test_vector      : text open write_mode is "res.txt";
+    file test_vector      : text;
+    file res_bin          : t_BYTE_FILE;
     variable row          : line;
 
+    procedure f_write_byte(v : integer) is
+    begin
+      write(res_bin, character'val(v mod 256));
+    end procedure f_write_byte;
+
+    procedure f_write_int16(v : integer) is
+      variable v_sat : integer;
+    begin
+      if v > 32767 then
+        v_sat := 32767;
+      elsif v < -32768 then
+        v_sat := -32768;
+      else
+        v_sat := v;
+      end if;
+      f_write_byte(v_sat mod 256);
+      f_write_byte((v_sat - v_sat mod 256) / 256);
+    end procedure f_write_int16;
+
   begin
+    if not g_BINARY_RESULTS then
+      file_open(test_vector, "res.txt", write_mode);
+    else
+      file_open(res_bin, "res.bin", write_mode);
+      f_write_byte(character'pos('G'));
+      f_write_byte(character'pos('C'));
+      f_write_byte(character'pos('C'));
+      f_write_byte(character'pos('R'));
+      f_write_byte(c_RES_VERSION);
+      f_write_byte(c_WIDTH);
+      f_write_byte(0);
+      f_write_byte(0);
+    end if;
     wait until falling_edge(s_rst);
     wait for (c_ITERATIONS+4)*c_CLK_PERIOD;
     while s_done_shifted = '0' loop
@@ -494,11 +538,25 @@ begin
         end if;
       end if;
 
-      write(row, integer'image(s_in_shifted.x) & "," & integer'image(s_in_shifted.y) & "," & integer'image(s_in_shifted.z) & "," & 
-                 integer'image(s_out.x) & "," & integer'image(s_out.y) & "," & integer'image(s_out.z) & "," & 
-                 integer'image(v_exp_out.x) & "," & integer'image(v_exp_out.y) & "," & integer'image(v_exp_out.z) 
-                 & "," & to_hstring(s_in_shifted.mode) & "," & to_hstring(s_in_shifted.submode));
-      writeline(test_vector, row);
+      if not g_BINARY_RESULTS then
+        write(row, integer'image(s_in_shifted.x) & "," & integer'image(s_in_shifted.y) & "," & integer'image(s_in_shifted.z) & "," & 
+                   integer'image(s_out.x) & "," & integer'image(s_out.y) & "," & integer'image(s_out.z) & "," & 
+                   integer'image(v_exp_out.x) & "," & integer'image(v_exp_out.y) & "," & integer'image(v_exp_out.z) 
+                   & "," & to_hstring(s_in_shifted.mode) & "," & to_hstring(s_in_shifted.submode));
+        writeline(test_vector, row);
+      else
+        f_write_int16(s_in_shifted.x);
+        f_write_int16(s_in_shifted.y);
+        f_write_int16(s_in_shifted.z);
+        f_write_int16(s_out.x);
+        f_write_int16(s_out.y);
+        f_write_int16(s_out.z);
+        f_write_int16(v_exp_out.x);
+        f_write_int16(v_exp_out.y);
+        f_write_int16(v_exp_out.z);
+        f_write_byte(to_integer(unsigned(s_in_shifted.mode)));
+        f_write_byte(to_integer(unsigned(s_in_shifted.submode)));
+      end if;
     end loop;
     
     report "Total errors : " & integer'image(v_n_err);
@@ -0,0 +1,150 @@
+"""Bit-exact NumPy model of gc_pipelined_fir_filter.
+
+The RTL multiplies each input sample by the first c_NUM_TAPS coefficients
+(each one truncated to g_COEF_BITS) and sums the products in a systolic chain
+of c_ACC_BITS registers, so that coefs_i(ORDER-1) multiplies the most recent
+sample and coefs_i(0) the oldest one.  With g_SYMMETRIC, the chain uses
+coefs_i(ORDER-1-i) for the positions beyond c_NUM_TAPS.  The sum is then
+rounded (half up) by g_OUTPUT_SHIFT bits and wrapped to g_OUTPUT_BITS.
+
+The pipeline has no clock enable: the model assumes a sample on every clock,
+and zeros before the first one (the RTL has no reset of its registers, the
+first ORDER-1 outputs are not flagged by d_valid_o).
+
+Run this file to write random stimulus and the expected outputs, as done by
+main.sv, for a simulator-based check.
+"""
+
+import argparse
+
+import numpy as np
+
+
+def wrap(v, bits):
+    """Two's complement wrap-around of V to BITS bits."""
+    half = 1 << (bits - 1)
+    return ((np.asarray(v, dtype=np.int64) + half) & ((1 << bits) - 1)) - half
+
+
+def log2_size(n):
+    """f_log2_size of genram_pkg."""
+    return max(0, int(n - 1).bit_length())
+
+
+def num_taps(order, symmetric):
+    """c_NUM_TAPS: number of multipliers."""
+    return (order + 1) // 2 if symmetric else order
+
+
+def acc_bits(order, coef_bits, data_bits):
+    """c_ACC_BITS."""
+    return data_bits + coef_bits + log2_size(order) + 1
+
+
+def effective_coefs(coefs, order, coef_bits=16, symmetric=False):
+    """Coefficients of each position of the sum chain, as used by the RTL
+    (truncated to COEF_BITS, mirrored if SYMMETRIC)."""
+    c = wrap(np.asarray(coefs, dtype=np.int64)[:order], coef_bits)
+    if len(c) < order:
+        c = np.concatenate([c, np.zeros(order - len(c), dtype=np.int64)])
+    if symmetric:
+        n = num_taps(order, symmetric)
+        c = np.concatenate([c[:n], c[:order - n][::-1]])
+    return c
+
+
+def round_output(acc, output_shift, output_bits):
+    """p_round_output: round the accumulator ACC half up by OUTPUT_SHIFT bits
+    and wrap it to OUTPUT_BITS.  Return (d_o, overflow), overflow being true
+    when the rounded value does not fit in OUTPUT_BITS."""
+    rounded = ((np.asarray(acc, dtype=np.int64) >> (output_shift - 1)) + 1) >> 1
+    res = wrap(rounded, output_bits)
+    return res, res != rounded
+
+
+class FirFilter(object):
+    """gc_pipelined_fir_filter with the given generics and coefs_i.  The
+    delay line is kept between calls to filter()."""
+
+    def __init__(self, coefs, order, coef_bits=16, data_bits=16, output_bits=16,
+                 output_shift=16, symmetric=False):
+        if order > 128:
+            raise ValueError("order {} above c_FIR_MAX_COEFS".format(order))
+        if output_shift < 1 or output_bits + output_shift > acc_bits(order, coef_bits, data_bits):
+            raise ValueError("output bits {} and shift {} do not fit the {} bits accumulator"
+                             .format(output_bits, output_shift,
+                                     acc_bits(order, coef_bits, data_bits)))
+        self.order = order
+        self.coef_bits = coef_bits
+        self.data_bits = data_bits
+        self.output_bits = output_bits
+        self.output_shift = output_shift
+        self.symmetric = symmetric
+        # Impulse response: the last coefficient of the chain applies to the
+        # newest sample.
+        self.h = effective_coefs(coefs, order, coef_bits, symmetric)[::-1]
+        self.history = np.zeros(order - 1, dtype=np.int64)
+        self.overflows = 0
+
+    def accumulate(self, x):
+        """chain_sum(ORDER-1) for the samples X (wrapped to c_ACC_BITS)."""
+        x = wrap(x, self.data_bits)
+        buf = np.concatenate([self.history, x])
+        self.history = buf[len(buf) - (self.order - 1):]
+        acc = np.convolve(buf, self.h, mode="valid")
+        return wrap(acc, acc_bits(self.order, self.coef_bits, self.data_bits))
+
+    def filter(self, x):
+        """d_o for the samples X, one per clock."""
+        res, ovf = round_output(self.accumulate(x), self.output_shift, self.output_bits)
+        self.overflows += int(np.count_nonzero(ovf))
+        return res
+
+
+def random_coefs(order, bits, symmetric, rng):
+    """Random coefficients as gen_some_coefs of main.sv."""
+    n = num_taps(order, symmetric)
+    c = rng.integers(-(1 << (bits - 1)) + 1, 1 << (bits - 1), n)
+    if symmetric:
+        c = np.concatenate([c, c[:order - n][::-1]])
+    return c
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write stimulus and expected outputs of gc_pipelined_fir_filter")
+    parser.add_argument("--order", type=int, default=16)
+    parser.add_argument("--coef-bits", type=int, default=16)
+    parser.add_argument("--data-bits", type=int, default=16)
+    parser.add_argument("--output-bits", type=int, default=16)
+    parser.add_argument("--output-shift", type=int, default=16)
+    parser.add_argument("--symmetric", action="store_true")
+    parser.add_argument("-c", "--coefs",
+                        help="file of integer coefficients, one per line (default is random)")
+    parser.add_argument("-s", "--samples", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="fir_vectors.txt",
+                        help="output file: d_i and the expected d_o per line")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.coefs:
+        coefs = np.loadtxt(args.coefs, dtype=np.int64, ndmin=1)
+    else:
+        coefs = random_coefs(args.order, args.coef_bits, args.symmetric, rng)
+    fir = FirFilter(coefs, args.order, args.coef_bits, args.data_bits, args.output_bits,
+                    args.output_shift, args.symmetric)
+    x = rng.integers(-(1 << (args.data_bits - 1)), 1 << (args.data_bits - 1), args.samples)
+    y = fir.filter(x)
+    with open(args.output, "w") as f:
+        f.write("# coefs: {}\n".format(" ".join(str(c) for c in coefs)))
+        f.write("# d_i d_o (d_valid_o is set from sample {})\n".format(args.order))
+        for a, b in zip(x, y):
+            f.write("{} {}\n".format(a, b))
+    print("{} samples, {} output overflows, accumulator of {} bits, {} multipliers".format(
+        args.samples, fir.overflows, acc_bits(args.order, args.coef_bits, args.data_bits),
+        num_taps(args.order, args.symmetric)))
+
+
+if __name__ == "__main__":
+    main()
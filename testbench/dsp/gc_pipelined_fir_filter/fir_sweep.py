@@ -0,0 +1,269 @@
+"""Coefficient quantization explorer for gc_pipelined_fir_filter.
+
+A real-valued prototype filter (a windowed sinc low-pass, or taps read from a
+file) is quantized for every combination of g_COEF_BITS, g_OUTPUT_SHIFT and
+g_OUTPUT_BITS of the sweep: the coefficients are round(h * 2**(shift +
+output_bits - data_bits)), so that the gain of the filter is kept, and
+combinations whose coefficients do not fit in g_COEF_BITS are rejected.
+
+The accepted combinations are evaluated together with fir_model: the
+accumulator values of all of them are one matrix product between the sliding
+windows of the stimulus and the matrix of the coefficient sets (in float64,
+exact as long as c_ACC_BITS <= 53, and in int64 otherwise), computed by chunks
+of samples.  The rounding and wrapping of each combination are then applied on
+the columns of the result.
+
+For each combination, the sweep reports:
+ - the SNR of the output against the unquantized filter,
+ - the probability of an output overflow (a wrapped d_o),
+ - the number of multipliers (c_NUM_TAPS) and an estimate of the number of
+   DSP blocks, from the width of the operands (g_DATA_BITS+1 by g_COEF_BITS)
+   and the size of the DSP multipliers of the target.
+"""
+
+import argparse
+import math
+import sys
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import fir_model
+
+# Signed operand widths of the DSP multipliers
+DSP_SIZES = {
+    "18x18": (18, 18),  # Spartan-6 DSP48A1
+    "25x18": (25, 18),  # 7 series DSP48E1
+    "27x18": (27, 18),  # UltraScale DSP48E2
+}
+
+# Number of accumulator values computed at once
+_BLOCK = 1 << 22
+
+
+def lowpass(order, cutoff, window="hamming"):
+    """Windowed sinc low-pass prototype of ORDER taps, CUTOFF relative to the
+    Nyquist frequency, with a DC gain of 1."""
+    n = np.arange(order) - (order - 1) / 2.0
+    h = cutoff * np.sinc(cutoff * n)
+    if window != "rect":
+        h *= getattr(np, window)(order)
+    return h / h.sum()
+
+
+def multiplier_dsps(a_bits, b_bits, dsp):
+    """Number of DSP blocks of a signed A_BITS x B_BITS multiplier, built from
+    DSP multipliers of signed widths DSP."""
+    best = None
+    for p, q in (dsp, dsp[::-1]):
+        n = (max(1, math.ceil((a_bits - 1) / (p - 1)))
+             * max(1, math.ceil((b_bits - 1) / (q - 1))))
+        best = n if best is None else min(best, n)
+    return best
+
+
+class Sweep(object):
+    """Evaluation of the combinations (coef_bits, output_shift, output_bits)
+    of CONFIGS for the prototype H."""
+
+    def __init__(self, h, data_bits, configs, symmetric=False, gain=1.0):
+        self.h = np.asarray(h, dtype=float)
+        self.order = len(self.h)
+        self.data_bits = data_bits
+        self.symmetric = symmetric
+        self.gain = gain
+
+        self.configs = []
+        self.rejected = []
+        coefs = []
+        for coef_bits, shift, output_bits in configs:
+            scale = gain * 2.0 ** (shift + output_bits - data_bits)
+            c = np.round(self.h * scale).astype(np.int64)
+            abits = fir_model.acc_bits(self.order, coef_bits, data_bits)
+            if shift < 1 or output_bits + shift > abits:
+                self.rejected.append((coef_bits, shift, output_bits, "accumulator"))
+            elif np.abs(c).max() >= 1 << (coef_bits - 1):
+                self.rejected.append((coef_bits, shift, output_bits, "coefficients"))
+            else:
+                self.configs.append((coef_bits, shift, output_bits))
+                coefs.append(fir_model.effective_coefs(c, self.order, coef_bits, symmetric))
+        n = len(self.configs)
+        self.coefs = np.array(coefs, dtype=np.int64).reshape(n, self.order).T
+        self.shift = np.array([c[1] for c in self.configs], dtype=np.int64)
+        self.output_bits = np.array([c[2] for c in self.configs], dtype=np.int64)
+        self.exact_float = (n == 0 or max(
+            fir_model.acc_bits(self.order, c[0], data_bits) for c in self.configs) <= 53)
+
+        self.samples = 0
+        self.signal = np.zeros(n)
+        self.noise = np.zeros(n)
+        self.overflows = np.zeros(n, dtype=np.int64)
+
+    def run(self, x):
+        """Add the stimulus X (integers of data_bits bits), filtered from a
+        zero state; the first order-1 outputs are ignored, as d_valid_o."""
+        if not self.configs:
+            return
+        x = fir_model.wrap(x, self.data_bits)
+        windows = sliding_window_view(x, self.order)
+        # Reference in units of the output LSB
+        h_eff = self.h
+        if self.symmetric:
+            half = fir_model.num_taps(self.order, True)
+            h_eff = np.concatenate([self.h[:half], self.h[:self.order - half][::-1]])
+        ref_scale = self.gain * 2.0 ** (self.output_bits - self.data_bits)
+        coefs = self.coefs.astype(float) if self.exact_float else self.coefs
+
+        step = max(1, _BLOCK // len(self.configs))
+        for i in range(0, len(windows), step):
+            w = windows[i:i + step]
+            if self.exact_float:
+                acc = (w.astype(float) @ coefs).astype(np.int64)
+            else:
+                acc = w @ coefs
+            rounded = ((acc >> (self.shift - 1)) + 1) >> 1
+            half = np.left_shift(1, self.output_bits - 1)
+            out = ((rounded + half) & (2 * half - 1)) - half
+            ref = (w.astype(float) @ h_eff)[:, None] * ref_scale
+            self.signal += (ref * ref).sum(axis=0)
+            err = out - ref
+            self.noise += (err * err).sum(axis=0)
+            self.overflows += np.count_nonzero(out != rounded, axis=0)
+        self.samples += len(windows)
+
+    def snr(self):
+        with np.errstate(divide="ignore"):
+            return 10 * np.log10(self.signal / self.noise)
+
+    def overflow_probability(self):
+        return self.overflows / max(1, self.samples)
+
+    def results(self, dsp):
+        """List of dicts, one per accepted combination."""
+        taps = fir_model.num_taps(self.order, self.symmetric)
+        res = []
+        for k, (coef_bits, shift, output_bits) in enumerate(self.configs):
+            res.append({
+                "coef_bits": coef_bits,
+                "output_shift": shift,
+                "output_bits": output_bits,
+                "acc_bits": fir_model.acc_bits(self.order, coef_bits, self.data_bits),
+                "snr": float(self.snr()[k]),
+                "overflow": float(self.overflow_probability()[k]),
+                "multipliers": taps,
+                "dsps": taps * multiplier_dsps(self.data_bits + 1, coef_bits, dsp),
+            })
+        return res
+
+
+def _range(s):
+    """Parse N, N:M (inclusive) or a comma separated list of them."""
+    res = []
+    for part in s.split(","):
+        if ":" in part:
+            a, b = part.split(":")
+            res.extend(range(int(a), int(b) + 1))
+        else:
+            res.append(int(part))
+    return res
+
+
+def stimulus(kind, samples, data_bits, amplitude, rng):
+    full = (1 << (data_bits - 1)) - 1
+    if kind == "noise":
+        x = rng.uniform(-1, 1, samples)
+    else:
+        # Sines at random frequencies, phases and amplitudes
+        t = np.arange(samples)
+        x = np.zeros(samples)
+        for f, p, a in zip(rng.uniform(0, 0.5, 8), rng.uniform(0, 2 * np.pi, 8),
+                           rng.uniform(0, 1, 8)):
+            x += a * np.sin(2 * np.pi * f * t + p)
+        x /= np.abs(x).max()
+    return np.round(x * amplitude * full).astype(np.int64)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep the coefficient width and output shift of gc_pipelined_fir_filter")
+    parser.add_argument("--order", type=int, default=32, help="g_ORDER (default is 32)")
+    parser.add_argument("--cutoff", type=float, default=0.25,
+                        help="cutoff of the low-pass prototype, relative to Nyquist"
+                        " (default is 0.25)")
+    parser.add_argument("--window", default="hamming",
+                        choices=("rect", "hamming", "hanning", "blackman", "bartlett"))
+    parser.add_argument("-t", "--taps",
+                        help="file of real-valued prototype taps, one per line"
+                        " (instead of the low-pass)")
+    parser.add_argument("--gain", type=float, default=1.0,
+                        help="gain of the filter (default is 1)")
+    parser.add_argument("--symmetric", action="store_true", help="g_SYMMETRIC")
+    parser.add_argument("--data-bits", type=int, default=16, help="g_DATA_BITS (default is 16)")
+    parser.add_argument("--coef-bits", type=_range, default=_range("8:27"),
+                        help="g_COEF_BITS values, as N, N:M or lists (default is 8:27)")
+    parser.add_argument("--output-shift", type=_range, default=_range("1:40"),
+                        help="g_OUTPUT_SHIFT values (default is 1:40)")
+    parser.add_argument("--output-bits", type=_range, default=_range("16"),
+                        help="g_OUTPUT_BITS values (default is 16)")
+    parser.add_argument("--signal", choices=("noise", "sines"), default="noise",
+                        help="stimulus (default is uniform noise)")
+    parser.add_argument("-a", "--amplitude", type=float, default=0.5,
+                        help="amplitude of the stimulus relative to full scale (default is"
+                        " 0.5: with full-scale noise, the output overflows for every width)")
+    parser.add_argument("-s", "--samples", type=int, default=1 << 16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dsp", choices=DSP_SIZES, default="25x18",
+                        help="DSP multiplier size of the target (default is 25x18)")
+    parser.add_argument("--min-snr", type=float,
+                        help="only show combinations with at least this SNR (dB)")
+    parser.add_argument("--max-overflow", type=float,
+                        help="only show combinations with at most this overflow probability")
+    parser.add_argument("-o", "--output", help="write all the results to this CSV file")
+    args = parser.parse_args()
+
+    if args.taps:
+        h = np.loadtxt(args.taps, ndmin=1)
+    else:
+        h = lowpass(args.order, args.cutoff, args.window)
+    if len(h) > 128:
+        parser.error("{} taps, above c_FIR_MAX_COEFS".format(len(h)))
+
+    configs = [(c, s, o) for c in args.coef_bits for s in args.output_shift
+               for o in args.output_bits]
+    sweep = Sweep(h, args.data_bits, configs, args.symmetric, args.gain)
+    rng = np.random.default_rng(args.seed)
+    sweep.run(stimulus(args.signal, args.samples, args.data_bits, args.amplitude, rng))
+    results = sweep.results(DSP_SIZES[args.dsp])
+    print("{} combinations evaluated, {} rejected (coefficients or accumulator too narrow)"
+          .format(len(results), len(sweep.rejected)))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            keys = ["coef_bits", "output_shift", "output_bits", "acc_bits", "snr",
+                    "overflow", "multipliers", "dsps"]
+            f.write(",".join(keys) + "\n")
+            for r in results:
+                f.write(",".join(str(r[k]) for k in keys) + "\n")
+
+    # Best output shift of each width
+    best = {}
+    for r in results:
+        if ((args.max_overflow is not None and r["overflow"] > args.max_overflow)
+                or (args.min_snr is not None and r["snr"] < args.min_snr)):
+            continue
+        key = (r["coef_bits"], r["output_bits"])
+        if key not in best or r["snr"] > best[key]["snr"]:
+            best[key] = r
+    print("{:>9} {:>6} {:>6} {:>5} {:>8} {:>10} {:>5} {:>5}".format(
+        "coef_bits", "shift", "out", "acc", "snr (dB)", "overflow", "mult", "dsps"))
+    for key in sorted(best):
+        print("{coef_bits:>9} {output_shift:>6} {output_bits:>6} {acc_bits:>5} {snr:>8.2f}"
+              " {overflow:>10.2e} {multipliers:>5} {dsps:>5}".format(**best[key]))
+    if any(r["overflow"] for r in best.values()):
+        print("warning: outputs overflow: their SNR is limited by the wrapping;"
+              " lower --amplitude or --gain", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+"""Precompiled GHDL libraries of general-cores and OSVVM, shared by the
+testbenches.
+
+The files of the library manifests (the top-level Manifest.py of
+general-cores, and testbench/osvvm for VHDL-2008) are collected as hdlmake
+does, evaluating each Manifest.py with the variables of the testbench (target,
+syn_device, ...).  They are analysed once, in dependency order, into a cache
+directory named after a hash of:
+ - the content and path of every source file,
+ - the GHDL version and analysis options,
+ - the manifest variables,
+so that any change of the sources gives a new set of libraries.  Files that
+cannot be analysed (missing vendor libraries for instance) are left out and
+listed in the cache, with the log of their analysis; the testbenches that
+depend on them, directly or not, then fail at the library step.  Files of the
+manifests that do not exist (submodules not checked out) are listed too.
+
+A testbench then copies the library index files (*.cf) into its work
+directory, hard links the object files, and only analyses its own files.
+
+The cache is in build/libs below the testbench directory, or in the directory
+given by the GC_GHDL_LIB_CACHE environment variable (CI caches).
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+
+TB_ROOT = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(TB_ROOT)
+OSVVM_DIR = os.path.join(TB_ROOT, "osvvm")
+
+DEFAULT_CACHE = os.path.join(TB_ROOT, "build", "libs")
+
+# Bump when the layout of the cache changes.
+CACHE_VERSION = 2
+
+# Variables of the top manifest given to the other manifests
+MANIFEST_VARS = ["action", "target", "syn_device", "syn_family", "syn_grade",
+                 "syn_package", "sim_tool", "board"]
+
+VHDL_EXT = (".vhd", ".vhdl")
+
+
+def _as_list(v):
+    if v is None:
+        return []
+    return [v] if isinstance(v, str) else list(v)
+
+
+def collect_files(path, variables, skip=()):
+    """(library, file) of the manifest in directory PATH and of its local
+    modules, in hdlmake order (modules first).  The manifests are evaluated
+    with the MANIFEST_VARS of VARIABLES.  Directories of SKIP are not
+    walked."""
+    res = []
+    seen = set(os.path.abspath(s) for s in skip)
+
+    def walk(d):
+        d = os.path.abspath(d)
+        if d in seen:
+            return
+        seen.add(d)
+        manifest = os.path.join(d, "Manifest.py")
+        if not os.path.isfile(manifest):
+            return
+        env = dict((k, variables[k]) for k in MANIFEST_VARS
+                   if variables.get(k) is not None)
+        with open(manifest) as f:
+            exec(compile(f.read(), manifest, "exec"), env)
+        for m in _as_list((env.get("modules") or {}).get("local")):
+            walk(os.path.join(d, m))
+        lib = env.get("library") or "work"
+        for f in _as_list(env.get("files")):
+            res.append((lib, os.path.normpath(os.path.join(d, f))))
+
+    walk(path)
+    return res
+
+
+_COMMENT_RE = re.compile(r"--[^\n]*")
+_PROVIDES_RE = re.compile(
+    r"^\s*(?:entity|package|context)\s+(\w+)\s+is\b", re.I | re.M)
+_BODY_RE = re.compile(r"^\s*package\s+body\s+(\w+)\s+is\b", re.I | re.M)
+_USE_RE = re.compile(r"\b(?:use|context)\s+(\w+)\.(\w+)", re.I)
+_INST_RE = re.compile(r":\s*entity\s+(\w+)\.(\w+)", re.I)
+
+
+def vhdl_units(path):
+    """(units declared, units used) by a VHDL file, as lowercase
+    (library, name) tuples; 'work' stands for the library of the file."""
+    with open(path, errors="replace") as f:
+        text = _COMMENT_RE.sub("", f.read())
+    provides = set(("work", n.lower()) for n in _PROVIDES_RE.findall(text))
+    uses = set(("work", n.lower()) for n in _BODY_RE.findall(text))
+    for lib, name in _USE_RE.findall(text) + _INST_RE.findall(text):
+        uses.add((lib.lower(), name.lower()))
+    return provides, uses - provides
+
+
+def order_files(files):
+    """Sort the (library, file) list FILES so that units are analysed before
+    the files that use them, keeping the original order otherwise."""
+    provider = {}
+    deps = []
+    for lib, path in files:
+        provides, uses = vhdl_units(path)
+        for _, name in provides:
+            provider.setdefault((lib, name), path)
+        deps.append(set((lib if l == "work" else l, n) for l, n in uses))
+    index = dict((path, i) for i, (_, path) in enumerate(files))
+    done = set()
+    res = []
+
+    def visit(i, stack):
+        if i in done or i in stack:
+            return
+        stack.add(i)
+        for unit in sorted(deps[i]):
+            p = provider.get(unit)
+            if p is not None:
+                visit(index[p], stack)
+        stack.discard(i)
+        done.add(i)
+        res.append(files[i])
+
+    for i in range(len(files)):
+        visit(i, set())
+    return res
+
+
+def dependencies(files, roots):
+    """Files of the (library, file) list FILES that the (library, file)
+    list ROOTS depends on, directly or not, for their analysis (packages and
+    entities instantiated directly; components are only bound at
+    elaboration)."""
+    provider = {}
+    deps = {}
+    for lib, path in files:
+        if not os.path.isfile(path):
+            continue
+        provides, uses = vhdl_units(path)
+        for _, name in provides:
+            provider.setdefault((lib, name), path)
+        deps[path] = set((lib if l == "work" else l, n) for l, n in uses)
+    res = set()
+    todo = []
+    for lib, path in roots:
+        todo.extend((lib if l == "work" else l, n) for l, n in vhdl_units(path)[1])
+    while todo:
+        p = provider.get(todo.pop())
+        if p is not None and p not in res:
+            res.add(p)
+            todo.extend(deps[p])
+    return res
+
+
+def analysis_options(ghdl_opt):
+    """Options of GHDL_OPT (a ghdl_opt string of a manifest) that matter for
+    the analysis."""
+    return [o for o in (ghdl_opt or "").split() if not o.startswith("-W")]
+
+
+def ghdl_version():
+    try:
+        return subprocess.run(["ghdl", "--version"], stdout=subprocess.PIPE,
+                              universal_newlines=True).stdout
+    except OSError:
+        return ""
+
+
+def _std(options):
+    for o in options:
+        if o.startswith("--std="):
+            return o[6:]
+    return "93c"
+
+
+class LibraryCache(object):
+    """The precompiled libraries for the manifest VARIABLES and the GHDL
+    OPTIONS."""
+
+    _locks = {}
+    _locks_lock = threading.Lock()
+
+    def __init__(self, variables, options, cache_dir=None):
+        self.variables = dict((k, variables.get(k)) for k in MANIFEST_VARS)
+        self.options = list(options)
+        roots = [REPO_ROOT]
+        # OSVVM needs VHDL-2008
+        if _std(self.options) == "08":
+            roots.append(OSVVM_DIR)
+        self.roots = roots
+        self.files = []
+        for r in roots:
+            self.files.extend(f for f in collect_files(r, self.variables)
+                              if f[1].lower().endswith(VHDL_EXT))
+        self.cache_dir = (cache_dir or os.environ.get("GC_GHDL_LIB_CACHE")
+                          or DEFAULT_CACHE)
+        self.key = self._key()
+        self.path = os.path.join(self.cache_dir, self.key)
+
+    def _key(self):
+        h = hashlib.sha256()
+        h.update(repr((CACHE_VERSION, ghdl_version(), self.options,
+                       sorted(self.variables.items()))).encode())
+        for lib, path in self.files:
+            h.update("{}:{}\n".format(lib, os.path.relpath(path, REPO_ROOT)).encode())
+            try:
+                with open(path, "rb") as f:
+                    h.update(hashlib.sha256(f.read()).digest())
+            except IOError:
+                h.update(b"missing")
+        return h.hexdigest()[:20]
+
+    def file_set(self):
+        """Files of the libraries (analysed or not)."""
+        return set(path for _, path in self.files)
+
+    def is_built(self):
+        return os.path.isfile(os.path.join(self.path, "files.txt"))
+
+    def _listed(self, status):
+        prefix = "# {}: ".format(status)
+        res = []
+        with open(os.path.join(self.path, "files.txt")) as f:
+            for line in f:
+                if line.startswith(prefix):
+                    lib, path = line[len(prefix):].rstrip("\n").split(" ", 1)
+                    res.append((lib, path))
+        return res
+
+    def failed(self):
+        """(library, file) that could not be analysed."""
+        return self._listed("failed")
+
+    def missing(self):
+        """(library, file) of the manifests that do not exist."""
+        return self._listed("missing")
+
+    def dependencies(self, roots):
+        """Files of the libraries needed by the (library, file) ROOTS."""
+        return dependencies(self.files, roots)
+
+    def log(self):
+        """Log of the failed analyses."""
+        try:
+            with open(os.path.join(self.path, "analysis.log")) as f:
+                return f.read()
+        except IOError:
+            return ""
+
+    def build(self):
+        """Analyse the libraries, unless already done.  Return the log of
+        the failed analyses."""
+        with self._locks_lock:
+            lock = self._locks.setdefault(self.path, threading.Lock())
+        with lock:
+            if self.is_built():
+                return self.log()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = tempfile.mkdtemp(prefix=self.key + ".", dir=self.cache_dir)
+            log = []
+            analysed = []
+            failed = []
+            missing = [f for f in self.files if not os.path.isfile(f[1])]
+            for lib, path in order_files([f for f in self.files if os.path.isfile(f[1])]):
+                argv = (["ghdl", "-a", "--work=" + lib, "--workdir=" + tmp, "-P" + tmp]
+                        + self.options + [path])
+                p = subprocess.run(argv, cwd=tmp, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, universal_newlines=True,
+                                   errors="replace")
+                if p.returncode == 0:
+                    analysed.append((lib, path))
+                else:
+                    failed.append((lib, path))
+                    log.append("$ {}\n{}".format(" ".join(argv), p.stdout))
+            with open(os.path.join(tmp, "files.txt"), "w") as f:
+                for lib, path in analysed:
+                    f.write("{} {}\n".format(lib, path))
+                for lib, path in failed:
+                    f.write("# failed: {} {}\n".format(lib, path))
+                for lib, path in missing:
+                    f.write("# missing: {} {}\n".format(lib, path))
+            with open(os.path.join(tmp, "analysis.log"), "w") as f:
+                f.write("\n".join(log))
+            try:
+                os.rename(tmp, self.path)
+            except OSError:
+                # Built meanwhile by another process
+                shutil.rmtree(tmp, ignore_errors=True)
+            return "\n".join(log)
+
+    def install(self, workdir):
+        """Make the libraries available in WORKDIR."""
+        for fname in os.listdir(self.path):
+            src = os.path.join(self.path, fname)
+            dst = os.path.join(workdir, fname)
+            if fname in ("files.txt", "analysis.log") or not os.path.isfile(src):
+                continue
+            if fname.endswith(".cf"):
+                # Updated by the analysis of the testbench files
+                shutil.copyfile(src, dst)
+            else:
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    shutil.copyfile(src, dst)
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_cache(variables, options, cache_dir=None):
+    """The LibraryCache for VARIABLES, OPTIONS and CACHE_DIR, created once
+    and shared by all its users (the sources are hashed once)."""
+    key = (tuple((k, repr(variables.get(k))) for k in MANIFEST_VARS),
+           tuple(options), cache_dir)
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = LibraryCache(variables, options, cache_dir)
+        return _shared[key]
+
+
+def clean(cache_dir=None, keep=()):
+    """Remove the caches of CACHE_DIR except those of KEEP (keys)."""
+    cache_dir = cache_dir or os.environ.get("GC_GHDL_LIB_CACHE") or DEFAULT_CACHE
+    if not os.path.isdir(cache_dir):
+        return
+    for d in os.listdir(cache_dir):
+        if d not in keep:
+            shutil.rmtree(os.path.join(cache_dir, d), ignore_errors=True)
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""Run the testbenches in parallel and report the results as JUnit XML.
+
+Every Manifest.py below this directory with action = "simulation" is a
+testbench (or only those given on the command line).  Each one is built and
+run in its own work directory, build/<testbench>, so that several of them can
+run at the same time:
+ - a Manifest.py that includes the testbench directory as a module (with the
+   top-level variables of the testbench manifest) is written there, and the
+   files of the testbench directory are linked into it (run.sh, data files),
+ - GHDL testbenches are analysed against the precompiled general-cores and
+   OSVVM libraries of ghdl_libs.py (built once and shared by all of them):
+   only the files of the testbench are analysed, then the top is elaborated.
+   The other ones (or all with --no-lib-cache) are built by hdlmake and make,
+ - the simulation is run: ./run.sh when the testbench has one, otherwise the
+   default command of the simulator (ghdl -r for GHDL, vsim in batch mode with
+   run.do for ModelSim).
+
+The testbenches are processed by a pool of workers, one per core by default.
+A testbench fails if a step returns an error, or if its log has a failed
+assertion (severity error or failure) or a failed OSVVM test; the library
+step fails when files of the precompiled libraries that the testbench depends
+on could not be analysed.  Testbenches whose simulator is not installed are
+reported as skipped.
+"""
+
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+import traceback
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+import ghdl_libs
+
+TB_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+BUILD_DIR = os.path.join(TB_ROOT, "build")
+
+# Directories that are not testbenches
+EXCLUDE = ["build", "osvvm"]
+
+# Programs needed by each simulator
+SIMULATORS = {
+    "ghdl": ["ghdl"],
+    "modelsim": ["vsim", "vcom", "vlog"],
+}
+
+# Variables of the testbench manifests that are paths, rewritten in the
+# generated manifest.
+_PATH_VARS = ["include_dirs"]
+_SKIP_VARS = ["files", "modules", "fetchto"]
+
+_FAIL_RE = re.compile(r"\((assertion|report) (error|failure)\)|%% DONE +FAILED"
+                      r"|^\*\* (Error|Fatal)", re.M)
+_WARNING_RE = re.compile(r"\bWarning\b")
+_ERROR_RE = re.compile(r"\bError\b")
+
+
+def read_manifest(path):
+    """Evaluate a Manifest.py, as hdlmake does, and return its variables."""
+    env = {}
+    with open(path) as f:
+        code = compile(f.read(), path, "exec")
+    exec(code, env)
+    return dict((k, v) for k, v in env.items() if not k.startswith("__"))
+
+
+class Testbench(object):
+    def __init__(self, path, lib_cache=True):
+        self.path = path
+        self.name = os.path.relpath(path, TB_ROOT)
+        self.manifest = read_manifest(os.path.join(path, "Manifest.py"))
+        self.sim_tool = self.manifest.get("sim_tool") or ""
+        self.top = self.manifest.get("sim_top") or self.manifest.get("top_module")
+        self.work = os.path.join(BUILD_DIR, self.name)
+        self.use_libs = lib_cache is not False and self.sim_tool == "ghdl"
+        self.lib_cache = lib_cache if isinstance(lib_cache, str) else None
+        self._libs = None
+
+    @property
+    def libs(self):
+        """The precompiled libraries, shared with the other testbenches
+        (created on first use: hashing the sources takes a while)."""
+        if self._libs is None and self.use_libs:
+            self._libs = ghdl_libs.shared_cache(
+                self.manifest, ghdl_libs.analysis_options(self.manifest.get("ghdl_opt")),
+                self.lib_cache)
+        return self._libs
+
+    def is_simulation(self):
+        return self.manifest.get("action") == "simulation"
+
+    def missing_tools(self):
+        """Programs needed by the testbench that are not installed."""
+        tools = [] if self.use_libs else ["hdlmake", "make"]
+        tools += SIMULATORS.get(self.sim_tool, [])
+        return [t for t in tools if shutil.which(t) is None]
+
+    def prepare(self):
+        """Create the work directory."""
+        if os.path.isdir(self.work):
+            shutil.rmtree(self.work)
+        os.makedirs(self.work)
+        rel = os.path.relpath(self.path, self.work)
+        lines = ["# Generated by {}; do not edit".format(os.path.basename(__file__)), ""]
+        for k, v in sorted(self.manifest.items()):
+            if k in _SKIP_VARS or not isinstance(v, (str, int, bool, list, dict)):
+                continue
+            if k in _PATH_VARS:
+                v = [os.path.join(rel, p) for p in v]
+            lines.append("{} = {!r}".format(k, v))
+        lines.append("modules = {{'local': [{!r}]}}".format(rel))
+        with open(os.path.join(self.work, "Manifest.py"), "w") as f:
+            f.write("\n".join(lines) + "\n")
+        for fname in os.listdir(self.path):
+            if fname in ("Manifest.py", "Makefile") or fname.startswith("."):
+                continue
+            os.symlink(os.path.join(rel, fname), os.path.join(self.work, fname))
+
+    def own_files(self):
+        """(library, file) of the testbench that are not in the precompiled
+        libraries, in analysis order."""
+        files = ghdl_libs.collect_files(self.path, self.manifest, skip=self.libs.roots)
+        cached = self.libs.file_set()
+        return ghdl_libs.order_files(
+            [f for f in files if f[1] not in cached and f[1].lower().endswith(ghdl_libs.VHDL_EXT)])
+
+    def _build_libs(self):
+        log = self.libs.build()
+        missing = self.libs.missing()
+        if missing:
+            log += "\n{} files of the library manifests do not exist:\n{}".format(
+                len(missing), "\n".join("  {} {}".format(l, p) for l, p in missing))
+        # Only the files the testbench depends on matter: the others may need
+        # vendor libraries (unisim, ...) that are not installed.
+        needed = self.libs.dependencies(self.own_files())
+        failed = [f for f in self.libs.failed() if f[1] in needed]
+        if failed:
+            return 1, "{}\n{} units needed by the testbench failed to analyse:\n{}".format(
+                log, len(failed), "\n".join("  {} {}".format(l, p) for l, p in failed))
+        self.libs.install(self.work)
+        return 0, log
+
+    def commands(self):
+        """Build and simulation steps, as (name, argv or function returning
+        (status, output))."""
+        if self.use_libs:
+            opts = self.libs.options
+            steps = [("libraries", self._build_libs)]
+            # One analysis per run of files of the same library
+            runs = []
+            for lib, path in self.own_files():
+                if not runs or runs[-1][0] != lib:
+                    runs.append((lib, []))
+                runs[-1][1].append(path)
+            for lib, paths in runs:
+                steps.append(("analysis", ["ghdl", "-a", "--work=" + lib] + opts + paths))
+            steps.append(("elaboration", ["ghdl", "-e"] + opts + [self.top]))
+        else:
+            steps = [("hdlmake", ["hdlmake"]), ("make", ["make"])]
+        if os.path.isfile(os.path.join(self.path, "run.sh")):
+            steps.append(("simulation", ["bash", "./run.sh"]))
+        elif self.sim_tool == "ghdl":
+            opts = self.manifest.get("ghdl_opt", "").split()
+            std = [o for o in opts if o.startswith("--std") or o.startswith("-frelaxed")]
+            steps.append(("simulation", ["ghdl", "-r"] + std + [self.top]))
+        elif self.sim_tool == "modelsim":
+            steps.append(("simulation", ["vsim", "-c", "-do", "run.do", "-do", "quit -f"]))
+        return steps
+
+
+class Result(object):
+    def __init__(self, tb):
+        self.tb = tb
+        self.status = "passed"
+        self.message = ""
+        self.time = 0.0
+        self.log = ""
+        self.steps = []
+
+    def counts(self):
+        return (len(_WARNING_RE.findall(self.log)), len(_ERROR_RE.findall(self.log)))
+
+
+def run_testbench(tb, timeout=None):
+    res = Result(tb)
+    start = time.time()
+    if not tb.sim_tool:
+        res.status, res.message = "skipped", "no simulator in Manifest.py"
+        return res
+    missing = tb.missing_tools()
+    if missing:
+        res.status, res.message = "skipped", "not installed: " + ", ".join(missing)
+        return res
+    tb.prepare()
+    log = []
+    try:
+        for name, argv in tb.commands():
+            t = time.time()
+            if callable(argv):
+                returncode, output = argv()
+                log.append("# {}\n{}".format(name, output))
+            else:
+                try:
+                    p = subprocess.run(argv, cwd=tb.work, stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT, universal_newlines=True,
+                                       errors="replace", timeout=timeout)
+                except subprocess.TimeoutExpired as e:
+                    log.append("$ {}\n{}".format(" ".join(argv), e.output or ""))
+                    res.status, res.message = "error", "{} timed out".format(name)
+                    break
+                returncode = p.returncode
+                log.append("$ {}\n{}".format(" ".join(argv), p.stdout))
+            res.steps.append((name, time.time() - t))
+            if returncode != 0:
+                kind = "failure" if name == "simulation" else "error"
+                res.status, res.message = kind, "{} returned {}".format(name, returncode)
+                break
+        else:
+            for text in log:
+                m = _FAIL_RE.search(text)
+                if m:
+                    res.status, res.message = "failure", m.group(0)
+                    break
+    finally:
+        res.log = "\n".join(log)
+        res.time = time.time() - start
+        with open(os.path.join(tb.work, "run_tests.log"), "w") as f:
+            f.write(res.log)
+    return res
+
+
+def discover(paths=None, lib_cache=True):
+    """Testbenches in PATHS (default is all those below TB_ROOT)."""
+    if paths:
+        dirs = [os.path.abspath(os.path.join(TB_ROOT, p)) for p in paths]
+    else:
+        dirs = []
+        for root, subdirs, files in os.walk(TB_ROOT):
+            if os.path.relpath(root, TB_ROOT).split(os.sep)[0] in EXCLUDE:
+                subdirs[:] = []
+                continue
+            subdirs.sort()
+            if "Manifest.py" in files:
+                dirs.append(root)
+    tbs = [Testbench(d, lib_cache) for d in dirs]
+    return [tb for tb in tbs if tb.is_simulation()]
+
+
+def write_junit(results, fname, elapsed):
+    suite = ET.Element("testsuite", {
+        "name": "general-cores",
+        "tests": str(len(results)),
+        "failures": str(sum(r.status == "failure" for r in results)),
+        "errors": str(sum(r.status == "error" for r in results)),
+        "skipped": str(sum(r.status == "skipped" for r in results)),
+        "time": "{:.3f}".format(elapsed),
+    })
+    for r in results:
+        classname, _, name = r.tb.name.rpartition(os.sep)
+        case = ET.SubElement(suite, "testcase", {
+            "classname": classname.replace(os.sep, "."), "name": name,
+            "time": "{:.3f}".format(r.time)})
+        # The schema puts the properties first
+        props = ET.SubElement(case, "properties")
+        for step, t in r.steps:
+            ET.SubElement(props, "property", {"name": step + "_time", "value": "{:.3f}".format(t)})
+        if r.status != "passed":
+            ET.SubElement(case, r.status, {"message": r.message}).text = r.log[-4000:]
+        ET.SubElement(case, "system-out").text = r.log
+    tree = ET.ElementTree(ET.Element("testsuites"))
+    tree.getroot().append(suite)
+    tree.write(fname, encoding="utf-8", xml_declaration=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the testbenches in parallel")
+    parser.add_argument("testbenches", nargs="*",
+                        help="testbench directories, relative to this one (default is all)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of testbenches run at once (default is the number of cores)")
+    parser.add_argument("--junit", default="results.xml",
+                        help="JUnit XML report (default is results.xml)")
+    parser.add_argument("--timeout", type=float,
+                        help="timeout of each step, in seconds")
+    parser.add_argument("-l", "--list", action="store_true", help="list the testbenches")
+    parser.add_argument("--lib-cache",
+                        help="directory of the precompiled GHDL libraries (default is"
+                        " $GC_GHDL_LIB_CACHE, or build/libs)")
+    parser.add_argument("--no-lib-cache", action="store_true",
+                        help="build each GHDL testbench with hdlmake, without the"
+                        " precompiled libraries")
+    parser.add_argument("--clean", action="store_true", help="remove the work directories")
+    args = parser.parse_args()
+
+    if args.clean:
+        shutil.rmtree(BUILD_DIR, ignore_errors=True)
+        return 0
+    for p in args.testbenches:
+        if not os.path.isfile(os.path.join(TB_ROOT, p, "Manifest.py")):
+            parser.error("{}: not a testbench directory".format(p))
+    tbs = discover(args.testbenches, False if args.no_lib_cache else (args.lib_cache or True))
+    if args.list:
+        for tb in tbs:
+            print("{:<48} {:<9} {}".format(tb.name, tb.sim_tool or "-", tb.top))
+        return 0
+
+    start = time.time()
+    results = []
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(run_testbench, tb, args.timeout) for tb in tbs]
+        for tb, f in zip(tbs, futures):
+            try:
+                r = f.result()
+            except Exception:
+                r = Result(tb)
+                r.status, r.message = "error", "exception: {}".format(sys.exc_info()[1])
+                r.log = traceback.format_exc()
+            results.append(r)
+            warnings, errors = r.counts()
+            print("{:<48} {:<8} {:8.1f}s  {} warnings, {} errors  {}".format(
+                r.tb.name, r.status, r.time, warnings, errors, r.message))
+    elapsed = time.time() - start
+    write_junit(results, args.junit, elapsed)
+
+    failed = [r for r in results if r.status in ("failure", "error")]
+    print("{} testbenches, {} failed, {} skipped in {:.1f}s".format(
+        len(results), len(failed), sum(r.status == "skipped" for r in results), elapsed))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
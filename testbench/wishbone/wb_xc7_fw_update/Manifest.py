@@ -0,0 +1,10 @@
+action     = "simulation"
+sim_tool   = "ghdl"
+target     = "xilinx"
+syn_device = "xc7k70t"
+ghdl_opt   = "--std=08 -frelaxed-rules -Wno-hide"
+sim_top    = "tb_xwb_xc7_fw_update"
+
+files = ["tb_xwb_xc7_fw_update.vhd"]
+
+modules = {"local" : ["../../../", "../../../sim/vhdl"]}
@@ -0,0 +1,255 @@
+--------------------------------------------------------------------------------
+-- Testbench of the burst mode of xwb_xc7_fw_update_v2
+--
+-- A simple SPI flash model (read ID, write enable, page program, read) is
+-- driven with queued writes: the ID and a programmed page are read back from
+-- the RX FIFO.  The model checks that CS stays inactive for at least
+-- c_TSHSL between two commands.
+--------------------------------------------------------------------------------
+
+library ieee;
+use ieee.std_logic_1164.all;
+use ieee.numeric_std.all;
+
+use work.wishbone_pkg.all;
+use work.sim_wishbone.all;
+
+entity tb_xwb_xc7_fw_update is
+end tb_xwb_xc7_fw_update;
+
+architecture arch of tb_xwb_xc7_fw_update is
+  constant c_FIFO_DEPTH : natural := 16;
+  --  Minimum CS high time of the flash.
+  constant c_TSHSL      : time := 100 ns;
+
+  --  Bits of FAR.
+  constant c_XFER  : natural := 8;
+  constant c_READY : natural := 9;
+  constant c_CS    : natural := 10;
+  constant c_OVF   : natural := 11;
+
+  type t_bytes is array (natural range <>) of std_logic_vector(7 downto 0);
+
+  constant c_ID   : t_bytes(0 to 2) := (x"20", x"ba", x"18");
+  constant c_ADDR : natural := 16#10#;
+  constant c_PAGE : t_bytes(0 to 7) :=
+    (x"01", x"23", x"45", x"67", x"89", x"ab", x"cd", x"ef");
+
+  signal rst_n  : std_logic;
+  signal clk    : std_logic;
+  signal wb_in  : t_wishbone_slave_in;
+  signal wb_out : t_wishbone_slave_out;
+
+  signal flash_cs_n : std_logic;
+  signal flash_sck  : std_logic;
+  signal flash_mosi : std_logic;
+  signal flash_miso : std_logic := '0';
+
+  --  For end of test.
+  signal done : boolean := False;
+begin
+  --  Clock.
+  process
+  begin
+    clk <= '0';
+    wait for 4 ns;
+    clk <= '1';
+    wait for 4 ns;
+    if done then
+      report "end of test";
+      wait;
+    end if;
+  end process;
+
+  rst_n <= '0', '1' after 40 ns;
+
+  inst_dut: entity work.xwb_xc7_fw_update_v2
+    generic map (
+      g_fifo_depth => c_FIFO_DEPTH)
+    port map (
+      clk_i        => clk,
+      rst_n_i      => rst_n,
+      wb_i         => wb_in,
+      wb_o         => wb_out,
+      flash_cs_n_o => flash_cs_n,
+      flash_mosi_o => flash_mosi,
+      flash_miso_i => flash_miso,
+      flash_sck_o  => flash_sck);
+
+  --  SPI flash (mode 0): MOSI is sampled on the rising edges of SCK, MISO is
+  --  driven on the falling edges.
+  p_flash : process (flash_cs_n, flash_sck)
+    variable mem     : t_bytes(0 to 255) := (others => x"ff");
+    variable sreg    : std_logic_vector(7 downto 0);
+    variable dout    : std_logic_vector(7 downto 0);
+    variable nbits   : natural;
+    variable nbytes  : natural;
+    variable cmd     : std_logic_vector(7 downto 0);
+    variable addr    : natural;
+    variable wel     : boolean := False;
+    variable cs_high : time := -c_TSHSL;
+  begin
+    if falling_edge(flash_cs_n) then
+      assert now - cs_high >= c_TSHSL
+        report "flash: CS inactive for " & time'image(now - cs_high)
+        & ", less than tSHSL" severity error;
+      nbits  := 0;
+      nbytes := 0;
+      dout   := x"00";
+      flash_miso <= dout(7);
+    elsif rising_edge(flash_cs_n) then
+      cs_high := now;
+      assert nbits = 0
+        report "flash: CS released within a byte" severity error;
+      if cmd = x"02" then
+        wel := False;
+      end if;
+    elsif flash_cs_n = '0' and rising_edge(flash_sck) then
+      sreg  := sreg(6 downto 0) & flash_mosi;
+      nbits := nbits + 1;
+      if nbits = 8 then
+        nbits := 0;
+        dout  := x"ff";
+        if nbytes = 0 then
+          cmd := sreg;
+          case cmd is
+            when x"9f" =>
+              dout := c_ID(0);
+            when x"06" =>
+              wel := True;
+            when x"05" =>
+              dout := x"00";
+            when x"02" =>
+              assert wel report "flash: page program without WREN" severity error;
+            when x"03" =>
+              null;
+            when others =>
+              report "flash: unknown command " & to_hstring(cmd) severity error;
+          end case;
+        elsif cmd = x"9f" then
+          if nbytes < c_ID'length then
+            dout := c_ID(nbytes);
+          end if;
+        elsif cmd = x"05" then
+          dout := x"00";
+        elsif cmd = x"02" or cmd = x"03" then
+          if nbytes <= 3 then
+            --  Address (only the low byte is decoded).
+            addr := to_integer(unsigned(sreg));
+          elsif cmd = x"02" and wel then
+            mem(addr) := sreg;
+            addr := (addr + 1) mod mem'length;
+          elsif cmd = x"03" then
+            addr := (addr + 1) mod mem'length;
+          end if;
+          if cmd = x"03" and nbytes >= 3 then
+            dout := mem(addr);
+          end if;
+        end if;
+        nbytes := nbytes + 1;
+      end if;
+    elsif flash_cs_n = '0' and falling_edge(flash_sck) then
+      flash_miso <= dout(7 - nbits);
+    end if;
+  end process;
+
+  --  Test process.
+  process
+    variable data  : std_logic_vector(31 downto 0);
+    variable rx    : t_bytes(0 to c_ID'length + c_PAGE'length - 1);
+    variable nrx   : natural;
+    variable reads : natural;
+
+    --  Queue a transfer of B with CS active, keeping the received byte if
+    --  KEEP is set.
+    procedure xfer (b : std_logic_vector(7 downto 0); keep : boolean := False) is
+      variable v : std_logic_vector(31 downto 0) := (others => '0');
+    begin
+      v(7 downto 0) := b;
+      v(c_XFER)     := '1';
+      v(c_CS)       := '1';
+      if keep then
+        v(c_READY) := '1';
+      end if;
+      write32_pl(clk, wb_in, wb_out, 0, v);
+    end procedure;
+
+    --  Queue the release of CS.
+    procedure release is
+    begin
+      write32_pl(clk, wb_in, wb_out, 0, x"0000_0000");
+    end procedure;
+
+    procedure address (a : natural) is
+    begin
+      xfer(x"00");
+      xfer(x"00");
+      xfer(std_logic_vector(to_unsigned(a, 8)));
+    end procedure;
+  begin
+    init(wb_in);
+
+    wait until rst_n = '1';
+    wait until rising_edge(clk);
+
+    read32_pl(clk, wb_in, wb_out, 0, data);
+    assert to_integer(unsigned(data(31 downto 16))) = c_FIFO_DEPTH
+      report "wrong DEPTH" severity error;
+    assert data(c_READY) = '1' report "not ready after reset" severity error;
+
+    --  Everything is queued at once: the writes are stalled while the TX
+    --  FIFO is full.
+    xfer(x"9f");
+    for i in c_ID'range loop
+      xfer(x"00", True);
+    end loop;
+    release;
+
+    xfer(x"06");
+    release;
+
+    xfer(x"02");
+    address(c_ADDR);
+    for i in c_PAGE'range loop
+      xfer(c_PAGE(i));
+    end loop;
+    release;
+
+    xfer(x"03");
+    address(c_ADDR);
+    for i in c_PAGE'range loop
+      xfer(x"00", True);
+    end loop;
+    release;
+
+    --  Read the received bytes, until all the transfers are done.
+    nrx   := 0;
+    reads := 0;
+    loop
+      read32_pl(clk, wb_in, wb_out, 0, data);
+      if data(c_XFER) = '1' then
+        assert nrx <= rx'high report "too many bytes received" severity failure;
+        rx(nrx) := data(7 downto 0);
+        nrx := nrx + 1;
+      end if;
+      exit when data(c_READY) = '1' and data(c_XFER) = '0';
+      reads := reads + 1;
+      assert reads < 10000 report "timeout" severity failure;
+    end loop;
+
+    assert data(c_OVF) = '0' report "RX FIFO overflow" severity error;
+    assert nrx = rx'length
+      report "received " & natural'image(nrx) & " bytes" severity error;
+    for i in c_ID'range loop
+      assert rx(i) = c_ID(i)
+        report "wrong ID byte " & natural'image(i) severity error;
+    end loop;
+    for i in c_PAGE'range loop
+      assert rx(c_ID'length + i) = c_PAGE(i)
+        report "wrong data byte " & natural'image(i) severity error;
+    end loop;
+
+    done <= true;
+    wait;
+  end process;
+end arch;
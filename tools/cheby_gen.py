@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# Regenerate the files of the cheby register maps
+#
+# Every .cheby file below modules/ (or those given on the command line) is a
+# register map.  Its targets are:
+#  - the files next to it generated by cheby from it: their header gives the
+#    options of cheby ("-i <map> --gen-hdl <file>", ...), the generator of a
+#    file is the --gen-* option naming it,
+#  - the Python modules next to it generated by wb_regs.py ("Generated by
+#    wb_regs.py from <map>"),
+#  - the targets of EXTRA_TARGETS (those of the generate-cheby-files.sh
+#    scripts that are not in the repository).
+# All the targets of a map are generated by a single run of cheby, in the
+# directory of the map, which parses the map once (a second consts style
+# needs one more run); the Python modules need a run of wb_regs.py.  Maps are
+# processed in parallel.
+#
+# A map is skipped when a hash of its content, of the files it includes
+# (submaps), of its targets, of the version of cheby (and of wb_regs.py for the
+# Python modules) is the one of the last
+# generation and its outputs exist.  The hashes are kept in .cheby_gen.json at
+# the top of the repository (or in the file given by -c).
+#
+# Examples:
+#   cheby_gen.py
+#   cheby_gen.py -v --force modules/wishbone/wb_vic/wb_vic_regs.cheby
+#   cheby_gen.py --dry-run
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROG = os.path.basename(__file__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generator of the Python modules ("py" targets)
+WB_REGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wb_regs.py")
+
+# Bump when the hashes or the targets change meaning
+CACHE_VERSION = 1
+
+# Targets that are not found in the headers, as (generator, consts style,
+# output relative to the map), by map relative to the top directory.
+EXTRA_TARGETS = {
+    "modules/wishbone/wb_fine_pulse_gen/wb_fpgen_regs.cheby": [
+        ("consts", "sv", "../../../sim/regs/wb_fpgen_regs.sv"),
+        ("c", None, "wb_fpgen_regs.h"),
+        ("consts", "h", "wb_fpgen_regs2.h"),
+    ],
+}
+
+# Generated files are looked for among these extensions
+GENERATED_EXT = (".vhd", ".vhdl", ".v", ".sv", ".h", ".vh", ".py")
+
+# Lines of the header of a generated file
+HEADER_LINES = 6
+
+_INPUT_RE = re.compile(r"(?:^|\s)(?:-i|--input)[ \t=]+(\S+)")
+_OPTION_RE = re.compile(r"(?:^|\s)--(gen-hdl|gen-c|gen-consts|consts-style)[ \t=]+([^-\s]\S*)")
+_WB_REGS_RE = re.compile(r"Generated by wb_regs\.py from (\S+?);")
+_FILENAME_RE = re.compile(r"^\s*filename:\s*['\"]?([^'\"\s#]+)", re.M)
+
+
+class ChebyError(Exception):
+    pass
+
+
+def _sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def find_maps(paths):
+    """The .cheby files of PATHS (files or directories)."""
+    res = []
+    for p in paths:
+        if os.path.isfile(p):
+            res.append(os.path.abspath(p))
+            continue
+        for root, dirs, files in os.walk(p):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            res.extend(os.path.abspath(os.path.join(root, f))
+                       for f in sorted(files) if f.endswith(".cheby"))
+    return res
+
+
+def header_targets(path):
+    """Targets recorded in the headers of the files generated from the map
+    PATH, as (generator, consts style, output)."""
+    d, name = os.path.split(path)
+    res = []
+    for fname in sorted(os.listdir(d)):
+        if not fname.endswith(GENERATED_EXT):
+            continue
+        try:
+            with open(os.path.join(d, fname), errors="replace") as f:
+                head = "".join(f.readline() for _ in range(HEADER_LINES))
+        except IOError:
+            continue
+        if "cheby" not in head.lower():
+            continue
+        m = _WB_REGS_RE.search(head)
+        if m:
+            if m.group(1) == name:
+                res.append(("py", None, fname))
+            continue
+        m = _INPUT_RE.search(head)
+        if not m or os.path.basename(m.group(1)) != name:
+            continue
+        # A run of cheby copies all its options in the header of each of its
+        # outputs: the generator of this file is the one whose output it is.
+        opts = _OPTION_RE.findall(head)
+        gen = None
+        for opt, arg in opts:
+            if (opt != "consts-style" and os.path.normpath(os.path.join(d, arg))
+                    == os.path.join(d, fname)):
+                gen = opt[len("gen-"):]
+        if gen is None:
+            # Old headers do not name the output: this is it
+            if "--gen-hdl" in head and not any(o != "consts-style" for o, _ in opts):
+                gen = "hdl"
+            else:
+                continue
+        style = None
+        if gen == "consts":
+            # As for any option of cheby, the last one is used
+            for opt, arg in opts:
+                if opt == "consts-style":
+                    style = arg
+        res.append((gen, style, fname))
+    return res
+
+
+def includes(path, seen=None):
+    """Files included by the map PATH (submaps), recursively."""
+    seen = set() if seen is None else seen
+    d = os.path.dirname(path)
+    with open(path, errors="replace") as f:
+        text = f.read()
+    for name in _FILENAME_RE.findall(text):
+        p = os.path.normpath(os.path.join(d, name))
+        if p not in seen and os.path.isfile(p):
+            seen.add(p)
+            includes(p, seen)
+    return sorted(seen)
+
+
+class Map(object):
+    def __init__(self, path, root):
+        self.path = path
+        self.rel = os.path.relpath(path, root)
+        self.dir = os.path.dirname(path)
+        targets = dict((t[2], t) for t in header_targets(path))
+        for t in EXTRA_TARGETS.get(self.rel.replace(os.sep, "/"), []):
+            targets[t[2]] = t
+        self.targets = sorted(targets.values(), key=lambda t: (t[0] != "hdl", t[2]))
+
+    def outputs(self):
+        return [os.path.normpath(os.path.join(self.dir, t[2])) for t in self.targets]
+
+    def digest(self, version):
+        h = hashlib.sha256()
+        h.update(repr((CACHE_VERSION, version, self.targets)).encode())
+        if any(t[0] == "py" for t in self.targets):
+            with open(WB_REGS, "rb") as f:
+                h.update(_sha(f.read()).encode())
+        for p in [self.path] + includes(self.path):
+            with open(p, "rb") as f:
+                h.update(os.path.relpath(p, self.dir).encode() + b"\0")
+                h.update(_sha(f.read()).encode())
+        return h.hexdigest()
+
+    def commands(self, cheby):
+        """cheby command lines generating the targets: one for all of them,
+        plus one per other consts style, and one of wb_regs.py per Python
+        module."""
+        runs = []
+        py = []
+        for gen, style, out in self.targets:
+            if gen == "py":
+                py.append([sys.executable, WB_REGS, "gen",
+                           os.path.basename(self.path), "-o", out])
+                continue
+            run = None
+            for r in runs:
+                if gen != "consts" or not r["consts"]:
+                    run = r
+                    break
+            if run is None:
+                run = {"consts": False, "argv": [cheby, "-i", os.path.basename(self.path)]}
+                runs.append(run)
+            if gen == "consts":
+                run["consts"] = True
+                if style:
+                    run["argv"] += ["--consts-style", style]
+            run["argv"] += ["--gen-" + gen, out]
+        return [r["argv"] for r in runs] + py
+
+
+def cheby_version(cheby):
+    try:
+        p = subprocess.run([cheby, "--version"], stdout=subprocess.PIPE,
+                           stderr=subprocess.STDOUT, universal_newlines=True)
+    except OSError:
+        raise ChebyError("cannot run '{}'".format(cheby))
+    if p.returncode != 0:
+        raise ChebyError("'{} --version' failed: {}".format(cheby, p.stdout.strip()))
+    return p.stdout.strip()
+
+
+def generate(m, cheby):
+    """Run cheby for the map M.  Return the error output, if any."""
+    for out in m.outputs():
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    for argv in m.commands(cheby):
+        p = subprocess.run(argv, cwd=m.dir, stdout=subprocess.PIPE,
+                           stderr=subprocess.STDOUT, universal_newlines=True)
+        if p.returncode != 0:
+            return "$ {}\n{}".format(" ".join(argv), p.stdout)
+    return None
+
+
+def load_cache(fname):
+    try:
+        with open(fname) as f:
+            data = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    if data.get("version") != CACHE_VERSION:
+        return {}
+    return data.get("maps", {})
+
+
+def save_cache(fname, maps):
+    tmp = fname + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": CACHE_VERSION, "maps": maps}, f, indent=1, sort_keys=True)
+    os.replace(tmp, fname)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog=PROG, description="Regenerate the files of the cheby register maps")
+    parser.add_argument("maps", nargs="*",
+                        help="maps or directories (default is the modules directory)")
+    parser.add_argument("-r", "--root", default=ROOT,
+                        help="top directory (default is the one of this script)")
+    parser.add_argument("-c", "--cache",
+                        help="hash file (default is <root>/.cheby_gen.json)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of maps processed at once (default is the number of cores)")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="regenerate the maps even if they did not change")
+    parser.add_argument("-n", "--dry-run", action="store_true",
+                        help="print the cheby commands instead of running them")
+    parser.add_argument("--cheby", default=os.environ.get("CHEBY", "cheby"),
+                        help="cheby command (default is $CHEBY, or cheby)")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="also list the maps that are up to date")
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    cache_file = args.cache or os.path.join(root, ".cheby_gen.json")
+    start = time.time()
+    try:
+        maps = [Map(p, root) for p in find_maps(args.maps or [os.path.join(root, "modules")])]
+        version = cheby_version(args.cheby) if not args.dry_run else ""
+        cache = load_cache(cache_file)
+        todo = []
+        for m in maps:
+            if not m.targets:
+                if args.verbose:
+                    print("{}: no generated file".format(m.rel))
+                continue
+            m.hash = m.digest(version)
+            if (args.force or cache.get(m.rel) != m.hash
+                    or not all(os.path.isfile(o) for o in m.outputs())):
+                todo.append(m)
+            elif args.verbose:
+                print("{}: up to date".format(m.rel))
+    except (ChebyError, IOError) as e:
+        print("{}: {}".format(PROG, e), file=sys.stderr)
+        return 1
+
+    if args.dry_run:
+        for m in todo:
+            for argv in m.commands(args.cheby):
+                print("(cd {} && {})".format(os.path.relpath(m.dir), " ".join(argv)))
+        return 0
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(args.jobs or 1, 1)) as pool:
+        for m, err in zip(todo, pool.map(lambda m: generate(m, args.cheby), todo)):
+            if err:
+                failed += 1
+                cache.pop(m.rel, None)
+                print("{}: {}: failed\n{}".format(PROG, m.rel, err), file=sys.stderr)
+            else:
+                cache[m.rel] = m.hash
+                print("{}: {}".format(m.rel, ", ".join(t[2] for t in m.targets)))
+    save_cache(cache_file, cache)
+    print("{} maps, {} generated, {} failed in {:.1f}s".format(
+        len(maps), len(todo) - failed, failed, time.time() - start))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+# 8b/10b codec matching gc_enc_8b10b and gc_dec_8b10b (modules/common)
+#
+# The encode and decode tables are built once by evaluating the logic of the
+# VHDL entities for every input:
+#  - encode: 2 x 512 entries, indexed by the running disparity and by
+#    ctrl_i & in_8b_i, giving out_10b_o, err_o and the disparity flip.
+#  - decode: 2 x 1024 entries, indexed by the running disparity and by
+#    in_10b_i, giving out_8b_o, ctrl_o, code_err_o and rdisp_err_o.
+# The running disparity is then a cumulative xor (encoder) or the last
+# symbol with 4 or 6 ones (decoder), computed with NumPy on whole chunks.
+#
+# Symbols are the 10-bit values of out_10b_o / in_10b_i: bit 0 is 'a', the
+# first bit on the line.  The latency of the entities (one clock for the
+# encoder, two for the decoder) is not modelled.
+#
+# Trace files are arrays of little endian uint16: one symbol each for 10-bit
+# traces; for decoded and unencoded data, the byte in bits 7..0 and the
+# flags (FLAG_*) in bits 15..8.
+
+import argparse
+import mmap
+import os
+import sys
+
+import numpy as np
+
+PROG = os.path.basename(__file__)
+
+CHUNK = 1 << 18
+
+RD_MINUS = 0
+RD_PLUS = 1
+
+# Flags of the 16-bit data records
+FLAG_CTRL = 0x100
+FLAG_CODE_ERR = 0x200
+FLAG_RDISP_ERR = 0x400
+FLAG_ENC_ERR = 0x800
+
+# Valid control characters (K28.0-7, K23.7, K27.7, K29.7, K30.7)
+K_CHARS = (0x1C, 0x3C, 0x5C, 0x7C, 0x9C, 0xBC, 0xDC, 0xFC, 0xF7, 0xFB, 0xFD, 0xFE)
+
+_ENC_5B_6B = (
+    "100111", "011101", "101101", "110001", "110101", "101001", "011001", "111000",
+    "111001", "100101", "010101", "110100", "001101", "101100", "011100", "010111",
+    "011011", "100011", "010011", "110010", "001011", "101010", "011010", "111010",
+    "110011", "100110", "010110", "110110", "001110", "101110", "011110", "101011")
+_DISPAR_6B = "11101000100000011000000110010111"
+_ENC_3B_4B = ("1011", "1001", "0101", "1100", "1101", "1010", "0110", "1110")
+_DISPAR_4B = "10001001"
+
+_ENC_CTRL = {
+    0x1C: "0011110100", 0x3C: "0011111001", 0x5C: "0011110101", 0x7C: "0011110011",
+    0x9C: "0011110010", 0xBC: "0011111010", 0xDC: "0011110110", 0xFC: "0011111000",
+    0xF7: "1110101000", 0xFB: "1101101000", 0xFD: "1011101000", 0xFE: "0111101000"}
+
+# B6 of dec_8b10b_lut
+_DEC_6B_5B = dict(
+    [(c, i) for i, c in enumerate(_ENC_5B_6B)]
+    + [(c, int(i, 2)) for c, i in (
+        ("011000", "00000"), ("100010", "00001"), ("010010", "00010"), ("001010", "00100"),
+        ("000111", "00111"), ("000110", "01000"), ("101000", "01111"), ("100100", "10000"),
+        ("000101", "10111"), ("001100", "11000"), ("001001", "11011"), ("010001", "11101"),
+        ("100001", "11110"), ("010100", "11111"), ("001111", "11100"), ("110000", "11100"))])
+
+
+def _inv(s):
+    return "".join("1" if c == "0" else "0" for c in s)
+
+
+def _enc_symbol(ctrl, byte, rd):
+    """p_encoding and disp_FSM_next of gc_enc_8b10b: return (out_10b,
+    err, dispar_o)."""
+    out = ["0"] * 10
+
+    def assign(hi, s):
+        for k, c in enumerate(s):
+            out[hi - k] = c
+
+    def assign_rev(hi, s):
+        assign(hi, s[::-1])
+
+    val6 = _ENC_5B_6B[byte & 31]
+    dp6 = _DISPAR_6B[byte & 31]
+    val4 = _ENC_3B_4B[byte >> 5]
+    dp4 = _DISPAR_4B[byte >> 5]
+    err = 0
+    if ctrl:
+        code = _ENC_CTRL.get(byte)
+        if code is None:
+            err = 1
+            code = "0" * 10
+        assign_rev(9, code if rd == RD_MINUS else _inv(code))
+    else:
+        assign_rev(9, val6 + val4)
+        if rd == RD_MINUS:
+            if dp4 == dp6:
+                if dp6 == "1":
+                    assign_rev(9, _inv(val4))
+            elif dp4 == "1":
+                if val6[3:6] == "011" and val4[0:3] == "111":
+                    assign(9, "1110")
+            elif val4 == "1100":
+                assign_rev(9, _inv(val4))
+        else:
+            if dp6 == "1":
+                assign_rev(5, _inv(val6))
+            else:
+                if val6 == "111000":
+                    assign_rev(5, _inv(val6))
+                if dp4 == "1":
+                    if val6[3:6] == "100" and val4[0:3] == "111":
+                        assign(9, "0001")
+                    else:
+                        assign_rev(9, _inv(val4))
+                elif val4 == "1100":
+                    assign_rev(9, _inv(val4))
+
+    flip = int(ctrl) ^ int(dp6) ^ int(dp4)
+    if ctrl and byte & 3:
+        flip = 0
+    return int("".join(out[::-1]), 2), err, rd ^ flip
+
+
+def _dec_symbol(code):
+    """dec_8b10b_lut, dec_8b10b_ctrl and the disparity error of
+    dec_8b10b_disp, for in_10b_i = CODE: return (out_8b, ctrl, code_err,
+    number of ones)."""
+    # s_in10b is in_10b_i reversed; x[k] is s_in10b(9 - k)
+    x = "".join(str((code >> i) & 1) for i in range(10))
+
+    def v(hi, lo):
+        return x[9 - hi:10 - lo]
+
+    in6b, in4b = v(9, 4), v(3, 0)
+
+    # dec_8b10b_lut
+    k28 = in6b == "110000"
+    if in4b in ("1011", "0100"):
+        out3b = "000"
+    elif in4b == "1001":
+        out3b = "110" if k28 else "001"
+    elif in4b == "0101":
+        out3b = "101" if k28 else "010"
+    elif in4b in ("1100", "0011"):
+        out3b = "011"
+    elif in4b in ("1101", "0010"):
+        out3b = "100"
+    elif in4b == "1010":
+        out3b = "010" if k28 else "101"
+    elif in4b == "0110":
+        out3b = "001" if k28 else "110"
+    elif in4b in ("1110", "0001", "1000", "0111"):
+        out3b = "111"
+    else:
+        out3b = "000"
+    out5b = _DEC_6B_5B.get(in6b, 0)
+    out8b = (int(out3b, 2) << 5) | out5b
+
+    # dec_8b10b_ctrl
+    abcd, ei, fghj = v(9, 6), v(5, 4), v(3, 0)
+    p13 = abcd in ("0001", "0010", "0100", "1000")
+    p31 = abcd in ("1110", "1101", "1011", "0111")
+    eighj = v(5, 4) + v(2, 0)
+    cde, cdei, dei = v(7, 5), v(7, 4), v(6, 4)
+    fgh, fg, eifgh, eifghj = v(3, 1), v(3, 2), v(5, 1), v(5, 0)
+    errs = (
+        abcd in ("0000", "1111"),
+        ei == "00" and p13,
+        ei == "11" and p31,
+        fghj in ("0000", "1111"),
+        eifgh in ("00000", "11111"),
+        eighj in ("10111", "01000"),
+        eighj == "00111" and cde not in ("000", "111"),
+        eighj == "11000" and cde not in ("000", "111"),
+        eighj == "10000" and not p31,
+        eighj == "01111" and not p13,
+        x in ("0011110001", "1100001110"),
+        cdei == "0000" and fg == "00",
+        cdei == "1111" and fg == "11",
+        dei == "000" and fgh == "000",
+        dei == "111" and fgh == "111")
+    ctrl = (cdei in ("0000", "1111")
+            or (eifghj == "010111" and p13)
+            or (eifghj == "101000" and p31))
+
+    # dec_8b10b_disp
+    disp_err = (in4b in ("0000", "1111")
+                or in6b in ("000001", "000010", "000100", "001000", "010000", "100000",
+                            "011111", "101111", "110111", "111011", "111101", "111110",
+                            "111111", "000000"))
+    return out8b, int(ctrl), int(any(errs) or disp_err), x.count("1")
+
+
+def _build_tables():
+    enc = np.zeros((2, 512), dtype=np.uint16)
+    enc_err = np.zeros(512, dtype=bool)
+    enc_flip = np.zeros(512, dtype=np.uint8)
+    for rd in (RD_MINUS, RD_PLUS):
+        for i in range(512):
+            code, err, rd_next = _enc_symbol(i >> 8, i & 0xff, rd)
+            enc[rd, i] = code
+            enc_err[i] = err
+            enc_flip[i] = rd ^ rd_next
+    dec = np.zeros((2, 1024), dtype=np.uint16)
+    key = np.zeros(1024, dtype=np.int32)
+    for code in range(1024):
+        out8b, ctrl, code_err, n = _dec_symbol(code)
+        v = out8b | (FLAG_CTRL if ctrl else 0) | (FLAG_CODE_ERR if code_err else 0)
+        # p_state_out
+        dec[RD_MINUS, code] = v | (0 if n in (5, 6) else FLAG_RDISP_ERR)
+        dec[RD_PLUS, code] = v | (0 if n in (4, 5) else FLAG_RDISP_ERR)
+        # p_state_disp: 6 ones sets RD+, 4 ones sets RD-
+        if n == 6:
+            key[code] = ~0
+        elif n == 4:
+            key[code] = ~RD_PLUS
+    return enc.ravel(), enc_err, enc_flip, dec.ravel(), key
+
+
+# ENC_TABLE is indexed by rd << 9 | ctrl << 8 | byte, DEC_TABLE by
+# rd << 10 | symbol.
+ENC_TABLE, ENC_ERR, ENC_FLIP, DEC_TABLE, _DEC_KEY = _build_tables()
+
+_COUNT_FLAGS = (FLAG_CTRL, FLAG_CODE_ERR, FLAG_RDISP_ERR)
+
+
+class Encoder(object):
+    """gc_enc_8b10b with the internal running disparity, RD- after reset by
+    default."""
+
+    def __init__(self, rd=RD_MINUS):
+        self.rd = rd
+
+    def encode(self, data, ctrl=None, dispar=None):
+        """Encode the bytes DATA (with the K flags CTRL, or with the FLAG_CTRL
+        bit if DATA is uint16).  DISPAR gives the running disparity of each
+        symbol (dispar_i, g_use_internal_running_disparity false); the
+        internal one is used otherwise.  Return (out_10b_o, err_o, dispar_o)
+        arrays."""
+        idx = np.asarray(data).astype(np.uint16) & 0x1ff
+        if ctrl is not None:
+            idx &= 0xff
+            idx |= np.asarray(ctrl, dtype=np.uint16) << 8
+        flip = ENC_FLIP[idx]
+        if dispar is None:
+            rd_after = np.bitwise_xor.accumulate(flip)
+            rd_after ^= np.uint8(self.rd)
+            rd = rd_after ^ flip
+            if len(rd_after):
+                self.rd = int(rd_after[-1])
+        else:
+            rd = np.asarray(dispar, dtype=np.uint8)
+            rd_after = rd ^ flip
+        return ENC_TABLE[idx | (rd.astype(np.uint16) << 9)], ENC_ERR[idx], rd_after
+
+
+class Decoder(object):
+    """gc_dec_8b10b, RD+ after reset as the RTL."""
+
+    def __init__(self, rd=RD_PLUS):
+        self.rd = rd
+        self._seq = np.zeros(0, dtype=np.int32)
+
+    def decode(self, codes):
+        """Decode the 10-bit symbols CODES.  Return uint16 records: out_8b_o
+        in bits 7..0 and FLAG_CTRL, FLAG_CODE_ERR, FLAG_RDISP_ERR."""
+        codes = np.asarray(codes).astype(np.uint16) & 0x3ff
+        n = len(codes)
+        if n == 0:
+            return codes
+        if len(self._seq) < n:
+            self._seq = np.arange(1, n + 1, dtype=np.int32) * 2 + 1
+        # The running disparity after each symbol is that set by the last
+        # symbol with 4 or 6 ones: keep (index << 1 | rd) of those and
+        # propagate the largest.
+        last = np.bitwise_and(self._seq[:n], _DEC_KEY[codes])
+        last[0] = max(last[0], self.rd)
+        np.maximum.accumulate(last, out=last)
+        last &= 1
+        idx = np.empty(n, dtype=np.uint16)
+        idx[0] = self.rd << 10
+        np.left_shift(last[:-1], 10, out=idx[1:], casting="unsafe")
+        idx |= codes
+        self.rd = int(last[-1])
+        return DEC_TABLE[idx]
+
+
+def _map(fname):
+    f = open(fname, "rb")
+    if os.fstat(f.fileno()).st_size == 0:
+        f.close()
+        return np.zeros(0, dtype=np.uint8)
+    with f:
+        return np.frombuffer(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), dtype=np.uint8)
+
+
+def encode_file(in_file, out_file, words=False, chunk=CHUNK):
+    """Encode IN_FILE (bytes, or uint16 data records if WORDS) to OUT_FILE
+    (uint16 symbols).  Return the number of invalid control characters."""
+    buf = _map(in_file)
+    if words:
+        buf = buf[:len(buf) // 2 * 2].view("<u2")
+    enc = Encoder()
+    errors = 0
+    with open(out_file, "wb") as f:
+        for i in range(0, len(buf), chunk):
+            codes, err, _ = enc.encode(buf[i:i + chunk])
+            errors += int(np.count_nonzero(err))
+            codes.astype("<u2").tofile(f)
+    return errors
+
+
+def decode_file(in_file, out_file, rd=RD_PLUS, chunk=CHUNK):
+    """Decode IN_FILE (uint16 symbols) to OUT_FILE (uint16 data records),
+    starting with the running disparity RD.  Return the number of (control,
+    code error, disparity error) symbols."""
+    codes = _map(in_file)
+    codes = codes[:len(codes) // 2 * 2].view("<u2")
+    dec = Decoder(rd)
+    counts = np.zeros(3, dtype=np.int64)
+    with open(out_file, "wb") as f:
+        for i in range(0, len(codes), chunk):
+            res = dec.decode(codes[i:i + chunk])
+            flags = np.bincount(res >> 8, minlength=16)
+            for k, flag in enumerate(_COUNT_FLAGS):
+                counts[k] += flags[(np.arange(16) << 8 & flag) != 0].sum()
+            res.astype("<u2").tofile(f)
+    return tuple(int(c) for c in counts)
+
+
+def _bin(v, n):
+    return format(int(v), "0{}b".format(n))
+
+
+def write_stimulus(prefix, count, k_rate=0.05, error_rate=0.0, seed=0):
+    """Write PREFIX_enc.txt and PREFIX_dec.txt: random symbols with the
+    expected outputs of gc_enc_8b10b and gc_dec_8b10b, one per line in
+    binary (ports in declaration order).  ERROR_RATE is the probability of
+    a bit flip in each symbol given to the decoder."""
+    rng = np.random.default_rng(seed)
+    data = rng.integers(0, 256, count).astype(np.uint16)
+    ctrl = rng.random(count) < k_rate
+    data[ctrl] = rng.choice(K_CHARS, int(np.count_nonzero(ctrl)))
+    codes, err, dispar = Encoder().encode(data, ctrl)
+    with open(prefix + "_enc.txt", "w") as f:
+        f.write("# ctrl_i in_8b_i out_10b_o err_o dispar_o\n")
+        for c, d, o, e, r in zip(ctrl, data, codes, err, dispar):
+            f.write("{} {} {} {} {}\n".format(int(c), _bin(d, 8), _bin(o, 10), int(e), int(r)))
+
+    flips = (rng.random((count, 10)) < error_rate) * (1 << np.arange(10))
+    codes = codes ^ flips.sum(axis=1).astype(np.uint16)
+    res = Decoder().decode(codes)
+    with open(prefix + "_dec.txt", "w") as f:
+        f.write("# in_10b_i out_8b_o ctrl_o code_err_o rdisp_err_o\n")
+        for c, r in zip(codes, res):
+            f.write("{} {} {} {} {}\n".format(
+                _bin(c, 10), _bin(r & 0xff, 8), int(bool(r & FLAG_CTRL)),
+                int(bool(r & FLAG_CODE_ERR)), int(bool(r & FLAG_RDISP_ERR))))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="8b/10b codec matching gc_enc_8b10b and gc_dec_8b10b")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("encode", help="encode a file to 10-bit symbols (uint16)")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("-w", "--words", action="store_true",
+                   help="input is uint16 records with FLAG_CTRL (0x100) for K characters")
+    p = sub.add_parser("decode", help="decode a file of 10-bit symbols (uint16)")
+    p.add_argument("input")
+    p.add_argument("output")
+    p.add_argument("--rd", choices=["-", "+"], default="+",
+                   help="initial running disparity (default is RD+, as after a reset)")
+    p = sub.add_parser("stimulus", help="write stimulus and expected files for the testbenches")
+    p.add_argument("prefix")
+    p.add_argument("-n", "--count", type=int, default=10000,
+                   help="number of symbols (default is 10000)")
+    p.add_argument("-k", "--k-rate", type=float, default=0.05,
+                   help="proportion of control characters (default is 0.05)")
+    p.add_argument("-e", "--error-rate", type=float, default=0.0,
+                   help="bit error probability of the decoder stimulus (default is 0)")
+    p.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "encode":
+        errors = encode_file(args.input, args.output, args.words)
+        if errors:
+            print("{}: {} invalid control characters".format(PROG, errors))
+    elif args.command == "decode":
+        ctrl, code_err, rdisp_err = decode_file(
+            args.input, args.output, RD_PLUS if args.rd == "+" else RD_MINUS)
+        print("{} control characters, {} code errors, {} disparity errors".format(
+            ctrl, code_err, rdisp_err))
+    elif args.command == "stimulus":
+        write_stimulus(args.prefix, args.count, args.k_rate, args.error_rate, args.seed)
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# Reference model of gc_crc_gen (modules/common/gc_crc_gen.vhd)
+#
+# The model takes the generics of gc_crc_gen (polynomial, initial value,
+# residue, data and half widths) and computes the crc_o value and match_o
+# flag for byte buffers, files, NumPy batches of frames or data words, and
+# emits test vectors for VHDL or SystemVerilog testbenches.
+#
+# gc_crc_gen shifts the bytes of each data word MSB first, each byte LSB
+# first, into an MSB-first register; crc_o is that register inverted, bit
+# reversed and byte reversed.  The model keeps the register bit reversed, so
+# that the usual table driven (slice-by-N) algorithm applies, with tables
+# indexed by 16-bit words.  Big buffers are split into many lanes processed in
+# parallel by NumPy; the CRCs of the lanes are then combined with precomputed
+# 'shift by N bytes' tables.
+#
+# The tables are cached in memory, and on disk when a cache directory is
+# given (--cache-dir or the GC_CRC_CACHE environment variable).
+
+import argparse
+import mmap
+import os
+import sys
+
+import numpy as np
+
+PROG = os.path.basename(__file__)
+
+# Number of lanes used for big buffers.
+LANES = 1 << 14
+# Buffers smaller than this are processed byte by byte.
+SERIAL_LIMIT = 4096
+# Files are processed by chunks of this size.
+FILE_CHUNK = 1 << 26
+
+SLICES = (1, 2, 4, 8)
+
+_WORD_DTYPES = {1: "<u1", 2: "<u2", 4: "<u4", 8: "<u8"}
+
+_tables_cache = {}
+
+
+def _reflect(v, n):
+    return int(format(v, "0{}b".format(n))[::-1], 2)
+
+
+def _byte_tables(rpoly, slices):
+    """Slice-by-N tables of the reflected polynomial RPOLY, as an array
+    (slices, 256): row J is the table of the J-th byte of a word."""
+    t = [np.arange(256, dtype=np.uint32)]
+    for _ in range(8):
+        c = t[0]
+        t[0] = (c >> 1) ^ np.where(c & 1, np.uint32(rpoly), np.uint32(0))
+    for k in range(1, slices):
+        t.append((t[k - 1] >> 8) ^ t[0][t[k - 1] & 0xff])
+    return np.array(t[::-1])
+
+
+def _slice_tables(rpoly, slices, cache_dir):
+    """Tables to process SLICES bytes at once.  For a single byte, the byte
+    table (1, 256).  Otherwise tables indexed by pairs of bytes
+    (slices / 2, 65536): row J is the table of the J-th 16-bit word."""
+    key = "crc-{:08x}-{}".format(rpoly, slices)
+    if key in _tables_cache:
+        return _tables_cache[key]
+    shape = (1, 256) if slices == 1 else (slices // 2, 1 << 16)
+    fname = cache_dir and os.path.join(cache_dir, key + ".npy")
+    tab = None
+    if fname and os.path.isfile(fname):
+        try:
+            tab = np.load(fname)
+        except (IOError, ValueError):
+            tab = None
+    if tab is None or tab.shape != shape:
+        t8 = _byte_tables(rpoly, slices)
+        if slices == 1:
+            tab = t8
+        else:
+            tab = np.array([(t8[2 * j][None, :] ^ t8[2 * j + 1][:, None]).reshape(-1)
+                            for j in range(slices // 2)])
+        if fname:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                np.save(fname + ".tmp.npy", tab)
+                os.replace(fname + ".tmp.npy", fname)
+            except OSError:
+                pass
+    _tables_cache[key] = tab
+    return tab
+
+
+def _as_array(data):
+    if isinstance(data, np.ndarray):
+        return data.reshape(-1).view(np.uint8)
+    return np.frombuffer(data, dtype=np.uint8)
+
+
+class CrcGen(object):
+    """CRC of gc_crc_gen for the given generics.  WIDTH is the length of
+    g_polynomial (and g_init_value, g_residue); INIT_VALUE defaults to all
+    ones.  SLICES is the number of bytes processed per step (1, 2, 4 or 8).
+
+    States are the CRC register, bit reversed: start() is the value after
+    reset, update() and update_word() add data, output() gives crc_o."""
+
+    def __init__(self, polynomial=0x04C11DB7, width=32, init_value=None,
+                 residue=0x38FB2284, data_width=16, half_width=8,
+                 slices=8, cache_dir=None):
+        if not 4 <= width <= 32:
+            raise ValueError("g_polynomial must be of order 4 to 32")
+        if width % 8:
+            raise ValueError("the width of g_polynomial must be a multiple of 8")
+        if not polynomial & 1:
+            raise ValueError("g_polynomial must have lsb set to 1")
+        if not 2 <= data_width <= 256 or data_width % 8:
+            raise ValueError("g_data_width must be a multiple of 8 from 8 to 256")
+        if not 2 <= half_width <= data_width:
+            raise ValueError("g_half_width must be from 2 to g_data_width")
+        if slices not in SLICES:
+            raise ValueError("slices must be one of {}".format(SLICES))
+        self.width = width
+        self.mask = (1 << width) - 1
+        self.polynomial = polynomial & self.mask
+        self.init_value = self.mask if init_value is None else init_value & self.mask
+        self.residue = residue & self.mask
+        self.data_width = data_width
+        self.half_width = half_width
+        self.slices = slices
+        self.cache_dir = cache_dir if cache_dir is not None else os.environ.get("GC_CRC_CACHE")
+        self._rpoly = _reflect(self.polynomial, width)
+        self._t0 = _byte_tables(self._rpoly, 1)[0].tolist()
+        self._shift_tables = {}
+
+    def _tables(self, slices):
+        return _slice_tables(self._rpoly, slices, self.cache_dir)
+
+    # Scalar operations
+
+    def start(self):
+        """State after reset (or restart_i)."""
+        return _reflect(self.init_value, self.width)
+
+    def output(self, state):
+        """crc_o for STATE: f_reverse_bytes(f_reverse_vector(not crc))."""
+        v = ~state & self.mask
+        return int.from_bytes(v.to_bytes(self.width // 8, "little"), "big")
+
+    def matches(self, state):
+        """match_o for STATE (crc_o equal to g_residue)."""
+        return self.output(state) == self.residue
+
+    def _update_bytes(self, state, buf):
+        t0 = self._t0
+        for b in buf.tolist():
+            state = (state >> 8) ^ t0[(state ^ b) & 0xff]
+        return state
+
+    def _update_bits(self, state, value, nbits):
+        for i in range(nbits):
+            fb = (state ^ (value >> i)) & 1
+            state >>= 1
+            if fb:
+                state ^= self._rpoly
+        return state
+
+    def update_word(self, state, word, half=False):
+        """Add a data_i word: all its bits, or its first g_half_width bits
+        (from the most significant byte) when HALF (half_i with
+        g_dual_width = 1)."""
+        nbytes = self.data_width // 8
+        data = (word & ((1 << self.data_width) - 1)).to_bytes(nbytes, "big")
+        nbits = self.half_width if half else self.data_width
+        state = self._update_bytes(state, np.frombuffer(data[:nbits // 8], np.uint8))
+        if nbits % 8:
+            state = self._update_bits(state, data[nbits // 8], nbits % 8)
+        return state
+
+    # Buffers
+
+    def _step(self, states, words, tab):
+        """Process one word per lane: STATES (uint32) and WORDS are arrays of
+        the same length, TAB the tables for the word size."""
+        n = words.dtype.itemsize
+        x = states ^ words
+        if n == 1:
+            idx = x.view(np.uint8).reshape(len(x), -1)[:, :1].T.copy()
+        else:
+            idx = x.view(np.uint16).reshape(len(x), -1)[:, :n // 2].T.copy()
+        res = np.take(tab[0], idx[0])
+        for j in range(1, len(idx)):
+            res ^= np.take(tab[j], idx[j])
+        if 8 * n < self.width:
+            res ^= states >> (8 * n)
+        return res
+
+    def _run_lanes(self, states, block):
+        """Process the rows of BLOCK (lanes, nbytes) from STATES."""
+        n = self.slices
+        tab = self._tables(n)
+        nwords = block.shape[1] // n
+        words = np.ascontiguousarray(block[:, :nwords * n]).view(_WORD_DTYPES[n])
+        # Process the words column by column, in transposed blocks of ~4MB.
+        step = max(1, (1 << 22) // (n * len(states)))
+        for j in range(0, nwords, step):
+            for col in words[:, j:j + step].T.copy():
+                states = self._step(states, col, tab)
+        if block.shape[1] % n:
+            tab = self._tables(1)
+            for col in block[:, nwords * n:].T.copy():
+                states = self._step(states, col, tab)
+        return states
+
+    def _shift_table(self, nbytes):
+        """Tables (width/8, 256) of the linear map 'add NBYTES zero bytes'
+        to a state, indexed by the bytes of the state."""
+        if nbytes in self._shift_tables:
+            return self._shift_tables[nbytes]
+
+        def apply(op, v):
+            r = 0
+            i = 0
+            while v:
+                if v & 1:
+                    r ^= op[i]
+                v >>= 1
+                i += 1
+            return r
+
+        def compose(a, b):
+            return [apply(a, v) for v in b]
+
+        op = [self._update_bytes(1 << i, np.zeros(1, np.uint8)) for i in range(self.width)]
+        res = [1 << i for i in range(self.width)]
+        n = nbytes
+        while n:
+            if n & 1:
+                res = compose(op, res)
+            n >>= 1
+            if n:
+                op = compose(op, op)
+        tab = np.zeros((self.width // 8, 256), dtype=np.uint32)
+        for k in range(self.width // 8):
+            for b in range(256):
+                tab[k, b] = apply(res[8 * k:8 * k + 8], b)
+        self._shift_tables[nbytes] = tab
+        return tab
+
+    def _shift(self, states, nbytes):
+        tab = self._shift_table(nbytes)
+        x = np.ascontiguousarray(states).view(np.uint8).reshape(-1, 4).T
+        res = np.take(tab[0], x[0])
+        for k in range(1, len(tab)):
+            res ^= np.take(tab[k], x[k])
+        return res
+
+    def update(self, state, data):
+        """Add the bytes of DATA (bytes-like, mmap or NumPy array) to STATE,
+        in order.  This is what gc_crc_gen computes for words holding these
+        bytes, most significant first."""
+        buf = _as_array(data)
+        n = len(buf)
+        if n < SERIAL_LIMIT:
+            return self._update_bytes(state, buf)
+        lane_len = max(8 * self.slices, (n // LANES) // self.slices * self.slices)
+        nlanes = n // lane_len
+        states = np.zeros(nlanes, dtype=np.uint32)
+        states[0] = state
+        states = self._run_lanes(states, buf[:nlanes * lane_len].reshape(nlanes, lane_len))
+        # Combine the lanes pairwise; leading zero lanes do not change the result.
+        pad = (1 << (nlanes - 1).bit_length()) - nlanes
+        states = np.concatenate([np.zeros(pad, dtype=np.uint32), states])
+        seg = lane_len
+        while len(states) > 1:
+            states = self._shift(states[0::2], seg) ^ states[1::2]
+            seg *= 2
+        return self._update_bytes(int(states[0]), buf[nlanes * lane_len:])
+
+    def crc(self, data):
+        """crc_o after DATA, starting from reset."""
+        return self.output(self.update(self.start(), data))
+
+    def crc_file(self, fname):
+        state = self.start()
+        with open(fname, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return self.output(state)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                buf = np.frombuffer(m, dtype=np.uint8)
+                for i in range(0, len(buf), FILE_CHUNK):
+                    state = self.update(state, buf[i:i + FILE_CHUNK])
+                del buf
+        return self.output(state)
+
+    def crc_frames(self, frames, lengths=None):
+        """crc_o of each row of FRAMES (a 2D uint8 array, or a list of byte
+        strings), using the first LENGTHS bytes of each row if given."""
+        if not isinstance(frames, np.ndarray):
+            frames = [np.frombuffer(f, dtype=np.uint8) for f in frames]
+            if lengths is None:
+                lengths = [len(f) for f in frames]
+            rows = np.zeros((len(frames), max(lengths or [0])), dtype=np.uint8)
+            for i, f in enumerate(frames):
+                rows[i, :len(f)] = f
+            frames = rows
+        frames = np.asarray(frames, dtype=np.uint8)
+        states = np.full(len(frames), self.start(), dtype=np.uint32)
+        if lengths is None:
+            states = self._run_lanes(states, frames)
+        else:
+            lengths = np.asarray(lengths)
+            tab = self._tables(1)
+            for j in range(int(lengths.max(initial=0))):
+                new = self._step(states, np.ascontiguousarray(frames[:, j]), tab)
+                states = np.where(j < lengths, new, states)
+        v = ~states & np.uint32(self.mask)
+        # f_reverse_bytes
+        res = np.zeros_like(v)
+        nbytes = self.width // 8
+        for k in range(nbytes):
+            res |= ((v >> (8 * k)) & 0xff) << (8 * (nbytes - 1 - k))
+        return res
+
+    def residue_value(self):
+        """Value of crc_o after a frame followed by its crc_o (most
+        significant byte first): the g_residue for which match_o is set."""
+        state = self.update(self.start(), b"\x00")
+        crc = self.output(state)
+        return self.output(self.update(state, crc.to_bytes(self.width // 8, "big")))
+
+    def vectors(self, words, halves=None):
+        """Yield (data, half, crc_o) after each of the data words WORDS."""
+        state = self.start()
+        for i, w in enumerate(words):
+            half = bool(halves[i]) if halves is not None else False
+            state = self.update_word(state, w, half)
+            yield w, half, self.output(state)
+
+
+def _hex(v, bits):
+    return "{:0{}X}".format(v, bits // 4)
+
+
+def write_vhdl(f, gen, vectors, name, generics):
+    f.write("-- Test vectors for gc_crc_gen ({})\n".format(generics))
+    f.write("--\n")
+    f.write("-- This file was automatically generated by {}; do not edit\n\n".format(PROG))
+    f.write("library ieee;\n")
+    f.write("use ieee.std_logic_1164.all;\n\n")
+    f.write("package {} is\n".format(name))
+    f.write("  type t_crc_vector is record\n")
+    f.write("    data : std_logic_vector({} downto 0);\n".format(gen.data_width - 1))
+    f.write("    half : std_logic;\n")
+    f.write("    crc  : std_logic_vector({} downto 0);\n".format(gen.width - 1))
+    f.write("  end record;\n")
+    f.write("  type t_crc_vector_array is array (natural range <>) of t_crc_vector;\n\n")
+    f.write("  constant c_crc_residue : std_logic_vector({} downto 0) := x\"{}\";\n".format(
+        gen.width - 1, _hex(gen.residue_value(), gen.width)))
+    f.write("  constant c_crc_vectors : t_crc_vector_array(0 to {}) := (\n".format(len(vectors) - 1))
+    for i, (data, half, crc) in enumerate(vectors):
+        f.write("    {} => (x\"{}\", '{}', x\"{}\"){}\n".format(
+            i, _hex(data, gen.data_width), int(half), _hex(crc, gen.width),
+            "," if i < len(vectors) - 1 else ");"))
+    f.write("end package {};\n".format(name))
+
+
+def write_sv(f, gen, vectors, name, generics):
+    n = len(vectors)
+    f.write("// Test vectors for gc_crc_gen ({})\n".format(generics))
+    f.write("//\n")
+    f.write("// This file was automatically generated by {}; do not edit\n\n".format(PROG))
+    f.write("package {};\n".format(name))
+    f.write("   localparam int c_crc_num_vectors = {};\n".format(n))
+    f.write("   localparam logic [{}:0] c_crc_residue = {}'h{};\n".format(
+        gen.width - 1, gen.width, _hex(gen.residue_value(), gen.width)))
+    for field, bits, idx in (("data", gen.data_width, 0), ("half", 1, 1), ("value", gen.width, 2)):
+        f.write("   localparam logic [{}:0] c_crc_{} [{}] = '{{\n".format(bits - 1, field, n))
+        f.write(",\n".join("      {}'h{}".format(bits, _hex(int(v[idx]), max(bits, 4)))
+                           for v in vectors))
+        f.write("};\n")
+    f.write("endpackage // {}\n".format(name))
+
+
+def _int(s):
+    return int(s, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Reference model of gc_crc_gen: compute CRCs and generate test vectors")
+    parser.add_argument("-p", "--polynomial", type=_int, default=0x04C11DB7,
+                        help="g_polynomial (default is 0x04C11DB7)")
+    parser.add_argument("-w", "--width", type=int, default=32,
+                        help="length of g_polynomial in bits (default is 32)")
+    parser.add_argument("-i", "--init", type=_int,
+                        help="g_init_value (default is all ones)")
+    parser.add_argument("-r", "--residue", type=_int, default=0x38FB2284,
+                        help="g_residue (default is 0x38FB2284)")
+    parser.add_argument("-d", "--data-width", type=int, default=16,
+                        help="g_data_width (default is 16)")
+    parser.add_argument("--half-width", type=int, default=8,
+                        help="g_half_width (default is 8)")
+    parser.add_argument("-s", "--slices", type=int, choices=SLICES, default=8,
+                        help="bytes processed per step (default is 8)")
+    parser.add_argument("--cache-dir", help="directory where the tables are cached")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("crc", help="print crc_o for the content of files")
+    p.add_argument("files", nargs="+")
+    sub.add_parser("residue", help="print the g_residue value matching the CRC")
+    p = sub.add_parser("vectors", help="generate test vectors for random data words")
+    p.add_argument("-n", "--count", type=int, default=64,
+                   help="number of random words (default is 64)")
+    p.add_argument("--dual-width", action="store_true",
+                   help="g_dual_width = 1: also use half words")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("-l", "--language", choices=("vhdl", "sv"), default="vhdl")
+    p.add_argument("--name", default="crc_vectors_pkg", help="package name")
+    p.add_argument("-o", "--output", help="output file (default is stdout)")
+    args = parser.parse_args()
+
+    try:
+        gen = CrcGen(args.polynomial, args.width, args.init, args.residue,
+                     args.data_width, args.half_width, args.slices, args.cache_dir)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.command == "crc":
+        for fname in args.files:
+            print("{}  {}".format(_hex(gen.crc_file(fname), gen.width), fname))
+    elif args.command == "residue":
+        print(_hex(gen.residue_value(), gen.width))
+    elif args.command == "vectors":
+        rng = np.random.default_rng(args.seed)
+        nbytes = gen.data_width // 8
+        data = rng.integers(0, 256, (args.count, nbytes), dtype=np.uint8)
+        words = [int.from_bytes(w.tobytes(), "big") for w in data]
+        halves = (rng.random(args.count) < 0.5).tolist() if args.dual_width else [False] * args.count
+        # End with the CRC of the data, so that the last crc_o is the residue.
+        if not args.dual_width and gen.width % gen.data_width == 0:
+            state = gen.start()
+            for w in words:
+                state = gen.update_word(state, w)
+            crc = gen.output(state)
+            for k in range(gen.width // gen.data_width - 1, -1, -1):
+                words.append((crc >> (k * gen.data_width)) & ((1 << gen.data_width) - 1))
+                halves.append(False)
+        vectors = list(gen.vectors(words, halves))
+        generics = "g_polynomial => x\"{}\", g_init_value => x\"{}\", g_data_width => {}, " \
+                   "g_half_width => {}, g_dual_width => {}".format(
+                       _hex(gen.polynomial, gen.width), _hex(gen.init_value, gen.width),
+                       gen.data_width, gen.half_width, int(args.dual_width))
+        write = write_vhdl if args.language == "vhdl" else write_sv
+        if args.output:
+            with open(args.output, "w") as f:
+                write(f, gen, vectors, args.name, generics)
+        else:
+            write(sys.stdout, gen, vectors, args.name, generics)
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
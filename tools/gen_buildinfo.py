@@ -1,55 +1,121 @@
 # Script to generate the buildinfo_pkg.vhd file
+# Optional local parameters:
+#  gitinfo_dirty: dirty state check, 'full' (default), 'tracked' or 'none'.
+#  gitinfo_cache_dir: directory where the git information is cached, to be
+#    shared by the projects of a build.  See gitinfo.py.
+#  gc_tools_dir: directory of this script, if gitinfo.py is not found.
+#  buildinfo_date: string to use as build date instead of the current time.
+#  buildinfo_cache: if True, keep the existing file untouched when none of
+#    the inputs (commit, tag, dirty state, tool, author and explicit date)
+#    changed, to avoid recompiling the units depending on it.
 
-with open("buildinfo_pkg.vhd", "w") as f:
-  import subprocess
-  import time
-  import unicodedata
-
-  # Extract current commit id.
-  try:
-    commitid = subprocess.check_output(
-      ["git", "log", "-1", "--format=%H"]).decode().strip()
-  except:
-    commitid = "unknown"
-
-  # Extract current tag + dirty indicator.
-  # It is not sure if the definition of dirty is stable across all git versions.
-  try:
-    tag = subprocess.check_output(
-      ["git", "describe", "--dirty", "--always"]).decode().strip()
-    if tag.endswith('-dirty'):
-      dirty = '-dirty'
-    else:
-      dirty = ''
-  except:
-    tag = 'unknown'
-    dirty = "-??"
-
-  try:
-    userid = subprocess.check_output(
-      ["git", "config", "--get", "user.name"]).decode().strip()
-    # VHDL only handles ASCII strings
-    userid = unicodedata.normalize('NFKD', userid).encode('ascii', 'replace')
-  except:
-    userid = "unknown"
-  if action == "simulation":
-      top = sim_top
-      tool = sim_tool
-  else:
-      top = syn_top
-      tool = syn_tool
-  f.write("-- Buildinfo for project {}\n".format(top))
-  f.write("--\n")
-  f.write("-- This file was automatically generated; do not edit\n")
-  f.write("\n")
-  f.write("package buildinfo_pkg is\n")
-  f.write("  constant buildinfo : string :=\n")
-  f.write('       "buildinfo:1" & LF\n')
-  f.write('     & "module:{}" & LF\n'.format(top))
-  f.write('     & "commit:{}" & LF\n'.format(commitid + dirty))
-  f.write('     & "tag:{}" & LF\n'.format(tag))
-  f.write('     & "syntool:{}" & LF\n'.format(tool))
-  f.write('     & "syndate:{}" & LF\n'.format(
-      time.strftime("%F, %H:%M %Z", time.localtime())))
-  f.write('     & "synauth:{}" & LF;\n'.format(userid))
-  f.write('end buildinfo_pkg;\n')
+import os
+import sys
+import time
+import unicodedata
+import hashlib
+
+# Locate the gitinfo module next to this script.  When this script is executed
+# from a manifest, define gc_tools_dir (or fetchto) if it is not found.
+gc_tools_dirs = []
+try:
+  gc_tools_dirs.append(gc_tools_dir)
+except NameError:
+  pass
+try:
+  gc_tools_dirs.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+  pass
+try:
+  gc_tools_dirs.append(os.path.join(fetchto, "general-cores", "tools"))
+except NameError:
+  pass
+for d in gc_tools_dirs:
+  if os.path.isfile(os.path.join(d, "gitinfo.py")):
+    sys.path.insert(0, os.path.abspath(d))
+    break
+try:
+  import gitinfo
+except ImportError:
+  print("""gitinfo.py not found (searched in: {}).
+When this script is executed from a manifest, define the 'gc_tools_dir'
+variable to the tools directory of general-cores.""".format(
+    ", ".join(gc_tools_dirs) or "none"))
+  sys.exit(1)
+
+try:
+  dirty_check = gitinfo_dirty
+except NameError:
+  dirty_check = "full"
+try:
+  cache_dir = gitinfo_cache_dir
+except NameError:
+  cache_dir = None
+info = gitinfo.collect(dirty=dirty_check, cache_dir=cache_dir)
+
+# Current commit id.
+commitid = info["commit"] or "unknown"
+
+# Current tag + dirty indicator.
+tag = info["tag"] or "unknown"
+if info["dirty"] is None:
+  dirty = "-??"
+elif info["dirty"]:
+  dirty = '-dirty'
+  tag += dirty
+else:
+  dirty = ''
+
+if info["user"]:
+  # VHDL only handles ASCII strings
+  userid = unicodedata.normalize('NFKD', info["user"]).encode(
+    'ascii', 'replace').decode()
+else:
+  userid = "unknown"
+if action == "simulation":
+    top = sim_top
+    tool = sim_tool
+else:
+    top = syn_top
+    tool = syn_tool
+
+try:
+  syndate = buildinfo_date
+except NameError:
+  syndate = None
+
+try:
+  cache = buildinfo_cache
+except NameError:
+  cache = False
+
+# The date is only an input when given explicitly.
+inputs = hashlib.sha1(repr(
+  (top, commitid + dirty, tag, tool, userid, syndate)).encode()).hexdigest()
+
+try:
+  with open("buildinfo_pkg.vhd", "r") as f:
+    unchanged = cache and "-- inputs: {}\n".format(inputs) in f.read()
+except IOError:
+  unchanged = False
+
+if not unchanged:
+  if syndate is None:
+    syndate = time.strftime("%F, %H:%M %Z", time.localtime())
+  with open("buildinfo_pkg.vhd", "w") as f:
+    f.write("-- Buildinfo for project {}\n".format(top))
+    f.write("--\n")
+    f.write("-- This file was automatically generated; do not edit\n")
+    if cache:
+      f.write("-- inputs: {}\n".format(inputs))
+    f.write("\n")
+    f.write("package buildinfo_pkg is\n")
+    f.write("  constant buildinfo : string :=\n")
+    f.write('       "buildinfo:1" & LF\n')
+    f.write('     & "module:{}" & LF\n'.format(top))
+    f.write('     & "commit:{}" & LF\n'.format(commitid + dirty))
+    f.write('     & "tag:{}" & LF\n'.format(tag))
+    f.write('     & "syntool:{}" & LF\n'.format(tool))
+    f.write('     & "syndate:{}" & LF\n'.format(syndate))
+    f.write('     & "synauth:{}" & LF;\n'.format(userid))
+    f.write('end buildinfo_pkg;\n')
@@ -1,19 +1,58 @@
 # Script to generate the HDL sourceid information for a given project
 # Local parameter: project
+# Optional local parameters: sourceid_cache (same as the '-c' argument),
+# gitinfo_dirty and gitinfo_cache_dir (same as '--dirty-check' and
+# '--cache-dir'), gc_tools_dir (directory of this script, if gitinfo.py is not
+# found)
 
 # Note: this script differs from the (similar) gen_buildinfo.py in that it produces std_logic
 # vectors with versioning info to be embedded in the metadata, while buildinfo produces a string
 # that focuses more on when/how/who built the bitstream.
 
 import argparse
+import os
 import sys
 
+# Locate the gitinfo module next to this script.  When this script is executed
+# from a manifest, define gc_tools_dir (or fetchto) if it is not found.
+gc_tools_dirs = []
+try:
+  gc_tools_dirs.append(gc_tools_dir)
+except NameError:
+  pass
+try:
+  gc_tools_dirs.append(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+  pass
+try:
+  gc_tools_dirs.append(os.path.join(fetchto, "general-cores", "tools"))
+except NameError:
+  pass
+for d in gc_tools_dirs:
+  if os.path.isfile(os.path.join(d, "gitinfo.py")):
+    sys.path.insert(0, os.path.abspath(d))
+    break
+try:
+  import gitinfo
+except ImportError:
+  print("""gitinfo.py not found (searched in: {}).
+When this script is executed from a manifest, define the 'gc_tools_dir'
+variable to the tools directory of general-cores.""".format(
+    ", ".join(gc_tools_dirs) or "none"))
+  sys.exit(1)
+
 parser = argparse.ArgumentParser(
   description='Generate source ID for given project')
 parser.add_argument('-p', '--project',
                     help = "Project name to use. If not provided, will look for a 'project' local variable.")
 parser.add_argument('-l', '--language', choices = ['VHDL','Verilog'], default = 'VHDL',
                     help = "HDL language for output file. If not provided, defaults to VHDL.")
+parser.add_argument('-c', '--cache', action='store_true',
+                    help = "Keep the output file untouched if its inputs (commit, tag and dirty state) didn't change.")
+parser.add_argument('--dirty-check', choices = gitinfo.DIRTY_CHECKS, default = 'full',
+                    help = "How to check the working tree state (see gitinfo.py). Defaults to full.")
+parser.add_argument('--cache-dir',
+                    help = "Directory where the git information is cached and shared between projects.")
 args = parser.parse_args()
 
 if(args.project):
@@ -27,6 +66,11 @@ except NameError:
 or that you provide the '-p' argument at run-time.""")
   sys.exit(1)
 
+try:
+  cache = sourceid_cache or args.cache
+except NameError:
+  cache = args.cache
+
 if (args.language) == 'VHDL':
   outfile = "sourceid_{}_pkg.vhd".format(project)
   comment = "--"
@@ -34,60 +78,75 @@ else:
   outfile = "sourceid_{}.vh".format(project)
   comment = "//"
 
-with open(outfile, "w") as f:
-  import subprocess
-  import time
-  import re
-
-  # Extract current commit id.
-  try:
-    sourceid = subprocess.check_output(
-      ["git", "log", "-1", "--format=%H"]).decode().strip()
-    sourceid = sourceid[0:32]
-  except:
-    sourceid = 16 * "00"
-
-  # Extract current tag + dirty indicator.
-  # It is not sure if the definition of dirty is stable across all git versions.
-  try:
-    tag = subprocess.check_output(
-      ["git", "describe", "--dirty", "--always"]).decode().strip()
-    dirty = tag.endswith('-dirty')
-  except:
-    dirty = True
-
-  try:
-    version = re.search("\d+\.\d+\.\d+", tag)
-    major,minor,patch = [int(x) for x in version.group().split('.')]
-  except:
-    major = minor = patch = 0
-
-  if dirty:
-      #  There is no room for a dirty flag, just erase half of the bytes, so
-      #  that's obvious it's not a real sha1, and still leaves enough to
-      #  find the sha1 in the project.
-      sourceid = sourceid[:16] + (16 * '0')
-
-  f.write(f"{comment} Sourceid for project {project}\n")
-  f.write(f"{comment}\n")
-  f.write(f"{comment} This file was automatically generated; do not edit\n")
-  f.write("\n")
-
-  if args.language == 'VHDL':
-    f.write("library ieee;\n")
-    f.write("use ieee.std_logic_1164.all;\n")
-    f.write("\n")
-    f.write("package sourceid_{}_pkg is\n".format(project))
-    f.write("  constant sourceid : std_logic_vector(127 downto 0) :=\n")
-    f.write('       x"{}";\n'.format(sourceid))
-    f.write("  constant version : std_logic_vector(31 downto 0) := ")
-    f.write('x"{:02x}{:02x}{:04x}";\n'.format(major & 0xff, minor & 0xff, patch & 0xffff))
-    f.write('end sourceid_{}_pkg;\n'.format(project))
-  else:
-    f.write(f"`ifndef SOURCEID_{project.upper()}_H\n")
-    f.write(f"`define SOURCEID_{project.upper()}_H\n")
-    f.write("\n")
-    f.write(f"`define SOURCEID_{project.upper()}_SOURCEID 128'h{sourceid}\n")
-    f.write(f"`define SOURCEID_{project.upper()}_VERSION 32'h{major:02x}{minor:02x}{patch:04x}\n")
+import re
+import hashlib
+
+try:
+  dirty_check = gitinfo_dirty
+except NameError:
+  dirty_check = args.dirty_check
+try:
+  cache_dir = gitinfo_cache_dir
+except NameError:
+  cache_dir = args.cache_dir
+info = gitinfo.collect(dirty=dirty_check, cache_dir=cache_dir)
+
+# Current commit id.
+if info["commit"]:
+  sourceid = info["commit"][0:32]
+else:
+  sourceid = 16 * "00"
+
+# Current tag + dirty indicator (unknown is considered as dirty, unless the
+# check is disabled).
+tag = info["tag"] or ""
+dirty = info["dirty"] is not False and dirty_check != "none"
+
+try:
+  version = re.search("\d+\.\d+\.\d+", tag)
+  major,minor,patch = [int(x) for x in version.group().split('.')]
+except:
+  major = minor = patch = 0
+
+if dirty:
+    #  There is no room for a dirty flag, just erase half of the bytes, so
+    #  that's obvious it's not a real sha1, and still leaves enough to
+    #  find the sha1 in the project.
+    sourceid = sourceid[:16] + (16 * '0')
+
+inputs = hashlib.sha1(repr(
+  (project, args.language, sourceid, major, minor, patch)).encode()).hexdigest()
+
+try:
+  with open(outfile, "r") as f:
+    unchanged = cache and f"{comment} inputs: {inputs}\n" in f.read()
+except IOError:
+  unchanged = False
+
+if not unchanged:
+  with open(outfile, "w") as f:
+    f.write(f"{comment} Sourceid for project {project}\n")
+    f.write(f"{comment}\n")
+    f.write(f"{comment} This file was automatically generated; do not edit\n")
+    if cache:
+      f.write(f"{comment} inputs: {inputs}\n")
     f.write("\n")
-    f.write(f"`endif // ifndef SOURCEID_{project.upper()}_H\n")
+
+    if args.language == 'VHDL':
+      f.write("library ieee;\n")
+      f.write("use ieee.std_logic_1164.all;\n")
+      f.write("\n")
+      f.write("package sourceid_{}_pkg is\n".format(project))
+      f.write("  constant sourceid : std_logic_vector(127 downto 0) :=\n")
+      f.write('       x"{}";\n'.format(sourceid))
+      f.write("  constant version : std_logic_vector(31 downto 0) := ")
+      f.write('x"{:02x}{:02x}{:04x}";\n'.format(major & 0xff, minor & 0xff, patch & 0xffff))
+      f.write('end sourceid_{}_pkg;\n'.format(project))
+    else:
+      f.write(f"`ifndef SOURCEID_{project.upper()}_H\n")
+      f.write(f"`define SOURCEID_{project.upper()}_H\n")
+      f.write("\n")
+      f.write(f"`define SOURCEID_{project.upper()}_SOURCEID 128'h{sourceid}\n")
+      f.write(f"`define SOURCEID_{project.upper()}_VERSION 32'h{major:02x}{minor:02x}{patch:04x}\n")
+      f.write("\n")
+      f.write(f"`endif // ifndef SOURCEID_{project.upper()}_H\n")
@@ -0,0 +1,273 @@
+# Git metadata collector shared by gen_buildinfo.py and gen_sourceid.py
+#
+# collect() returns, in one call, the information the generators embed in
+# the bitstream: commit id, tag (as 'git describe --always'), dirty state and
+# user name.
+#
+# The commit id is read directly from .git/HEAD, the loose refs and
+# packed-refs; git is only run to describe commits that are not exactly on an
+# annotated tag, to check the working tree state and as a fallback.
+#
+# Checking the dirty state is the costly part on big trees: it refreshes the
+# index of the whole working tree, including submodules.  The 'dirty' argument
+# selects the check:
+#   'full':     tracked files and submodules (what 'git describe --dirty' does)
+#   'tracked':  tracked files only, submodules are not scanned
+#   'none':     no check, the dirty state is reported as unknown (None)
+#
+# The result can be cached in a file of the build directory, so that the
+# generators of several projects of the same build reuse it.  An entry is
+# reused while HEAD and the index are unchanged and it is not older than
+# 'max_age' seconds.
+
+import json
+import os
+import re
+import subprocess
+import time
+import zlib
+
+CACHE_FILE = ".gitinfo_cache.json"
+
+DIRTY_CHECKS = ("full", "tracked", "none")
+
+
+def _git(path, *args):
+    return subprocess.check_output(
+        ("git",) + args, cwd=path, stderr=subprocess.DEVNULL).decode().strip()
+
+
+def find_git_dir(path="."):
+    """Return the .git directory for PATH (following 'gitdir:' files of
+    submodules and worktrees), or None if PATH is not in a repository."""
+    path = os.path.abspath(path)
+    while True:
+        dotgit = os.path.join(path, ".git")
+        if os.path.isdir(dotgit):
+            return dotgit
+        if os.path.isfile(dotgit):
+            with open(dotgit) as f:
+                line = f.readline().strip()
+            if line.startswith("gitdir:"):
+                return os.path.normpath(
+                    os.path.join(path, line[len("gitdir:"):].strip()))
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def _common_dir(git_dir):
+    """Worktrees keep their refs in the main repository."""
+    try:
+        with open(os.path.join(git_dir, "commondir")) as f:
+            return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except IOError:
+        return git_dir
+
+
+def _packed_refs(common_dir):
+    """Return ({ref: sha1}, {ref: peeled sha1}) from packed-refs."""
+    refs = {}
+    peeled = {}
+    last = None
+    try:
+        with open(os.path.join(common_dir, "packed-refs")) as f:
+            for line in f:
+                if line.startswith("#"):
+                    continue
+                if line.startswith("^"):
+                    peeled[last] = line[1:].strip()
+                    continue
+                sha, _, last = line.strip().partition(" ")
+                refs[last] = sha
+    except IOError:
+        pass
+    return refs, peeled
+
+
+def _resolve_ref(git_dir, common_dir, ref, packed):
+    for d in (git_dir, common_dir):
+        try:
+            with open(os.path.join(d, ref)) as f:
+                value = f.read().strip()
+        except IOError:
+            continue
+        if value.startswith("ref:"):
+            return _resolve_ref(git_dir, common_dir, value[4:].strip(), packed)
+        return value
+    return packed.get(ref)
+
+
+def _loose_tag_target(common_dir, sha):
+    """Return the object pointed by the annotated tag SHA, None if SHA is
+    not a tag object (lightweight tag)."""
+    try:
+        with open(os.path.join(common_dir, "objects", sha[:2], sha[2:]), "rb") as f:
+            data = zlib.decompress(f.read())
+    except (IOError, zlib.error):
+        return None
+    if not data.startswith(b"tag "):
+        return None
+    m = re.search(rb"\x00object ([0-9a-f]{40})", data)
+    return m.group(1).decode() if m else None
+
+
+def _exact_tag(git_dir, common_dir, commit, packed, peeled):
+    """Name of an annotated tag on COMMIT, using refs only, or None.
+    None is also returned when that cannot be decided without git."""
+    tags = [ref for ref, sha in peeled.items()
+            if sha == commit and ref.startswith("refs/tags/")]
+    tags_dir = os.path.join(common_dir, "refs", "tags")
+    for root, _, files in os.walk(tags_dir):
+        for name in files:
+            ref = os.path.relpath(os.path.join(root, name), common_dir)
+            ref = ref.replace(os.sep, "/")
+            sha = _resolve_ref(git_dir, common_dir, ref, packed)
+            if not sha:
+                continue
+            if not os.path.exists(
+                    os.path.join(common_dir, "objects", sha[:2], sha[2:])):
+                # Packed object: its type is unknown.
+                return None
+            if _loose_tag_target(common_dir, sha) == commit:
+                tags.append(ref)
+    if len(tags) != 1:
+        # git describe would have to choose between several tags.
+        return None
+    return tags[0][len("refs/tags/"):]
+
+
+def _config_files(common_dir):
+    """The configuration files, in the order git reads them."""
+    files = []
+    if not os.environ.get("GIT_CONFIG_NOSYSTEM"):
+        files.append("/etc/gitconfig")
+    files.append(os.path.join(os.environ.get("XDG_CONFIG_HOME")
+                              or os.path.expanduser("~/.config"),
+                              "git", "config"))
+    files.append(os.path.expanduser("~/.gitconfig"))
+    files.append(os.path.join(common_dir, "config"))
+    return files
+
+
+def _config_user(git_dir, common_dir):
+    """user.name from the configuration files, the last one wins as in git.
+    None if it is not set or if it cannot be decided without git (included
+    files, GIT_CONFIG_* overrides)."""
+    if any(k.startswith("GIT_CONFIG") and k != "GIT_CONFIG_NOSYSTEM"
+           for k in os.environ):
+        return None
+    user = None
+    for fname in _config_files(common_dir):
+        try:
+            with open(fname) as f:
+                section = None
+                for line in f:
+                    line = line.strip()
+                    if line.startswith("["):
+                        section = line.strip("[]").strip().lower()
+                        if section.startswith("include"):
+                            return None
+                    elif section == "user" and "=" in line:
+                        key, _, value = line.partition("=")
+                        if key.strip().lower() == "name":
+                            user = value.strip().strip('"')
+        except IOError:
+            continue
+    return user
+
+
+def _index_stat(git_dir):
+    try:
+        st = os.stat(os.path.join(git_dir, "index"))
+        return [st.st_mtime_ns, st.st_size]
+    except OSError:
+        return None
+
+
+def _is_dirty(path, dirty):
+    if dirty == "none":
+        return None
+    args = ["status", "--porcelain", "--untracked-files=no"]
+    if dirty == "tracked":
+        args.append("--ignore-submodules=all")
+    try:
+        return _git(path, *args) != ""
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _collect(path, dirty):
+    info = {"commit": None, "tag": None, "dirty": None, "user": None}
+
+    git_dir = find_git_dir(path)
+    if git_dir is None:
+        return info
+    common_dir = _common_dir(git_dir)
+    packed, peeled = _packed_refs(common_dir)
+
+    info["commit"] = _resolve_ref(git_dir, common_dir, "HEAD", packed)
+    if info["commit"] is None:
+        try:
+            info["commit"] = _git(path, "rev-parse", "HEAD")
+        except (OSError, subprocess.CalledProcessError):
+            pass
+
+    if info["commit"]:
+        info["tag"] = _exact_tag(git_dir, common_dir, info["commit"],
+                                 packed, peeled)
+        if info["tag"] is None:
+            try:
+                info["tag"] = _git(path, "describe", "--always")
+            except (OSError, subprocess.CalledProcessError):
+                pass
+        info["dirty"] = _is_dirty(path, dirty)
+
+    info["user"] = _config_user(git_dir, common_dir)
+    if info["user"] is None:
+        try:
+            info["user"] = _git(path, "config", "--get", "user.name") or None
+        except (OSError, subprocess.CalledProcessError):
+            pass
+    return info
+
+
+def collect(path=".", dirty="full", cache_dir=None, max_age=60):
+    """Return a dict with the 'commit', 'tag', 'dirty' and 'user' of the
+    repository containing PATH.  Values that cannot be determined are None.
+
+    If CACHE_DIR is set, the result is cached in CACHE_DIR/CACHE_FILE and
+    reused by the next calls for at most MAX_AGE seconds."""
+    if dirty not in DIRTY_CHECKS:
+        raise ValueError("unknown dirty check '{}'".format(dirty))
+    if cache_dir is None:
+        return _collect(path, dirty)
+
+    git_dir = find_git_dir(path)
+    head = None
+    if git_dir:
+        common_dir = _common_dir(git_dir)
+        head = _resolve_ref(git_dir, common_dir, "HEAD",
+                            _packed_refs(common_dir)[0])
+    key = json.dumps([git_dir, dirty, head, git_dir and _index_stat(git_dir)])
+    cache_file = os.path.join(cache_dir, CACHE_FILE)
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except (IOError, ValueError):
+        cache = {}
+    entry = cache.get(key)
+    if entry and time.time() - entry["time"] <= max_age:
+        return entry["info"]
+
+    info = _collect(path, dirty)
+    now = time.time()
+    cache = dict((k, v) for k, v in cache.items() if now - v["time"] <= max_age)
+    cache[key] = {"time": now, "info": info}
+    try:
+        with open(cache_file, "w") as f:
+            json.dump(cache, f)
+    except IOError:
+        pass
+    return info
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+# Persistent index of the Manifest.py files and of the VHDL design units
+#
+# hdlmake evaluates every Manifest.py of the hierarchy and analyses all their
+# files, even when a design uses a few of them.  This script keeps an index of:
+#  - the manifests: the local modules and the (library, file) of each one,
+#    evaluated with the variables given by -D (target, syn_device, ...),
+#  - the VHDL files: the units they declare (entity, package, context,
+#    architecture of, package body of) and those they use (use and context
+#    clauses, entity and component instantiations), and the modules of the
+#    Verilog files (instantiated by VHDL components or other modules),
+# so that the files needed by a top entity, in analysis order, are found
+# without evaluating or parsing anything again.
+#
+# The parse is a lightweight regular expression scan of the sources (comments
+# removed), not a VHDL parser.  Component instantiations are resolved to the
+# entity of the same name, preferably in the library of the instance.  Units
+# of libraries that are not in the index (ieee, unisim, ...) are ignored.
+#
+# The index is refreshed on each call: a file or manifest whose mtime and size
+# are unchanged is not read; otherwise its content hash decides if it is
+# parsed or evaluated again.  A change of the variables re-evaluates the
+# manifests only.
+#
+# Examples:
+#   hdl_index.py -D target=xilinx -D syn_device=xc7a35t update
+#   hdl_index.py files xwb_crossbar
+#   hdl_index.py files --lib work --format ghdl wb_spi
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+PROG = os.path.basename(__file__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bump when the content of the index changes
+INDEX_VERSION = 1
+
+VHDL_EXT = (".vhd", ".vhdl")
+VERILOG_EXT = (".v", ".sv")
+
+# Variables of the manifests that are not given with -D, as set by a top
+# manifest without target.
+DEFAULT_VARS = {"target": "", "syn_device": ""}
+
+_COMMENT_RE = re.compile(r"--[^\n]*")
+_UNIT_RE = re.compile(r"^\s*(entity|package|context)\s+(\w+)\s+is\b", re.I | re.M)
+_BODY_RE = re.compile(r"^\s*package\s+body\s+(\w+)\s+is\b", re.I | re.M)
+_ARCH_RE = re.compile(r"^\s*architecture\s+\w+\s+of\s+(\w+)\s+is\b", re.I | re.M)
+_USE_RE = re.compile(r"\b(?:use|context)\s+(\w+)\.(\w+)", re.I)
+_ENTITY_INST_RE = re.compile(r":\s*entity\s+(\w+)\.(\w+)", re.I)
+_COMP_INST_RE = re.compile(
+    r"\b\w+\s*:\s*(?:component\s+)?(\w+)\s+(?:generic|port)\s+map\b", re.I)
+
+
+_VLOG_COMMENT_RE = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+_MODULE_RE = re.compile(r"^\s*module\s+(\w+)", re.M)
+_VLOG_INST_RE = re.compile(r"^\s*(\w+)\s*(?:#\s*\(|\w+\s*\()", re.M)
+
+
+class ManifestError(Exception):
+    pass
+
+
+def parse_vhdl(text):
+    """Units declared and used by the VHDL source TEXT.
+
+    Return a dict of lists:
+     - provides: names of the entities, packages and contexts,
+     - bodies: packages whose body is in the file,
+     - archs: entities whose architecture is in the file,
+     - uses: [library, name] of the use and context clauses and of the entity
+       instantiations ('work' is the library of the file),
+     - components: names of the instantiated components."""
+    text = _COMMENT_RE.sub("", text)
+    provides = sorted(set(n.lower() for _, n in _UNIT_RE.findall(text)))
+    uses = set((lib.lower(), name.lower())
+               for lib, name in _USE_RE.findall(text) + _ENTITY_INST_RE.findall(text))
+    comps = set(n.lower() for n in _COMP_INST_RE.findall(text)) - set(["entity"])
+    return {
+        "provides": provides,
+        "bodies": sorted(set(n.lower() for n in _BODY_RE.findall(text))),
+        "archs": sorted(set(n.lower() for n in _ARCH_RE.findall(text))),
+        "uses": sorted([lib, name] for lib, name in uses
+                       if not (lib == "work" and name in provides)),
+        "components": sorted(comps - set(provides)),
+    }
+
+
+def parse_verilog(text):
+    """Modules declared by the Verilog source TEXT, and the names that may be
+    instantiated modules (only those found in the index are used)."""
+    text = _VLOG_COMMENT_RE.sub("", text)
+    provides = sorted(set(_MODULE_RE.findall(text)))
+    return {
+        "provides": provides,
+        "bodies": [],
+        "archs": [],
+        "uses": [],
+        "components": [],
+        "instances": sorted(set(_VLOG_INST_RE.findall(text)) - set(provides)),
+    }
+
+
+def _as_list(v):
+    if v is None:
+        return []
+    return [v] if isinstance(v, str) else list(v)
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class Index(object):
+    """Index of the manifests below ROOT (the directory of the top
+    Manifest.py), for the manifest VARIABLES."""
+
+    def __init__(self, root=ROOT, variables=None, fname=None):
+        self.root = os.path.abspath(root)
+        self.variables = dict(variables or {})
+        self.fname = fname or os.path.join(self.root, ".hdl_index.json")
+        self.manifests = {}
+        self.files = {}
+        self.order = []
+        # Statistics of the last refresh
+        self.evaluated = 0
+        self.parsed = 0
+
+    def load(self):
+        """Read the index file, if it exists and is compatible."""
+        try:
+            with open(self.fname) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return False
+        if data.get("version") != INDEX_VERSION:
+            return False
+        self.files = data["files"]
+        # The manifests depend on the variables
+        if data.get("variables") == self.variables:
+            self.manifests = data["manifests"]
+        return True
+
+    def save(self):
+        data = {
+            "version": INDEX_VERSION,
+            "variables": self.variables,
+            "manifests": self.manifests,
+            "files": self.files,
+        }
+        tmp = self.fname + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, separators=(",", ":"), sort_keys=True)
+        os.replace(tmp, self.fname)
+
+    def _rel(self, path):
+        return os.path.relpath(path, self.root)
+
+    def _abs(self, rel):
+        return os.path.normpath(os.path.join(self.root, rel))
+
+    def _manifest(self, d):
+        """Entry of the manifest of directory D (relative), evaluated again
+        only if it changed."""
+        path = os.path.join(self._abs(d), "Manifest.py")
+        st = _stat(path)
+        entry = self.manifests.get(d)
+        if st is None:
+            return None
+        if entry is not None and entry["stat"] == st:
+            return entry
+        sha = _digest(path)
+        if entry is not None and entry["sha"] == sha:
+            entry["stat"] = st
+            return entry
+        env = dict(DEFAULT_VARS)
+        env.update(self.variables)
+        with open(path) as f:
+            code = compile(f.read(), path, "exec")
+        try:
+            exec(code, env)
+        except Exception as e:
+            raise ManifestError("{}: {}: {}".format(path, type(e).__name__, e))
+        modules = [os.path.normpath(os.path.join(d, m))
+                   for m in _as_list((env.get("modules") or {}).get("local"))]
+        entry = {
+            "stat": st,
+            "sha": sha,
+            "modules": modules,
+            "library": env.get("library") or "work",
+            "files": [os.path.normpath(os.path.join(d, f)) for f in _as_list(env.get("files"))],
+        }
+        self.manifests[d] = entry
+        self.evaluated += 1
+        return entry
+
+    def _file(self, rel, lib):
+        """Entry of the VHDL or Verilog file REL, parsed again only if it
+        changed."""
+        path = self._abs(rel)
+        st = _stat(path)
+        entry = self.files.get(rel)
+        if st is None:
+            self.files.pop(rel, None)
+            return None
+        if entry is None or entry["stat"] != st:
+            sha = _digest(path)
+            if entry is None or entry["sha"] != sha:
+                parse = parse_vhdl if rel.lower().endswith(VHDL_EXT) else parse_verilog
+                with open(path, errors="replace") as f:
+                    entry = parse(f.read())
+                entry["sha"] = sha
+                self.parsed += 1
+            entry["stat"] = st
+        entry["lib"] = lib
+        self.files[rel] = entry
+        return entry
+
+    def refresh(self):
+        """Walk the manifests from the root and update the changed entries.
+        Return the (library, file) list of the hierarchy, in hdlmake order."""
+        self.evaluated = self.parsed = 0
+        seen = set()
+        order = []
+        visited = []
+
+        def walk(d):
+            if d in seen:
+                return
+            seen.add(d)
+            entry = self._manifest(d)
+            if entry is None:
+                return
+            visited.append(d)
+            for m in entry["modules"]:
+                walk(m)
+            for f in entry["files"]:
+                order.append((entry["library"], f))
+
+        walk(".")
+        self.manifests = dict((d, self.manifests[d]) for d in visited)
+        hdl = set()
+        for lib, f in order:
+            if (f.lower().endswith(VHDL_EXT + VERILOG_EXT)
+                    and self._file(f, lib) is not None):
+                hdl.add(f)
+        self.files = dict((f, e) for f, e in self.files.items() if f in hdl)
+        self.order = [(lib, f) for lib, f in order if f in hdl]
+        return self.order
+
+    def units(self):
+        """Maps of (library, unit) to files: declarations, architectures and
+        package bodies, in manifest order."""
+        decl = {}
+        archs = {}
+        bodies = {}
+        for lib, f in self.order:
+            e = self.files[f]
+            for n in e["provides"]:
+                decl.setdefault((lib, n.lower()), []).append(f)
+            for n in e["archs"]:
+                archs.setdefault((lib, n), []).append(f)
+            for n in e["bodies"]:
+                bodies.setdefault((lib, n), []).append(f)
+        return decl, archs, bodies
+
+    def compile_list(self, tops, lib=None):
+        """(library, file) needed by the units TOPS, in analysis order, the
+        list of TOPS that were not found, and the list of components that are
+        not in the index (vendor primitives for instance)."""
+        decl, archs, bodies = self.units()
+        by_name = {}
+        for (l, n) in decl:
+            by_name.setdefault(n, []).append(l)
+        missing = []
+        done = set()
+        stack = set()
+        res = []
+
+        def deps(f):
+            """Files that must be analysed before F."""
+            e = self.files[f]
+            flib = e["lib"]
+            res = []
+            for l, n in e["uses"]:
+                l = flib if l == "work" else l
+                res.extend(decl.get((l, n), []))
+            for n in e["components"]:
+                libs = by_name.get(n, [])
+                l = flib if flib in libs else (libs[0] if libs else None)
+                res.extend(decl.get((l, n), []))
+            for n in e.get("instances", []):
+                libs = by_name.get(n.lower(), [])
+                if libs:
+                    res.extend(decl.get((flib if flib in libs else libs[0], n.lower()), []))
+            # Architectures and bodies need their entity or package
+            for n in e["archs"]:
+                res.extend(decl.get((flib, n), []))
+            for n in e["bodies"]:
+                res.extend(decl.get((flib, n), []))
+            return [d for d in res if d != f]
+
+        def needed(f):
+            """Files needed with F: other architectures and package bodies of
+            the units it declares."""
+            e = self.files[f]
+            res = []
+            for n in e["provides"]:
+                res.extend(archs.get((e["lib"], n), []))
+                res.extend(bodies.get((e["lib"], n), []))
+            return [d for d in res if d != f]
+
+        def visit(f):
+            if f in done or f in stack:
+                return
+            stack.add(f)
+            for d in deps(f):
+                visit(d)
+            stack.discard(f)
+            done.add(f)
+            res.append((self.files[f]["lib"], f))
+            for d in needed(f):
+                visit(d)
+
+        for top in tops:
+            name = top.lower()
+            libs = [lib] if lib else by_name.get(name, [])
+            files = [f for l in libs for f in decl.get((l, name), [])]
+            if not files:
+                missing.append(top)
+            for f in files[:1]:
+                visit(f)
+        external = sorted(set(n for _, f in res for n in self.files[f]["components"]
+                              if n not in by_name))
+        return res, missing, external
+
+
+def _variables(defs):
+    res = {}
+    for d in defs or []:
+        k, sep, v = d.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError("{}: expected NAME=VALUE".format(d))
+        res[k] = v
+    return res
+
+
+def _open(args):
+    idx = Index(args.root, _variables(args.define), args.index)
+    idx.load()
+    idx.refresh()
+    idx.save()
+    return idx
+
+
+def cmd_update(args):
+    t = time.time()
+    idx = _open(args)
+    print("{}: {} manifests ({} evaluated), {} HDL files ({} parsed) in {:.1f} ms".format(
+        PROG, len(idx.manifests), idx.evaluated, len(idx.files), idx.parsed,
+        (time.time() - t) * 1e3))
+
+
+def cmd_files(args):
+    idx = _open(args)
+    files, missing, external = idx.compile_list(args.top, args.lib)
+    for name in missing:
+        print("{}: {} not found".format(PROG, name), file=sys.stderr)
+    if args.verbose and external:
+        print("{}: components not in the index: {}".format(PROG, " ".join(external)),
+              file=sys.stderr)
+    for lib, f in files:
+        path = f if args.relative else idx._abs(f)
+        if args.format == "ghdl":
+            if f.lower().endswith(VHDL_EXT):
+                print("ghdl -a --work={} {}".format(lib, path))
+            else:
+                print("# {} (Verilog)".format(path))
+        elif args.format == "lib":
+            print("{} {}".format(lib, path))
+        else:
+            print(path)
+    return 1 if missing else 0
+
+
+def cmd_units(args):
+    idx = _open(args)
+    decl, archs, bodies = idx.units()
+    for (lib, n), files in sorted(decl.items()):
+        print("{}.{}: {}".format(lib, n, " ".join(files)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog=PROG, description="Index of the manifests and VHDL units, and compile lists")
+    parser.add_argument("-r", "--root", default=ROOT,
+                        help="directory of the top Manifest.py (default is general-cores)")
+    parser.add_argument("-i", "--index",
+                        help="index file (default is .hdl_index.json in the root)")
+    parser.add_argument("-D", "--define", action="append", metavar="NAME=VALUE",
+                        help="manifest variable (target, syn_device, ...)")
+    sub = parser.add_subparsers(dest="cmd")
+    sub.required = True
+
+    p = sub.add_parser("update", help="refresh the index")
+    p.set_defaults(func=cmd_update)
+
+    p = sub.add_parser("files", help="ordered compile list of top units")
+    p.add_argument("top", nargs="+", help="top entities (or packages)")
+    p.add_argument("--lib", help="library of the top units (default is any)")
+    p.add_argument("-f", "--format", choices=("path", "lib", "ghdl"), default="path",
+                   help="one path per line, 'library path', or ghdl -a commands")
+    p.add_argument("--relative", action="store_true", help="paths relative to the root")
+    p.add_argument("-v", "--verbose", action="store_true",
+                   help="list the components that are not in the index")
+    p.set_defaults(func=cmd_files)
+
+    p = sub.add_parser("units", help="list the units and their files")
+    p.set_defaults(func=cmd_units)
+
+    args = parser.parse_args()
+    try:
+        return args.func(args)
+    except ManifestError as e:
+        print("{}: {}".format(PROG, e), file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,16 +12,35 @@
 ##
 ## Usage:
 ##   python mem_init_gen.py -of output_format input_file > output_file
+##   python mem_init_gen.py -of output_format -o output_file input_file
+##   python mem_init_gen.py -b jobs_file [-j jobs]
+##
+## In batch mode, each non-empty line of jobs_file describes one conversion
+## with the same arguments as above (and a mandatory -o); the conversions run
+## in parallel over a pool of processes.
+##
+## With --cache, a hash of the input and options is kept in output_file.sha1
+## and output_file is not rewritten when they did not change.
+##
+## The script can also be imported and used as a library, see convert() and
+## convert_file().
 ##
 ## Supported output formats:
 ##
 ##   bram: custom ascii-encoded binary, one 32-bit value per line, for Xilinx,
 ##         to be used with the functions in the memory_loader_pkg
 ##
+##   hex : same as bram with hexadecimal digits, 4 times smaller and faster to
+##         load by the memory_loader_pkg functions (they accept both)
+##
 ##   mif : Altera Memory Initialization File
 ##
 ##   vhd : constant VHDL array of type t_meminit_array, as defined in genram_pkg.
 ##
+## The input file is memory-mapped and converted in blocks of --chunk words
+## with NumPy, so memory usage stays bounded whatever the image size and
+## depth, and the output is written with a few large writes per block.
+##
 ##-------------------------------------------------------------------------------
 ## Copyright CERN 2018
 ##-------------------------------------------------------------------------------
@@ -33,123 +52,379 @@
 from __future__ import print_function
 
 import argparse
-import binascii
 import datetime
+import hashlib
+import mmap
+import os
+import shlex
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+PROG = os.path.basename ( __file__ )
+
+FORMATS = ( 'BRAM', 'HEX', 'MIF', 'VHD' )
+
+# Number of memory words converted at once.
+CHUNK_WORDS = 1 << 16
+
+# ASCII lookup tables, indexed by byte (or nibble/digit) value.
+_HEX_DIGITS = np.frombuffer ( b'0123456789abcdef', dtype = np.uint8 )
+_HEX_LUT = np.stack ( [ _HEX_DIGITS[np.arange ( 256 ) >> 4],
+                        _HEX_DIGITS[np.arange ( 256 ) & 0xf] ], axis = 1 )
+_BIN_LUT = np.where ( ( np.arange ( 256 )[:, None] >> np.arange ( 7, -1, -1 ) ) & 1,
+                      ord ( '1' ), ord ( '0' ) ).astype ( np.uint8 )
+
+
+def _map_file ( fin ):
+    """Return a read-only buffer on the content of an open binary file."""
+    try:
+        return mmap.mmap ( fin.fileno ( ), 0, access = mmap.ACCESS_READ )
+    except ( ValueError, OSError ):
+        # Empty files (and pipes) cannot be mapped.
+        return fin.read ( )
+
+
+def _word_count ( size, width, depth ):
+    """Number of memory words generated for an input of SIZE bytes."""
+    if depth:
+        return depth
+    return ( size + width - 1 ) // width
+
 
-today = datetime.date.today()
-
-parser = argparse.ArgumentParser (
-    description='script to generate an init file for block rams' )
-
-parser.add_argument ( 'in_file' )
-parser.add_argument ( '-i', '--invert', action='store_true', dest='invert',
-                      help = 'Invert endianess of input file' )
-parser.add_argument ( '-of', '--oformat', choices = ['BRAM', 'MIF', 'VHD'], type = str.upper,
-                      required = False, dest='oformat', default = 'BRAM',
-                      help = 'output format (default is BRAM)' )
-parser.add_argument ( '-d', '--depth', type = int, default = 0,
-                      required = False, dest='depth',
-                      help = 'depth of memory in bytes (default is equal to the '
-                      'size of the input file)' )
-parser.add_argument ( '-w', '--width', type = int,
-                      required = False, dest='width', default = 4,
-                      help = 'width of memory in bytes (default is 4)' )
-parser.add_argument ( '-p', '--pad', type = int,
-                      required = False, dest='pad', default = 0,
-                      help = 'byte padding value to use if size argument is larger '
-                      'than input file size (default is 0, max is 255)' )
-parser.add_argument ( '-n', '--name', type = str.lower,
-                      required = False, dest='name', default = 'mem_init',
-                      help = 'name to use for this block (default is "mem_init")' )
-
-args = parser.parse_args ( )
-
-# check for proper padding value
-if args.pad not in range ( 0, 256 ):
-    parser.error ( 'Padding value must be between 0 and 255' )
-
-# read binary file
-with open ( args.in_file, 'rb' ) as fin:
-    contents = fin.read ( )
-
-# byte value to use for padding
-pad_val = chr ( args.pad & 0xff ).encode ( )
-
-# pad/trim if necessary to get to args.depth
-if args.depth:
-    byte_count = args.depth * args.width
-    if byte_count > len ( contents ):
-        contents += pad_val * ( byte_count - len ( contents ) )
-    else:
-        contents = contents[:byte_count]
-
-# pad if necessary to get to args.width boundary
-contents += pad_val * ( len ( contents ) % args.width )
-
-# convert to 2D list of WIDTH-sized ASCII-encoded (hex format) elements
-# with optional endianess inversion
-if args.invert == True and args.width > 1:
-    words = [ int ( binascii.hexlify ( contents[i:i+args.width][::-1] ), 16 )
-              for i in range ( 0, len ( contents ), args.width ) ]
-else:
-    words = [ int ( binascii.hexlify ( contents[i:i+args.width] ), 16 )
-              for i in range ( 0, len ( contents ), args.width ) ]
-
-# BRAM output
-if args.oformat == 'BRAM':
-    fwidth = args.width * 8
-    for word in words:
-        print ( '{0:0{fwidth}b}'.format ( word, fwidth = fwidth ) )
-
-# MIF output
-if args.oformat == 'MIF':
-    print ( 'DEPTH = {0};'.format ( len ( words ) ) )
-    print ( 'WIDTH = {0};'.format ( args.width ) )
-    print ( 'ADDRESS_RADIX = HEX;' )
-    print ( 'DATA_RADIX = HEX;' )
-    print ( 'CONTENT' )
-    print ( 'BEGIN' )
-    fwidth = args.width * 2
-    for i, word in enumerate ( words ):
-        print ( '{0:x} : {1:0{fwidth}x};'.format ( i, word, fwidth = fwidth ) )
-    print ( 'END;' )
-
-# VHD output
-if args.oformat == 'VHD':
-    print ( '-' * 80 )
-    print ( '-- Memory initialization file for {0}'.format ( args.in_file ) )
-    print ( '--' )
-    print ( '-- This file was automatically generated on {0}'.format (
-        today.strftime ( '%A, %B %d %Y') ) )
-    print ( '-- by {0} using the following arguments:'.format ( parser.prog ) )
-    print ( '--  {0}'.format ( vars(args) ) )
-    print ( '--' )
-    print ( '-- {0} is part of OHWR general-cores:'.format ( parser.prog ) )
-    print ( '-- https://www.ohwr.org/projects/general-cores/wiki' )
-    print ( '-' * 80 )
-    print ( )
-    print ( 'library ieee;' )
-    print ( 'use ieee.std_logic_1164.all;' )
-    print ( 'use ieee.numeric_std.all;' )
-    print ( )
-    print ( 'library work;' )
-    print ( 'use work.memory_loader_pkg.all;' )
-    print ( )
-    print ( 'package {0}_pkg is'.format ( args.name ) )
-    print ( )
-    print ( '  constant {0} : t_meminit_array('.format ( args.name ),
-            '{0} downto 0, {1} downto 0) := ('.format ( len ( words ) - 1, args.width * 8 - 1 ) )
-    iwidth  = len ( str ( len ( words ) ) )
-    fwidth  = args.width * 2
-    numcol  = 80 / (12 + iwidth + fwidth)
-    for i, word in enumerate ( words ):
-        print ( '    {0:{iwidth}d} => x"{1:0{fwidth}x}"'.format (
-            i, word, iwidth = iwidth, fwidth = fwidth ), end = '' )
-        if i == len ( words ) - 1:
-            print ( ');' );
+def _iter_words ( buf, width, depth = 0, pad = 0, invert = False,
+                  chunk = CHUNK_WORDS ):
+    """Yield (first_address, words) blocks, WORDS being a (n, width) uint8
+    array with the most significant byte first.  The input is trimmed or
+    padded with PAD to DEPTH words (or to a whole number of words)."""
+    nwords = _word_count ( len ( buf ), width, depth )
+    nbytes = min ( len ( buf ), nwords * width )
+    for first in range ( 0, nwords, chunk ):
+        count = min ( chunk, nwords - first )
+        start = first * width
+        end = start + count * width
+        if end <= nbytes:
+            words = np.frombuffer ( buf, dtype = np.uint8,
+                                    count = count * width, offset = start )
         else:
-            print ( ',', end = '' );
-            if i % numcol == numcol - 1:
-                print ( )
-    print ( )
-    print ( 'end package {0}_pkg;'.format ( args.name ) )
+            words = np.full ( count * width, pad, dtype = np.uint8 )
+            if start < nbytes:
+                words[:nbytes - start] = np.frombuffer (
+                    buf, dtype = np.uint8, count = nbytes - start, offset = start )
+        words = words.reshape ( count, width )
+        if invert:
+            # Byte-swapped view of each word.
+            words = words[:, ::-1]
+        yield first, words
+
+
+def _columns ( count, *parts ):
+    """Concatenate PARTS into a (count, n) uint8 array of ASCII records.
+    Each part is either a bytes constant or a (count, k) uint8 array."""
+    cols = []
+    for part in parts:
+        if isinstance ( part, bytes ):
+            part = np.broadcast_to ( np.frombuffer ( part, dtype = np.uint8 ),
+                                     ( count, len ( part ) ) )
+        cols.append ( part )
+    return np.concatenate ( cols, axis = 1 )
+
+
+def _hex_digits ( values, ndigits ):
+    """ASCII hexadecimal digits of VALUES, zero-padded to NDIGITS."""
+    shifts = 4 * np.arange ( ndigits - 1, -1, -1, dtype = np.uint64 )
+    return _HEX_DIGITS[( values[:, None] >> shifts ) & 0xf]
+
+
+def _dec_digits ( values, ndigits ):
+    """ASCII decimal digits of VALUES, right aligned (space-padded) to NDIGITS."""
+    powers = 10 ** np.arange ( ndigits - 1, -1, -1, dtype = np.uint64 )
+    digits = ( ( values[:, None] // powers ) % 10 ).astype ( np.uint8 ) + ord ( '0' )
+    digits[( values[:, None] < powers ) & ( powers > 1 )] = ord ( ' ' )
+    return digits
+
+
+def _bram_lines ( first, words ):
+    count, width = words.shape
+    return _columns ( count, _BIN_LUT[words].reshape ( count, width * 8 ),
+                      b'\n' ).tobytes ( )
+
+
+def _hex_lines ( first, words ):
+    count, width = words.shape
+    return _columns ( count, _HEX_LUT[words].reshape ( count, width * 2 ),
+                      b'\n' ).tobytes ( )
+
+
+def _mif_lines ( first, words ):
+    count, width = words.shape
+    addr = np.arange ( first, first + count, dtype = np.uint64 )
+    ndigits = max ( 1, ( int ( addr[-1] ).bit_length ( ) + 3 ) // 4 )
+    digits = _hex_digits ( addr, ndigits )
+    # Addresses are not zero-padded: drop the leading zero digits.
+    keep = np.ones_like ( digits, dtype = bool )
+    keep[:, :-1] = ( addr[:, None] >> ( 4 * np.arange (
+        ndigits - 1, 0, -1, dtype = np.uint64 ) ) ) != 0
+    rec = _columns ( count, digits, b' : ',
+                     _HEX_LUT[words].reshape ( count, width * 2 ), b';\n' )
+    mask = _columns ( count, keep,
+                      np.ones ( ( count, rec.shape[1] - ndigits ), dtype = bool ) )
+    return rec[mask].tobytes ( )
+
+
+def _vhd_lines ( first, words, nwords, iwidth, numcol ):
+    count, width = words.shape
+    addr = np.arange ( first, first + count, dtype = np.uint64 )
+    last = addr == nwords - 1
+    rec = _columns ( count, b'    ', _dec_digits ( addr, iwidth ), b' => x"',
+                     _HEX_LUT[words].reshape ( count, width * 2 ), b'",;\n' )
+    rec[last, -3] = ord ( ')' )
+    # The ';' only follows the last element, new lines end each row.
+    mask = np.ones_like ( rec, dtype = bool )
+    mask[:, -2] = last
+    mask[:, -1] = last | ( addr % numcol == numcol - 1 )
+    return rec[mask].tobytes ( )
+
+
+def convert ( buf, width = 4, fmt = 'BRAM', invert = False, depth = 0, pad = 0,
+              name = 'mem_init', chunk = CHUNK_WORDS, source = '<buffer>',
+              options = None ):
+    """Convert the raw binary image BUF (bytes, mmap or any object supporting
+    the buffer protocol) into an init file of format FMT.
+
+    This is a generator yielding the output as blocks of bytes, so that large
+    images can be streamed; use b''.join(convert(...)) to get the whole file.
+    SOURCE and OPTIONS are only used in the VHD header comment."""
+    fmt = fmt.upper ( )
+    if fmt not in FORMATS:
+        raise ValueError ( 'Unknown output format {0}'.format ( fmt ) )
+    if pad not in range ( 0, 256 ):
+        raise ValueError ( 'Padding value must be between 0 and 255' )
+    if width < 1:
+        raise ValueError ( 'Width must be at least 1 byte' )
+    if chunk < 1:
+        raise ValueError ( 'Chunk size must be at least 1 word' )
+    if options is None:
+        options = dict ( width = width, oformat = fmt, invert = invert,
+                         depth = depth, pad = pad, name = name )
+
+    nwords = _word_count ( len ( buf ), width, depth )
+    blocks = _iter_words ( buf, width, depth, pad, invert and width > 1, chunk )
+
+    # BRAM output
+    if fmt == 'BRAM':
+        for first, words in blocks:
+            yield _bram_lines ( first, words )
+
+    # HEX output
+    if fmt == 'HEX':
+        for first, words in blocks:
+            yield _hex_lines ( first, words )
+
+    # MIF output
+    if fmt == 'MIF':
+        head = [ 'DEPTH = {0};'.format ( nwords ),
+                 'WIDTH = {0};'.format ( width ),
+                 'ADDRESS_RADIX = HEX;',
+                 'DATA_RADIX = HEX;',
+                 'CONTENT',
+                 'BEGIN', '' ]
+        yield '\n'.join ( head ).encode ( )
+        for first, words in blocks:
+            yield _mif_lines ( first, words )
+        yield b'END;\n'
+
+    # VHD output
+    if fmt == 'VHD':
+        head = [ '-' * 80,
+                 '-- Memory initialization file for {0}'.format ( source ),
+                 '--',
+                 '-- This file was automatically generated on {0}'.format (
+                     datetime.date.today ( ).strftime ( '%A, %B %d %Y') ),
+                 '-- by {0} using the following arguments:'.format ( PROG ),
+                 '--  {0}'.format ( options ),
+                 '--',
+                 '-- {0} is part of OHWR general-cores:'.format ( PROG ),
+                 '-- https://www.ohwr.org/projects/general-cores/wiki',
+                 '-' * 80,
+                 '',
+                 'library ieee;',
+                 'use ieee.std_logic_1164.all;',
+                 'use ieee.numeric_std.all;',
+                 '',
+                 'library work;',
+                 'use work.memory_loader_pkg.all;',
+                 '',
+                 'package {0}_pkg is'.format ( name ),
+                 '',
+                 '  constant {0} : t_meminit_array( {1} downto 0, {2} downto 0) := ('.format (
+                     name, nwords - 1, width * 8 - 1 ), '' ]
+        yield '\n'.join ( head ).encode ( )
+        iwidth  = len ( str ( nwords ) )
+        fwidth  = width * 2
+        numcol  = max ( 1, 80 // (12 + iwidth + fwidth) )
+        for first, words in blocks:
+            yield _vhd_lines ( first, words, nwords, iwidth, numcol )
+        yield '\nend package {0}_pkg;\n'.format ( name ).encode ( )
+
+
+def _inputs_digest ( buf, oformat, kwargs ):
+    """Hash of everything the output of convert() depends on (but the date)."""
+    h = hashlib.sha1 ( buf )
+    params = dict ( kwargs, oformat = oformat )
+    params.pop ( 'chunk', None )
+    h.update ( repr ( sorted ( params.items ( ) ) ).encode ( ) )
+    return h.hexdigest ( )
+
+
+def convert_file ( in_file, output = None, oformat = 'BRAM', options = None,
+                   cache = False, **kwargs ):
+    """Convert the binary file IN_FILE and write the result to the file
+    OUTPUT (or to the standard output).  The other arguments are those of
+    convert().
+
+    If CACHE is set, a hash of the input image and of the conversion options
+    is stored next to OUTPUT (with a .sha1 suffix), and OUTPUT is left
+    untouched when that hash has not changed.  Return False in that case."""
+    with open ( in_file, 'rb' ) as fin:
+        buf = _map_file ( fin )
+        if cache and output:
+            digest = _inputs_digest ( buf, oformat, kwargs )
+            stamp = output + '.sha1'
+            try:
+                with open ( stamp ) as f:
+                    if f.read ( ).strip ( ) == digest and os.path.exists ( output ):
+                        return False
+            except IOError:
+                pass
+        if output:
+            fout = open ( output, 'wb' )
+        else:
+            fout = getattr ( sys.stdout, 'buffer', sys.stdout )
+        try:
+            for block in convert ( buf, fmt = oformat, source = in_file,
+                                   options = options, **kwargs ):
+                fout.write ( block )
+        finally:
+            if output:
+                fout.close ( )
+            else:
+                fout.flush ( )
+        if cache and output:
+            with open ( stamp, 'w' ) as f:
+                f.write ( digest + '\n' )
+    return True
+
+
+def _run_job ( job ):
+    """Process pool worker: convert one job, return (output, error)."""
+    try:
+        convert_file ( **job )
+    except Exception as e:
+        return job['output'], '{0}: {1}'.format ( job['in_file'], e )
+    return job['output'], None
+
+
+def run_batch ( jobs, workers = None ):
+    """Run the conversion JOBS (list of convert_file() keyword dicts, each
+    with an 'output') over a pool of WORKERS processes (default is the
+    number of CPUs).  Return the list of error messages."""
+    if workers == 1 or len ( jobs ) <= 1:
+        results = map ( _run_job, jobs )
+        return [ err for _, err in results if err ]
+    with ProcessPoolExecutor ( max_workers = workers ) as pool:
+        return [ err for _, err in pool.map ( _run_job, jobs ) if err ]
+
+
+def _build_parser ( ):
+    parser = argparse.ArgumentParser (
+        description='script to generate an init file for block rams' )
+
+    parser.add_argument ( 'in_file', nargs = '?' )
+    parser.add_argument ( '-i', '--invert', action='store_true', dest='invert',
+                          help = 'Invert endianess of input file' )
+    parser.add_argument ( '-of', '--oformat', choices = FORMATS, type = str.upper,
+                          required = False, dest='oformat', default = 'BRAM',
+                          help = 'output format (default is BRAM)' )
+    parser.add_argument ( '-d', '--depth', type = int, default = 0,
+                          required = False, dest='depth',
+                          help = 'depth of memory in bytes (default is equal to the '
+                          'size of the input file)' )
+    parser.add_argument ( '-w', '--width', type = int,
+                          required = False, dest='width', default = 4,
+                          help = 'width of memory in bytes (default is 4)' )
+    parser.add_argument ( '-p', '--pad', type = int,
+                          required = False, dest='pad', default = 0,
+                          help = 'byte padding value to use if size argument is larger '
+                          'than input file size (default is 0, max is 255)' )
+    parser.add_argument ( '-n', '--name', type = str.lower,
+                          required = False, dest='name', default = 'mem_init',
+                          help = 'name to use for this block (default is "mem_init")' )
+    parser.add_argument ( '-o', '--output', type = str,
+                          required = False, dest='output', default = None,
+                          help = 'output file (default is standard output)' )
+    parser.add_argument ( '-c', '--chunk', type = int,
+                          required = False, dest='chunk', default = CHUNK_WORDS,
+                          help = 'number of words converted at once '
+                          '(default is {0})'.format ( CHUNK_WORDS ) )
+    parser.add_argument ( '--cache', action='store_true', dest='cache',
+                          help = 'do not rewrite the output file if the input file '
+                          'and the options did not change (requires -o)' )
+    parser.add_argument ( '-b', '--batch', type = str,
+                          required = False, dest='batch', default = None,
+                          help = 'file listing one conversion per line, with the '
+                          'same arguments as this command (-o is mandatory)' )
+    parser.add_argument ( '-j', '--jobs', type = int,
+                          required = False, dest='jobs', default = None,
+                          help = 'number of parallel conversions in batch mode '
+                          '(default is the number of CPUs)' )
+    return parser
+
+
+def _job_args ( parser, args ):
+    """Validate parsed ARGS and return them as a convert_file() job."""
+    if args.in_file is None:
+        parser.error ( 'An input file is required' )
+    if args.pad not in range ( 0, 256 ):
+        parser.error ( 'Padding value must be between 0 and 255' )
+    if args.width < 1:
+        parser.error ( 'Width must be at least 1 byte' )
+    if args.chunk < 1:
+        parser.error ( 'Chunk size must be at least 1 word' )
+    job = vars ( args ).copy ( )
+    del job['batch'], job['jobs']
+    job['options'] = vars ( args )
+    return job
+
+
+def main ( ):
+    parser = _build_parser ( )
+    args = parser.parse_args ( )
+
+    if not args.batch:
+        convert_file ( **_job_args ( parser, args ) )
+        return
+
+    jobs = []
+    with open ( args.batch ) as f:
+        for lineno, line in enumerate ( f, 1 ):
+            argv = shlex.split ( line, comments = True )
+            if not argv:
+                continue
+            job_parser = _build_parser ( )
+            job_parser.prog = '{0}:{1}'.format ( args.batch, lineno )
+            job = _job_args ( job_parser, job_parser.parse_args ( argv ) )
+            if not job['output']:
+                job_parser.error ( 'Batch jobs need an output file (-o)' )
+            jobs.append ( job )
+
+    errors = run_batch ( jobs, args.jobs )
+    for err in errors:
+        print ( err, file = sys.stderr )
+    if errors:
+        sys.exit ( 1 )
+
+
+if __name__ == '__main__':
+    main ( )
@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+# SDB address map planner for xwb_sdb_crossbar
+#
+# Computes, from a JSON description of a crossbar, what wishbone_pkg computes
+# during elaboration:
+#  - the layout: f_sdb_auto_layout/f_sdb_auto_sdb (layout "auto"),
+#    f_sdb_automap_array/f_sdb_create_rom_addr with the alignment rules of
+#    f_align_addr_offset (layout "automap"), or the addresses of the
+#    description (layout "manual"),
+#  - the end of the bus (f_sdb_bus_end) and the g_address/g_mask of the
+#    crossbars of xwb_sdb_crossbar, with its checks,
+#  - the content of sdb_rom (without the MSI flag, set at run time).
+# The records are 512-bit integers built as the f_sdb_embed_* functions do, so
+# the results are bit-exact, including the loss of the endian flag of the
+# devices and MSIs laid out by "auto" or "automap" (f_sdb_extract_device and
+# f_sdb_extract_msi read it from bit 452, where the embed functions put 0).
+#
+# The results are written as a VHDL package: the laid out records can be given
+# to xwb_sdb_crossbar (g_layout, g_sdb_addr), and the addresses, masks and ROM
+# words to an xwb_crossbar and a ROM, without any layout function evaluated
+# during elaboration.
+#
+# Description (JSON; numbers may be strings such as "0x1000"):
+#   {
+#     "name": "top",                 # prefix of the VHDL constants
+#     "layout": "auto",              # auto, automap or manual
+#     "start": 0,                    # automap: start offset
+#     "sdb_addr": "0x3fe00",         # manual: address of the SDB ROM
+#     "wraparound": true,            # g_wraparound
+#     "sdb_name": "WB4-Crossbar-GSI",
+#     "num_masters": 1,              # g_num_masters (default is the MSI records)
+#     "slaves": [ records ],         # in the order of master_o
+#     "masters": [ records ]         # MSI records, after the slaves
+#   }
+# A record has a "type" (device, the default, bridge, msi, integration,
+# repo_url or synthesis), a "name" (product name), "vendor_id", "device_id",
+# "version", "date", "size" in bytes (or "addr_last"), "address" (addr_first,
+# default 0) and "enable" (false gives the empty record of f_sdb_auto_*).
+# Devices also have "abi_class", "abi_ver_major", "abi_ver_minor", "endian"
+# (big or little) and "width" (wbd_width).  A bridge has either "size" and
+# "sdb_child", or "bus": the description of the crossbar behind it, planned
+# first and described as f_xwb_bridge_layout_sdb does.
+#
+# Examples:
+#   sdb_layout.py map top.json
+#   sdb_layout.py package top.json -o top_sdb_pkg.vhd
+
+import argparse
+import json
+import os
+import sys
+
+PROG = os.path.basename(__file__)
+
+ADDRESS_WIDTH = 32  # c_wishbone_address_width
+DATA_WIDTH = 32  # c_wishbone_data_width
+RECORD_BITS = 512  # c_sdb_device_length
+RECORD_BYTES = RECORD_BITS // 8
+
+ADDRESS_MASK = (1 << ADDRESS_WIDTH) - 1
+MASK64 = (1 << 64) - 1
+
+# Record types
+INTERCONNECT = 0x00
+DEVICE = 0x01
+BRIDGE = 0x02
+MSI = 0x03
+INTEGRATION = 0x80
+REPO_URL = 0x81
+SYNTHESIS = 0x82
+EMPTY_DEVICE = 0xf1
+EMPTY_BRIDGE = 0xf2
+EMPTY_MSI = 0xf3
+
+TYPES = {"device": DEVICE, "bridge": BRIDGE, "msi": MSI, "integration": INTEGRATION,
+         "repo_url": REPO_URL, "synthesis": SYNTHESIS}
+
+GSI = 0x651
+
+
+class SdbError(Exception):
+    pass
+
+
+def ceil_log2(x):
+    """f_ceil_log2."""
+    return (x - 1).bit_length() if x > 1 else 0
+
+
+def smear(v):
+    """Set all the bits below the most significant one, as the loops that
+    round a size up to a power of two minus one."""
+    return (1 << v.bit_length()) - 1
+
+
+def fix_len(s, n):
+    """f_string_fix_len(S, N, ' ', false)."""
+    return s[:n] if len(s) >= n else s + " " * (n - len(s))
+
+
+def string_bits(s, n):
+    """f_string2svl of the N characters string S."""
+    return int.from_bytes(fix_len(s, n).encode("latin-1"), "big")
+
+
+def rom_bytes(entries):
+    """Size of the SDB ROM for ENTRIES layout records."""
+    return (1 << ceil_log2(entries + 1)) * RECORD_BYTES
+
+
+def field(rec, hi, lo):
+    return (rec >> lo) & ((1 << (hi - lo + 1)) - 1)
+
+
+def rec_type(rec):
+    return rec & 0xff
+
+
+def addr_first(rec):
+    return field(rec, 447, 384)
+
+
+def addr_last(rec):
+    return field(rec, 383, 320)
+
+
+def product_name(rec):
+    return field(rec, 159, 8).to_bytes(19, "big").decode("latin-1").rstrip()
+
+
+def embed_product(vendor_id, device_id, version, date, name):
+    """f_sdb_embed_product, at its place in the record (319 downto 8)."""
+    return ((vendor_id << 256) | (device_id << 224) | (version << 192) | (date << 160)
+            | (string_bits(name, 19) << 8))
+
+
+def embed_component(first, last, product, address):
+    """f_sdb_embed_component (447 downto 8)."""
+    base = address & ADDRESS_MASK
+    return (base << 384) | (((base + last - first) & MASK64) << 320) | product
+
+
+def relocate(rec, address):
+    """Re-embed a device, bridge or MSI record at ADDRESS, as
+    f_sdb_embed_*(f_sdb_extract_*(rec), address).  The extract functions
+    of devices and MSIs read wbd_endian from bit 452 instead of 455, so the
+    endian flag is lost (little-endian records come back big-endian)."""
+    typ = rec_type(rec)
+    first = addr_first(rec)
+    base = address & ADDRESS_MASK
+    res = rec & ~(((1 << 128) - 1) << 320)
+    res |= embed_component(first, addr_last(rec), 0, base)
+    if typ in (DEVICE, MSI):
+        res = (res & ~(0xf << 452)) | (field(rec, 452, 452) << 455)
+    if typ == BRIDGE:
+        child = field(rec, 511, 448)
+        res = (res & ((1 << 448) - 1)) | (((base + child - first) & MASK64) << 448)
+    return res
+
+
+def _int(v, default=0):
+    if v is None:
+        return default
+    if isinstance(v, str):
+        return int(v, 0)
+    return int(v)
+
+
+def _component(desc, default_last=0):
+    first = _int(desc.get("address"))
+    if "addr_last" in desc:
+        last = _int(desc["addr_last"])
+    elif "size" in desc:
+        last = first + _int(desc["size"]) - 1
+    else:
+        last = default_last
+    return first, last
+
+
+def _product(desc, vendor_id=0, device_id=0, version=1, date=0, name=""):
+    return embed_product(_int(desc.get("vendor_id"), vendor_id),
+                         _int(desc.get("device_id"), device_id),
+                         _int(desc.get("version"), version),
+                         _int(desc.get("date"), date),
+                         desc.get("name", name))
+
+
+def make_record(desc, path=None):
+    """The record of the description DESC, at address 0 unless it gives one
+    (f_sdb_auto_device, f_sdb_auto_bridge, f_sdb_auto_msi, f_sdb_embed_*).
+    Return (record, child plan or None)."""
+    kind = desc.get("type", "device")
+    if kind not in TYPES:
+        raise SdbError("{}: unknown record type {}".format(desc.get("name"), kind))
+    typ = TYPES[kind]
+    if not desc.get("enable", True):
+        if typ not in (DEVICE, BRIDGE, MSI):
+            raise SdbError("{}: only devices, bridges and msi can be disabled"
+                           .format(desc.get("name")))
+        return typ | 0xf0, None
+    endian = 1 if desc.get("endian", "big") == "little" else 0
+    child = None
+    if typ == DEVICE:
+        first, last = _component(desc)
+        rec = ((_int(desc.get("abi_class")) << 496) | (_int(desc.get("abi_ver_major")) << 488)
+               | (_int(desc.get("abi_ver_minor")) << 480) | (endian << 455)
+               | (_int(desc.get("width"), 7) << 448)
+               | embed_component(first, last, _product(desc), first) | DEVICE)
+    elif typ == MSI:
+        first, last = _component(desc)
+        rec = ((endian << 455) | (_int(desc.get("width"), 7) << 448)
+               | embed_component(first, last, _product(desc), first) | MSI)
+    elif typ == BRIDGE:
+        if "bus" in desc:
+            # f_xwb_bridge_layout_sdb
+            child = Plan(desc["bus"], path)
+            sdb_child = child.sdb_addr
+            first, last = _int(desc.get("address")), child.bus_last & ADDRESS_MASK
+            last += first
+        else:
+            sdb_child = _int(desc.get("sdb_child"))
+            first, last = _component(desc)
+        product = _product(desc, GSI, 0xeef0b198, 1, 0x20120511, "WB4-Bridge-GSI")
+        # sdb_child is relative to the bridge
+        rec = ((((first + sdb_child) & MASK64) << 448)
+               | embed_component(first, last, product, first) | BRIDGE)
+    elif typ == INTEGRATION:
+        rec = _product(desc) | INTEGRATION
+    elif typ == REPO_URL:
+        rec = (string_bits(desc.get("url", ""), 63) << 8) | REPO_URL
+    else:
+        commit = desc.get("commit_id", "")
+        rec = ((string_bits(desc.get("module_name", ""), 16) << 384)
+               | (int((commit + "0" * 32)[:32], 16) << 256)
+               | (string_bits(desc.get("tool_name", ""), 8) << 192)
+               | (_int(desc.get("tool_version")) << 160)
+               | (_int(desc.get("date")) << 128)
+               | (string_bits(desc.get("username", ""), 15) << 8) | SYNTHESIS)
+    return rec, child
+
+
+def auto_layout(records):
+    """f_sdb_auto_layout_helper: addresses of the records and of the SDB ROM
+    (last one).  The devices, bridges and MSI at address 0 are placed by
+    increasing size (rounded up to a power of two), in index order for a
+    given size, each kind in its own address space."""
+    n = len(records)
+    sizes = []
+    address = []
+    bus = []
+    msi = []
+    for i, rec in enumerate(records):
+        sizes.append(smear(addr_last(rec)))
+        address.append(addr_first(rec))
+        if address[i] == 0:
+            typ = rec_type(rec)
+            if typ in (DEVICE, BRIDGE):
+                bus.append(i)
+            elif typ == MSI:
+                msi.append(i)
+    sizes.append(rom_bytes(n) - 1)
+    address.append(0)
+    bus.append(n)
+
+    # A size of 2**k-1 is placed in pass j = k of the helper
+    for idx in (bus, msi):
+        passes = {}
+        for i in idx:
+            passes.setdefault(sizes[i].bit_length(), []).append(i)
+        cursor = 0
+        for j in range(64):
+            for i in passes.get(j, ()):
+                address[i] = cursor
+                cursor = (cursor + (1 << j)) & MASK64
+            if cursor >> j & 1:
+                cursor = (cursor + (1 << j)) & MASK64
+    return address
+
+
+def align_addr_offset(offs, this_rng, prev_rng):
+    """f_align_addr_offset."""
+    env = 1 << max(this_rng.bit_length(), prev_rng.bit_length())
+    if prev_rng != 0:
+        return (offs + env - offs % env) & MASK64
+    return offs
+
+
+def automap(records, start=0):
+    """f_sdb_automap_array."""
+    res = []
+    this_rng = prev_rng = 0
+    this_offs = 0
+    prev_offs = start & ADDRESS_MASK
+    for rec in records:
+        if rec_type(rec) in (DEVICE, BRIDGE):
+            this_rng = (addr_last(rec) - addr_first(rec)) & MASK64
+            this_offs = align_addr_offset(prev_offs, this_rng, prev_rng)
+            res.append(relocate(rec, this_offs))
+        else:
+            res.append(rec)
+        prev_rng = this_rng
+        prev_offs = this_offs
+    return res
+
+
+def create_rom_addr(records):
+    """f_sdb_create_rom_addr: first gap between the devices and bridges where
+    the SDB ROM fits, or after the last one."""
+    size = rom_bytes(len(records))
+    result = 0
+    this_base = this_end = prev_base = prev_end = 0
+    for rec in records:
+        if rec_type(rec) in (DEVICE, BRIDGE):
+            this_base = addr_first(rec)
+            this_end = addr_last(rec)
+            if result == 0:
+                rom_base = align_addr_offset(prev_base, size - 1,
+                                             (prev_end - prev_base) & MASK64)
+                if rom_base + size <= this_base:
+                    result = rom_base & ADDRESS_MASK
+            prev_base, prev_end = this_base, this_end
+    if result == 0:
+        result = align_addr_offset(this_base, size - 1,
+                                   (this_end - this_base) & MASK64) & ADDRESS_MASK
+    return result
+
+
+def bus_end(wraparound, records, sdb_addr, msi):
+    """f_sdb_bus_end."""
+    result = 0
+    if not msi:
+        result = sdb_addr + rom_bytes(len(records)) - 1
+    for rec in records:
+        typ = rec_type(rec)
+        last = addr_last(rec)
+        if typ in (DEVICE, BRIDGE) and not msi and last > result:
+            result = last
+        elif typ == MSI and msi and last > result:
+            result = last
+    result = smear(result)
+    if not wraparound:
+        result = ADDRESS_MASK
+    return result
+
+
+def build_rom(records, last, name="WB4-Crossbar-GSI"):
+    """Words of sdb_rom (rom(0) first) for the layout RECORDS and g_bus_end
+    LAST."""
+    used = len(records) + 1
+    words = RECORD_BITS // DATA_WIDTH
+    product = embed_product(GSI, 0xe6a542c9, 3, 0x20120511, name)
+    head = ((0x5344422D << 480) | (used << 464) | (1 << 456)
+            | embed_component(0, last, product, 0) | INTERCONNECT)
+    rom = [0] * ((1 << ceil_log2(used)) * words)
+    for idx, rec in enumerate([head] + list(records)):
+        # All local/temporary types => empty record
+        if rec_type(rec) & 0xf0 == 0xf0:
+            rec |= 0x0f
+        for i in range(words):
+            rom[idx * words + i] = field(rec, RECORD_BITS - 1 - i * DATA_WIDTH,
+                                         RECORD_BITS - (i + 1) * DATA_WIDTH)
+    return rom
+
+
+class Plan(object):
+    """Layout of the crossbar described by DESC (a dict, or the name of a
+    JSON file)."""
+
+    def __init__(self, desc, path=None):
+        if isinstance(desc, str):
+            path = desc
+            with open(desc) as f:
+                desc = json.load(f)
+        self.name = desc.get("name", "sdb")
+        self.wraparound = desc.get("wraparound", True)
+        self.sdb_name = desc.get("sdb_name", "WB4-Crossbar-GSI")
+        self.warnings = []
+        descs = list(desc.get("slaves", [])) + list(desc.get("masters", []))
+        self.names = [d.get("name", "") for d in descs]
+        self.children = {}
+        records = []
+        for i, d in enumerate(descs):
+            rec, child = make_record(d, path)
+            if child is not None:
+                self.children[i] = child
+            records.append(rec)
+
+        layout = desc.get("layout", "auto")
+        if layout == "auto":
+            address = auto_layout(records)
+            self.layout = [relocate(r, address[i]) if rec_type(r) in (DEVICE, BRIDGE, MSI)
+                           else r for i, r in enumerate(records)]
+            self.sdb_addr = address[-1] & ADDRESS_MASK
+        elif layout == "automap":
+            self.layout = automap(records, _int(desc.get("start")))
+            self.sdb_addr = create_rom_addr(self.layout)
+        elif layout == "manual":
+            if "sdb_addr" not in desc:
+                raise SdbError("{}: manual layout without sdb_addr".format(self.name))
+            self.layout = records
+            self.sdb_addr = _int(desc["sdb_addr"])
+        else:
+            raise SdbError("{}: unknown layout {}".format(self.name, layout))
+        self.bus_last = bus_end(self.wraparound, self.layout, self.sdb_addr, False)
+        self.msi_last = bus_end(self.wraparound, self.layout, self.sdb_addr, True)
+
+        types = [rec_type(r) for r in self.layout]
+        self.num_slaves = sum(t in (DEVICE, BRIDGE, EMPTY_DEVICE, EMPTY_BRIDGE) for t in types)
+        msi = sum(t in (MSI, EMPTY_MSI) for t in types)
+        self.num_masters = _int(desc.get("num_masters"), max(1, msi))
+        if msi and msi != self.num_masters:
+            raise SdbError("{}: {} msi records for {} masters".format(
+                self.name, msi, self.num_masters))
+        self._addresses()
+        self._check_ranges()
+        self.rom = build_rom(self.layout, self.bus_last, self.sdb_name)
+
+    def _addresses(self):
+        """f_addresses of xwb_sdb_crossbar."""
+        self.bus_address = []
+        self.bus_mask = []
+        self.msi_address = []
+        self.msi_mask = []
+        self.slave_index = {}
+        for i, rec in enumerate(self.layout):
+            typ = rec_type(rec)
+            first = addr_first(rec)
+            last = addr_last(rec)
+            name = "Wishbone slave device #{} ({})".format(i, self.names[i])
+            if typ < 0x80:
+                if first > last:
+                    raise SdbError("{} addr_first ({:#x}) must precede addr_last ({:#x})"
+                                   .format(name, first, last))
+                if first > ADDRESS_MASK:
+                    raise SdbError("{} addr_first ({:#x}) does not fit in t_wishbone_address"
+                                   .format(name, first))
+                size = (last - first) & MASK64
+                if size & (size + 1):
+                    self.warnings.append(
+                        "{} has an address range that is not a power of 2 minus one ({:#x})"
+                        .format(name, size))
+                # Only the bits of t_wishbone_address are rounded up
+                size = (size & ~ADDRESS_MASK) | smear(size & ADDRESS_MASK)
+                if first & size:
+                    raise SdbError("{} addr_first ({:#x}) is not aligned".format(name, first))
+            if typ in (DEVICE, BRIDGE):
+                self.slave_index[i] = len(self.bus_address)
+                self.bus_address.append(first & ADDRESS_MASK)
+                self.bus_mask.append(((self.bus_last - size) & MASK64) & ADDRESS_MASK)
+            elif typ == MSI:
+                self.msi_address.append(first & ADDRESS_MASK)
+                self.msi_mask.append(((self.msi_last - size) & MASK64) & ADDRESS_MASK)
+            elif typ in (EMPTY_DEVICE, EMPTY_BRIDGE):
+                self.slave_index[i] = len(self.bus_address)
+                self.bus_address.append(ADDRESS_MASK)
+                self.bus_mask.append(0)
+            elif typ == EMPTY_MSI:
+                self.msi_address.append(ADDRESS_MASK)
+                self.msi_mask.append(0)
+        if not self.msi_address:
+            self.msi_address = [ADDRESS_MASK] * self.num_masters
+            self.msi_mask = [0] * self.num_masters
+        # The SDB ROM is the last slave of the bus crossbar
+        self.address = self.bus_address + [self.sdb_addr]
+        self.mask = self.bus_mask + [
+            ((self.bus_last - (rom_bytes(len(self.layout)) - 1)) & MASK64) & ADDRESS_MASK]
+
+    def _check_ranges(self):
+        """Overlaps of the address ranges, as f_ranges_ok of xwb_crossbar
+        (sorted instead of pairwise, for large crossbars)."""
+        names = [self.names[i] for i in sorted(self.slave_index)] + ["SDB ROM"]
+        ranges = []
+        for k, (a, m) in enumerate(zip(self.address, self.mask)):
+            if (m | (~a & ADDRESS_MASK)) == 0:
+                continue  # disconnected slave
+            if a & ~m & ADDRESS_MASK:
+                raise SdbError("Address bits not in mask; slave #{} ({}) [{:#x}/{:#x}]"
+                               .format(k, names[k], a, m))
+            # The bits above the end of the bus are not decoded
+            ranges.append((a, a | (~m & self.bus_last & ADDRESS_MASK), k))
+        ranges.sort()
+        for (a0, l0, k0), (a1, l1, k1) in zip(ranges, ranges[1:]):
+            if a1 <= l0:
+                raise SdbError("Address ranges must be distinct (slaves {} ({}) [{:#x}/{:#x}]"
+                               " & {} ({}) [{:#x}/{:#x}])".format(
+                                   k0, names[k0], self.address[k0], self.mask[k0],
+                                   k1, names[k1], self.address[k1], self.mask[k1]))
+
+    def entries(self):
+        """(index, type, name, first, last) of the layout."""
+        return [(i, rec_type(r), self.names[i], addr_first(r), addr_last(r))
+                for i, r in enumerate(self.layout)]
+
+
+def _ident(s):
+    res = "".join(c if c.isalnum() else "_" for c in s.strip().lower())
+    return res.strip("_") or "unnamed"
+
+
+def _hex(v, bits):
+    return 'x"{:0{}x}"'.format(v, bits // 4)
+
+
+def _array(lines, name, typ, values, bits, comments=None):
+    lines.append("  constant {} : {}({} downto 0) := (".format(name, typ, len(values) - 1))
+    for i, v in enumerate(values):
+        sep = "," if i < len(values) - 1 else ");"
+        comment = "  -- {}".format(comments[i]) if comments and comments[i] else ""
+        lines.append("    {} => {}{}{}".format(i, _hex(v, bits), sep, comment))
+
+
+def _package_body(lines, plan, prefix):
+    p = "c_" + prefix
+    lines.append("  " + "-" * 76)
+    lines.append("  -- {}: {} records, SDB ROM at 0x{:08x}".format(
+        plan.name, len(plan.layout), plan.sdb_addr))
+    lines.append("  " + "-" * 76)
+    lines.append("")
+    lines.append("  -- g_layout and g_sdb_addr of xwb_sdb_crossbar")
+    _array(lines, p + "_layout", "t_sdb_record_array", plan.layout, RECORD_BITS, plan.names)
+    lines.append("  constant {}_sdb_addr : t_wishbone_address := {};".format(
+        p, _hex(plan.sdb_addr, ADDRESS_WIDTH)))
+    lines.append("")
+    lines.append("  -- f_sdb_bus_end")
+    lines.append("  constant {}_bus_end : unsigned(63 downto 0) := {};".format(
+        p, _hex(plan.bus_last, 64)))
+    lines.append("  constant {}_msi_end : unsigned(63 downto 0) := {};".format(
+        p, _hex(plan.msi_last, 64)))
+    lines.append("")
+    lines.append("  -- g_address/g_mask of the bus crossbar (the SDB ROM is the last slave)")
+    names = [plan.names[i] for i in sorted(plan.slave_index)] + ["SDB ROM"]
+    _array(lines, p + "_address", "t_wishbone_address_array", plan.address,
+           ADDRESS_WIDTH, names)
+    _array(lines, p + "_mask", "t_wishbone_address_array", plan.mask, ADDRESS_WIDTH)
+    lines.append("")
+    lines.append("  -- g_address/g_mask of the MSI crossbar")
+    _array(lines, p + "_msi_address", "t_wishbone_address_array", plan.msi_address,
+           ADDRESS_WIDTH)
+    _array(lines, p + "_msi_mask", "t_wishbone_address_array", plan.msi_mask, ADDRESS_WIDTH)
+    lines.append("")
+    lines.append("  -- Index of each slave on master_o")
+    seen = set()
+    for i, k in sorted(plan.slave_index.items()):
+        name = _ident(plan.names[i]) if plan.names[i] else str(k)
+        if name in seen:
+            name += "_{}".format(k)
+        seen.add(name)
+        lines.append("  constant {}_slave_{} : natural := {};".format(p, name, k))
+    lines.append("")
+    lines.append("  -- Content of sdb_rom")
+    _array(lines, p + "_sdb_rom", "t_wishbone_data_array", plan.rom, DATA_WIDTH)
+    lines.append("")
+
+
+def write_package(plan, fname, package=None, source=None):
+    """Write the VHDL package of PLAN (and of the crossbars behind its
+    bridges)."""
+    package = package or "{}_sdb_pkg".format(_ident(plan.name))
+    lines = [
+        "-- Generated by {}{}; do not edit".format(
+            PROG, " from " + os.path.basename(source) if source else ""),
+        "",
+        "library ieee;",
+        "use ieee.std_logic_1164.all;",
+        "use ieee.numeric_std.all;",
+        "",
+        "use work.wishbone_pkg.all;",
+        "",
+        "package {} is".format(package),
+        "",
+    ]
+
+    def add(p):
+        for child in p.children.values():
+            add(child)
+        _package_body(lines, p, _ident(p.name))
+
+    add(plan)
+    lines.append("end package {};".format(package))
+    with open(fname, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+_TYPE_NAMES = dict((v, k) for k, v in TYPES.items())
+_TYPE_NAMES.update({EMPTY_DEVICE: "empty", EMPTY_BRIDGE: "empty", EMPTY_MSI: "empty"})
+
+
+def print_map(plan, indent=""):
+    print("{}{}: SDB ROM at 0x{:08x}, bus end 0x{:08x}".format(
+        indent, plan.name, plan.sdb_addr, plan.bus_last & ADDRESS_MASK))
+    for i, typ, name, first, last in plan.entries():
+        if typ in (DEVICE, BRIDGE, MSI):
+            print("{}  {:4} {:<8} 0x{:08x}-0x{:08x} {}".format(
+                indent, i, _TYPE_NAMES[typ], first, last, name))
+        else:
+            print("{}  {:4} {:<8} {:>21} {}".format(
+                indent, i, _TYPE_NAMES.get(typ, "{:#x}".format(typ)), "", name))
+        if i in plan.children:
+            print_map(plan.children[i], indent + "    ")
+
+
+def _warnings(plan):
+    for child in plan.children.values():
+        _warnings(child)
+    for w in plan.warnings:
+        print("{}: warning: {}".format(PROG, w), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog=PROG, description="Plan the SDB layout of an xwb_sdb_crossbar")
+    sub = parser.add_subparsers(dest="cmd")
+    sub.required = True
+
+    p = sub.add_parser("map", help="print the address map")
+    p.add_argument("desc", help="JSON description of the crossbar")
+
+    p = sub.add_parser("package", help="write the VHDL package of the layout")
+    p.add_argument("desc", help="JSON description of the crossbar")
+    p.add_argument("-o", "--output", help="output file (default is <package>.vhd)")
+    p.add_argument("-p", "--package", help="package name (default is <name>_sdb_pkg)")
+
+    args = parser.parse_args()
+    try:
+        plan = Plan(args.desc)
+    except (SdbError, ValueError, KeyError, OSError) as e:
+        print("{}: {}: {}".format(PROG, args.desc, e), file=sys.stderr)
+        return 1
+    _warnings(plan)
+    if args.cmd == "map":
+        print_map(plan)
+    else:
+        package = args.package or "{}_sdb_pkg".format(_ident(plan.name))
+        try:
+            write_package(plan, args.output or package + ".vhd", package, args.desc)
+        except OSError as e:
+            print("{}: {}".format(PROG, e), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# SECDED model of secded_32b_pkg (modules/radtol/secded_32b_pkg.vhd)
+#
+# Computes the ECC bits (f_calc_ecc), syndromes and corrections (f_fix_error)
+# of secded_ecc for whole memory images, to classify the words of memory dumps
+# taken during radiation tests, scrub them, or generate protected images.
+#
+# The check bits are the parity of the data masked by syndrome_masks; they are
+# computed with two lookups per word in tables indexed by 16-bit halves.  The
+# syndromes are then classified with tables of the 128 syndrome values:
+#  - 0: no error,
+#  - one of the 32 data columns (all of weight 3) or of the 7 ECC bits:
+#    single error, corrected,
+#  - even weight: double error, detected (double_error_p_o),
+#  - other odd weights: more than two errors, that secded_ecc takes for a
+#    single error (f_ecc_one_error) and miscorrects.
+#
+# Images are 39-bit words, d_ram_i(38 downto 0), stored either as little endian
+# uint64 (ECC in bits 38..32) or as two files: uint32 data and uint8 ECC.
+# They are memory mapped and processed by chunks.
+
+import argparse
+import mmap
+import os
+import sys
+
+import numpy as np
+
+PROG = os.path.basename(__file__)
+
+CHUNK = 1 << 20
+
+SYNDROME_MASKS = (
+    "11000001010010000100000011111111",
+    "00100001001001001111111110010000",
+    "01101100111111110000100000001000",
+    "11111111000000011010010001000100",
+    "00010110111100001001001010100110",
+    "00010000000111110111000101100001",
+    "10001010100000100000111100011011")
+
+# Classes of syndromes
+CLEAN = 0
+SINGLE = 1
+DOUBLE = 2
+MULTI = 3
+CLASSES = ("clean", "single", "double", "multi")
+
+
+def _build_tables():
+    masks = [int(m, 2) for m in SYNDROME_MASKS]
+    # Syndrome of an error on each data bit
+    columns = [sum(1 << k for k in range(7) if masks[k] >> i & 1) for i in range(32)]
+
+    # f_calc_ecc by 16-bit halves: ecc = lo[d & 0xffff] ^ hi[d >> 16]
+    ecc = np.zeros((2, 1 << 16), dtype=np.uint8)
+    for h in range(2):
+        for b in range(16):
+            half = ecc[h, :1 << b]
+            ecc[h, 1 << b:2 << b] = half ^ columns[h * 16 + b]
+
+    # f_fix_error: data bits whose ECC bits are all set in the syndrome
+    fix = np.zeros(128, dtype=np.uint32)
+    for s in range(128):
+        fix[s] = sum(1 << i for i, c in enumerate(columns) if c & s == c)
+
+    # Error class and position of single errors (0-31 data, 32-38 ECC)
+    cls = np.zeros(128, dtype=np.uint8)
+    bit = np.full(128, -1, dtype=np.int8)
+    for s in range(1, 128):
+        cls[s] = MULTI if bin(s).count("1") & 1 else DOUBLE
+    for i, c in enumerate(columns):
+        cls[c] = SINGLE
+        bit[c] = i
+    for k in range(7):
+        cls[1 << k] = SINGLE
+        bit[1 << k] = 32 + k
+    return ecc, fix, cls, bit
+
+
+ECC_TABLES, FIX_TABLE, CLASS_TABLE, BIT_TABLE = _build_tables()
+
+
+def calc_ecc(data):
+    """f_calc_ecc for an array of uint32 data words."""
+    data = np.asarray(data, dtype=np.uint32)
+    res = ECC_TABLES[0][data & 0xffff]
+    res ^= ECC_TABLES[1][data >> 16]
+    return res
+
+
+def syndrome(data, ecc):
+    """Syndromes of the words (DATA, ECC)."""
+    res = calc_ecc(data)
+    res ^= np.asarray(ecc).astype(np.uint8) & 0x7f
+    return res
+
+
+def fix_error(syn, ecc, data):
+    """f_fix_error: return the corrected (ecc, data) arrays.  Only meaningful
+    for syndromes with an odd weight, as in secded_ecc."""
+    syn = np.asarray(syn, dtype=np.uint8)
+    ecc = np.asarray(ecc).astype(np.uint8) & 0x7f
+    fix = FIX_TABLE[syn]
+    return np.where(fix == 0, ecc ^ syn, ecc), np.asarray(data, dtype=np.uint32) ^ fix
+
+
+def _map(fname, dtype):
+    f = open(fname, "rb")
+    if os.fstat(f.fileno()).st_size == 0:
+        f.close()
+        return np.zeros(0, dtype=dtype)
+    with f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    size = np.dtype(dtype).itemsize
+    return np.frombuffer(buf, dtype=dtype, count=len(buf) // size)
+
+
+class Image(object):
+    """A memory image: uint64 words in FNAME, or data words in FNAME and ECC
+    bytes in ECC_FNAME."""
+
+    def __init__(self, fname, ecc_fname=None):
+        self.fname = fname
+        if ecc_fname is None:
+            words = _map(fname, "<u4")
+            words = words[:len(words) // 2 * 2]
+            self.data = words[0::2]
+            self.ecc = words[1::2]
+        else:
+            self.data = _map(fname, "<u4")
+            self.ecc = _map(ecc_fname, np.uint8)
+            if len(self.ecc) != len(self.data):
+                raise ValueError("{}: {} ECC bytes for {} data words".format(
+                    ecc_fname, len(self.ecc), len(self.data)))
+
+    def __len__(self):
+        return len(self.data)
+
+    def chunks(self, chunk=CHUNK):
+        """Yield (address, data, ecc) by chunks of CHUNK words."""
+        for i in range(0, len(self.data), chunk):
+            yield i, self.data[i:i + chunk], self.ecc[i:i + chunk]
+
+
+def write_words(f, data, ecc, ecc_file=None):
+    """Write words as uint64 to F, or data to F and ECC to ECC_FILE."""
+    if ecc_file is None:
+        words = np.empty((len(data), 2), dtype="<u4")
+        words[:, 0] = data
+        words[:, 1] = np.asarray(ecc) & 0x7f
+        words.tofile(f)
+    else:
+        np.asarray(data, dtype="<u4").tofile(f)
+        np.asarray(ecc, dtype=np.uint8).tofile(ecc_file)
+
+
+class DumpErrors(object):
+    """Errors of one dump: addresses, syndromes and classes of the words with
+    a non-zero syndrome."""
+
+    def __init__(self, image, chunk=CHUNK):
+        self.name = image.fname
+        self.words = len(image)
+        addr, syns = [], []
+        for base, data, ecc in image.chunks(chunk):
+            syn = syndrome(data, ecc)
+            idx = np.flatnonzero(syn)
+            addr.append(idx + base)
+            syns.append(syn[idx])
+        self.address = np.concatenate(addr) if addr else np.zeros(0, dtype=np.int64)
+        self.syndrome = np.concatenate(syns) if syns else np.zeros(0, dtype=np.uint8)
+        self.cls = CLASS_TABLE[self.syndrome]
+        self.bit = BIT_TABLE[self.syndrome]
+
+    def counts(self):
+        return np.bincount(self.cls, minlength=len(CLASSES))
+
+
+class AddressStats(object):
+    """Per-address statistics over several dumps of the same memory."""
+
+    def __init__(self, dumps):
+        self.dumps = len(dumps)
+        addr = np.concatenate([d.address for d in dumps])
+        cls = np.concatenate([d.cls for d in dumps])
+        bit = np.concatenate([d.bit for d in dumps])
+        self.address, inv = np.unique(addr, return_inverse=True)
+        n = len(self.address)
+        self.counts = np.zeros((n, len(CLASSES)), dtype=np.int64)
+        np.add.at(self.counts, (inv, cls), 1)
+        # Bits seen flipped by single errors
+        self.bits = np.zeros(n, dtype=np.uint64)
+        single = bit >= 0
+        np.bitwise_or.at(self.bits, inv[single],
+                         np.left_shift(np.uint64(1), bit[single].astype(np.uint64)))
+
+    def write_csv(self, f):
+        f.write("address,dumps,{},bits\n".format(",".join(CLASSES[1:])))
+        for a, c, b in zip(self.address, self.counts, self.bits):
+            f.write("0x{:x},{},{},0x{:010x}\n".format(
+                a, c.sum(), ",".join(str(v) for v in c[1:]), int(b)))
+
+
+def scrub(image, out, ecc_out=None, chunk=CHUNK):
+    """Write IMAGE to OUT (and ECC_OUT) with the corrections of secded_ecc:
+    words with an odd syndrome are fixed, double errors are left as is.
+    Return the error counts by class."""
+    counts = np.zeros(len(CLASSES), dtype=np.int64)
+    for _, data, ecc in image.chunks(chunk):
+        syn = syndrome(data, ecc)
+        data = data.astype(np.uint32)
+        ecc = ecc.astype(np.uint8) & 0x7f
+        idx = np.flatnonzero(syn)
+        if len(idx):
+            cls = CLASS_TABLE[syn[idx]]
+            counts += np.bincount(cls, minlength=len(CLASSES))
+            idx = idx[cls != DOUBLE]
+            ecc[idx], data[idx] = fix_error(syn[idx], ecc[idx], data[idx])
+        write_words(out, data, ecc, ecc_out)
+    counts[CLEAN] = len(image) - counts[1:].sum()
+    return counts
+
+
+def encode(data_fname, out, ecc_out=None, chunk=CHUNK):
+    """Write the data words (uint32) of DATA_FNAME with their ECC."""
+    data = _map(data_fname, "<u4")
+    for i in range(0, len(data), chunk):
+        d = data[i:i + chunk]
+        write_words(out, d, calc_ecc(d), ecc_out)
+
+
+def _report(dumps, top):
+    print("{:<32} {:>12} {}".format("dump", "words", " ".join(
+        "{:>8}".format(c) for c in CLASSES[1:])))
+    for d in dumps:
+        print("{:<32} {:>12} {}".format(d.name, d.words, " ".join(
+            "{:>8}".format(c) for c in d.counts()[1:])))
+
+    bits = np.concatenate([d.bit for d in dumps])
+    hist = np.bincount(bits[bits >= 0], minlength=39)
+    if hist.any():
+        print("single errors by bit (32-38: ECC bits):")
+        for i in np.flatnonzero(hist):
+            print("  bit {:2}: {}".format(i, hist[i]))
+
+    stats = AddressStats(dumps)
+    print("{} addresses with errors".format(len(stats.address)))
+    if len(dumps) > 1 and len(stats.address):
+        n = stats.counts.sum(axis=1)
+        order = np.argsort(-n, kind="stable")[:top]
+        print("most affected addresses:")
+        for i in order:
+            if n[i] < 2:
+                break
+            print("  0x{:x}: in {} of {} dumps ({})".format(
+                stats.address[i], n[i], len(dumps), ", ".join(
+                    "{} {}".format(c, name) for c, name in zip(stats.counts[i, 1:], CLASSES[1:])
+                    if c)))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="SECDED (secded_32b_pkg) analysis of memory images")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("check", help="classify the words of dumps and report the errors")
+    p.add_argument("dumps", nargs="+", help="uint64 images (uint32 data with --ecc-suffix)")
+    p.add_argument("--ecc-suffix",
+                   help="ECC bytes are in separate files, named as the dumps plus this suffix")
+    p.add_argument("-t", "--top", type=int, default=20,
+                   help="number of addresses shown (default is 20)")
+    p.add_argument("-o", "--output", help="write per-address statistics to this CSV file")
+    p = sub.add_parser("scrub", help="write a corrected image")
+    p.add_argument("dump")
+    p.add_argument("output")
+    p.add_argument("--ecc-suffix",
+                   help="ECC bytes are in separate files, named as the images plus this suffix")
+    p = sub.add_parser("encode", help="add the ECC to data words (uint32)")
+    p.add_argument("data")
+    p.add_argument("output")
+    p.add_argument("--ecc-suffix", help="write the ECC bytes to a separate file")
+    args = parser.parse_args()
+
+    def ecc_name(fname):
+        return fname + args.ecc_suffix if args.ecc_suffix else None
+
+    if args.command == "check":
+        dumps = [DumpErrors(Image(d, ecc_name(d))) for d in args.dumps]
+        stats = _report(dumps, args.top)
+        if args.output:
+            with open(args.output, "w") as f:
+                stats.write_csv(f)
+    elif args.command in ("scrub", "encode"):
+        ecc_out = open(ecc_name(args.output), "wb") if args.ecc_suffix else None
+        try:
+            with open(args.output, "wb") as out:
+                if args.command == "scrub":
+                    counts = scrub(Image(args.dump, ecc_name(args.dump)), out, ecc_out)
+                    print(", ".join("{} {}".format(c, name)
+                                    for c, name in zip(counts, CLASSES)))
+                else:
+                    encode(args.data, out, ecc_out)
+        finally:
+            if ecc_out:
+                ecc_out.close()
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,776 @@
+#!/usr/bin/env python3
+# Transaction-level performance model of pipelined Wishbone buses
+#
+# The model predicts the throughput of a topology of masters, crossbars,
+# bridges and slaves from a trace of the transactions of the masters.  It
+# works on transactions, not on clock cycles: each transaction is followed
+# along its path with the timing rules of the RTL, all times being clock edges
+# (in ps) of the clock domain of each component:
+#  - a master presents a request (STB) when its trace says so, at most one per
+#    cycle, and holds it while STALL is high.  It may limit the number of
+#    requests waiting for ACK/ERR ("outstanding"), and keeps CYC high while it
+#    has requests pending or outstanding ("burst" limits the requests in a
+#    cycle),
+#  - xwb_crossbar connects a master to a slave for a whole cycle (while CYC is
+#    high): the other masters that address the slave wait for CYC to fall.  The
+#    arbiter gives the slave to the lowest numbered master ("priority", as
+#    xwb_crossbar does) or to the next master after the last one granted
+#    ("round-robin", as gc_rr_arbiter).  With "registered", the grant takes
+#    one more cycle (g_registered).  Addresses that match no slave are
+#    answered with ERR one cycle later by the error slave of the crossbar,
+#  - xwb_clock_crossing has FIFOs of "size" entries in each direction, and
+#    accepts up to "size" outstanding requests; a request and its ACK go
+#    through "sync" synchronizer stages and a register of the other domain,
+#  - xwb_register_link registers the request and the ACK, and its CLASSIC
+#    adapters allow one request at a time,
+#  - wb_async_bridge synchronizes the strobes of the asynchronous bus with
+#    gc_sync_ffs (3 cycles) and registers the request: one at a time,
+#  - wb_axi4lite_bridge takes two cycles to issue a request (IDLE, ISSUE), one
+#    to return the response and one more to go back to IDLE; it ignores ERR
+#    and answers SLVERR after a timeout of 256 cycles,
+#  - a slave accepts a request every "interval" cycles (it stalls otherwise)
+#    and acknowledges it "latency" cycles later; a "classic" slave stalls
+#    until the ACK of the previous request.
+# The timing of a node may be overridden with "fwd" and "ret" (cycles of the
+# request and of the response through the node), "interval", "outstanding",
+# "gap" (cycles between a response and the next request) and "depth" (requests
+# the node stores while the downstream stalls); a node of type "bridge" only
+# has these parameters.
+#
+# The topology is a JSON file, a tree from the masters to the slaves:
+#   {"clocks": {"sys": 62.5, "ref": 125},            (MHz; default is 100)
+#    "masters": [{"name": "cpu", "clock": "sys", "outstanding": 1,
+#                 "next": "xbar"}, ...],
+#    "nodes": {"xbar": {"type": "crossbar", "arbiter": "round-robin",
+#                       "slaves": [{"name": "ram", "address": "0x0",
+#                                   "mask": "0xffff0000", "next": "ram"}]},
+#              "ram": {"type": "slave", "latency": 2}, ...}}
+# Nodes get the clock of the node or master before them, except the clock
+# crossings and async bridges (their "clock" is the one of their Wishbone
+# master side).  The inputs of a crossbar are numbered in the order of the
+# masters and nodes that point to it, unless it has a "masters" list.
+#
+# A trace has one transaction per line, in cycles of the clock of its master:
+#   <cycle> <master> r|w <address>
+# Masters may also have a "traffic" description to generate a trace:
+#   {"count": 100000, "load": 0.5, "burst": 8, "reads": 0.5,
+#    "ranges": [{"base": "0x0", "size": "0x10000", "weight": 1}]}
+# (requests in bursts of consecutive words, "load" requests per cycle on
+# average).
+#
+# The report gives, for each master and slave, the transactions, the
+# bandwidth (32-bit data) over the whole trace, the latency distribution (from
+# STB to ACK/ERR) and the wait before STB is accepted, and the nodes and
+# crossbar ports where requests spent the most time stalled.
+#
+# Examples:
+#   wb_perf.py replay topology.json trace.txt
+#   wb_perf.py replay topology.json --json report.json
+#   wb_perf.py generate topology.json -o trace.txt
+
+import argparse
+import heapq
+import json
+import os
+import sys
+from collections import deque
+
+import numpy as np
+
+PROG = os.path.basename(__file__)
+
+DATA_BYTES = 4  # c_wishbone_data_width / 8
+DEFAULT_MHZ = 100.0
+
+# Timing of the nodes, in cycles
+NODE_TYPES = {
+    "bridge": {},
+    "register_link": {"fwd": 1, "ret": 1, "outstanding": 1},
+    "clock_crossing": {"size": 16, "sync": 2},
+    "async_bridge": {"sync": 3, "ret": 1, "outstanding": 1},
+    "axi4lite_bridge": {"fwd": 2, "ret": 1, "gap": 1, "outstanding": 1, "timeout": 256},
+    "slave": {"latency": 1, "interval": 1},
+}
+
+# Node with the clock of its Wishbone master side
+CROSSING_TYPES = ("clock_crossing", "async_bridge")
+
+
+class PerfError(Exception):
+    pass
+
+
+def _int(v):
+    return int(v, 0) if isinstance(v, str) else int(v)
+
+
+def _edge(t, period):
+    """First clock edge at or after T."""
+    return -(-t // period) * period
+
+
+class Node(object):
+    """A bridge or a slave, on the path of the requests."""
+
+    __slots__ = ("name", "kind", "clock", "next", "cross", "is_slave", "params", "p_in",
+                 "p_out", "fwd", "ret", "interval", "gap", "latency", "write_latency",
+                 "timeout", "outstanding", "depth", "last_acc", "last_resp", "resps", "downs",
+                 "count", "stall", "stalled")
+
+    def __init__(self, name, desc):
+        self.name = name
+        self.kind = desc.get("type", "slave")
+        if self.kind not in NODE_TYPES:
+            raise PerfError("node {}: unknown type '{}'".format(name, self.kind))
+        p = dict(NODE_TYPES[self.kind])
+        p.update(desc)
+        self.clock = desc.get("clock")
+        self.next = desc.get("next")
+        self.cross = self.kind in CROSSING_TYPES
+        self.is_slave = self.kind == "slave"
+        if self.is_slave:
+            if p.get("classic"):
+                p.setdefault("outstanding", 1)
+            self.next = None
+        elif not self.next:
+            raise PerfError("node {}: no next node".format(name))
+        if self.kind == "clock_crossing":
+            p.setdefault("outstanding", p["size"])
+            p.setdefault("depth", p["size"])
+            p.setdefault("fwd", p["sync"] + 1)
+            p.setdefault("ret", p["sync"] + 1)
+        elif self.kind == "async_bridge":
+            p.setdefault("fwd", p["sync"] + 1)
+        self.params = p
+        # Set by Model.resolve
+        self.p_in = self.p_out = None
+        self.outstanding = self.depth = None
+        self.reset()
+
+    def setup(self, p_in, p_out):
+        """Convert the cycles to ps, for an upstream clock period P_IN and a
+        downstream one P_OUT."""
+        p = self.params
+        self.p_in, self.p_out = p_in, p_out
+        self.fwd = _int(p.get("fwd", 0)) * p_out
+        # The response is in the clock domain of the upstream side
+        self.ret = _int(p.get("ret", 0)) * p_in
+        self.interval = _int(p.get("interval", 1)) * p_in
+        self.gap = _int(p.get("gap", 0)) * p_in
+        self.latency = _int(p.get("latency", 1)) * p_in
+        self.write_latency = _int(p.get("write_latency", p.get("latency", 1))) * p_in
+        self.timeout = _int(p.get("timeout", 0)) * p_in
+        self.outstanding = _int(p["outstanding"]) if p.get("outstanding") else None
+        self.depth = _int(p["depth"]) if p.get("depth") else None
+        self.reset()
+
+    def reset(self):
+        self.last_acc = -(1 << 62)
+        self.last_resp = -(1 << 62)
+        # Response times of the outstanding requests
+        self.resps = deque(maxlen=self.outstanding) if self.outstanding else None
+        # Times the stored requests were accepted downstream
+        self.downs = deque(maxlen=self.depth) if self.depth else None
+        self.count = 0
+        self.stall = 0
+        self.stalled = 0
+
+
+class Port(object):
+    """Slave port of a crossbar, with its arbiter."""
+
+    def __init__(self, xbar, name, address=None, mask=None, next=None):
+        self.xbar = xbar
+        self.name = name
+        self.address = address
+        self.mask = mask
+        self.next = next
+        self.reset()
+
+    def reset(self):
+        self.holder = None
+        self.waiters = []
+        self.last = -1
+        self.grants = 0
+        self.stalled = 0
+        self.wait = 0
+        self.max_wait = 0
+        self.busy = 0
+        self.granted_at = 0
+
+
+class Crossbar(object):
+    def __init__(self, name, desc):
+        self.name = name
+        self.clock = desc.get("clock")
+        self.registered = bool(desc.get("registered", False))
+        self.arbiter = desc.get("arbiter", "priority")
+        if self.arbiter not in ("priority", "round-robin"):
+            raise PerfError("crossbar {}: unknown arbiter '{}'".format(name, self.arbiter))
+        self.inputs = list(desc.get("masters", []))
+        self.ports = []
+        for i, s in enumerate(desc.get("slaves", [])):
+            if "next" not in s:
+                raise PerfError("crossbar {}: slave #{} has no next node".format(name, i))
+            self.ports.append(Port(self, s.get("name", s["next"]),
+                                   _int(s["address"]), _int(s["mask"]), s["next"]))
+        self.error_port = Port(self, "error")
+        error = Node(name + "/error", {"type": "slave", "latency": 1})
+        self.error_port.next = error
+        self.period = None
+
+    def input(self, upstream):
+        if upstream not in self.inputs:
+            self.inputs.append(upstream)
+        return self.inputs.index(upstream)
+
+
+class Path(object):
+    """Nodes from a master to a slave, and crossbar ports on the way as
+    (number of nodes before the crossbar, port, input of the crossbar)."""
+
+    def __init__(self, nodes, ports, error):
+        self.nodes = nodes
+        self.ports = ports
+        self.error = error
+        # Segments of the first request of a cycle, and of the others
+        self.first = list(ports) + [(len(nodes), None, None)]
+        self.others = [(len(nodes), None, None)]
+
+
+class Master(object):
+    def __init__(self, desc, period):
+        self.name = desc["name"]
+        self.next = desc.get("next")
+        if not self.next:
+            raise PerfError("master {}: no next node".format(self.name))
+        self.period = period
+        o = desc.get("outstanding")
+        self.outstanding = _int(o) if o else None
+        b = desc.get("burst")
+        self.burst = _int(b) if b else None
+        self.traffic = desc.get("traffic")
+        self.paths = []
+        self.load([], [], [])
+
+    def load(self, cycles, we, address):
+        """Set the trace (cycles of the master clock, write flags,
+        addresses)."""
+        self.ready = np.asarray(cycles, dtype=np.int64) * self.period
+        self.we = np.asarray(we, dtype=bool)
+        self.address = np.asarray(address, dtype=np.int64)
+        n = len(self.ready)
+        self.path_id = np.zeros(n, dtype=np.int64)
+        self.issue = np.zeros(n, dtype=np.int64)
+        self.resp = np.zeros(n, dtype=np.int64)
+        self.err = np.zeros(n, dtype=bool)
+
+    def reset(self):
+        self.pos = 0
+        self.free = -(1 << 62)
+        self.last_resp = -(1 << 62)
+        self.resps = deque(maxlen=self.outstanding) if self.outstanding else None
+        # Python lists are faster than arrays for the replay
+        n = len(self.ready)
+        self._ready = self.ready.tolist()
+        self._we = self.we.tolist()
+        self._pid = self.path_id.tolist()
+        self._issue = [0] * n
+        self._resp = [0] * n
+        self._err = [False] * n
+
+    def done(self):
+        self.issue = np.array(self._issue, dtype=np.int64)
+        self.resp = np.array(self._resp, dtype=np.int64)
+        self.err = np.array(self._err, dtype=bool)
+
+
+class Model(object):
+    def __init__(self, desc):
+        if isinstance(desc, str):
+            with open(desc) as f:
+                desc = json.load(f)
+        clocks = desc.get("clocks") or {"sys": DEFAULT_MHZ}
+        self.periods = dict((k, int(round(1e6 / float(v)))) for k, v in clocks.items())
+        self.default_clock = "sys" if "sys" in self.periods else sorted(self.periods)[0]
+        self.nodes = {}
+        for name, d in desc.get("nodes", {}).items():
+            if d.get("type") == "crossbar":
+                self.nodes[name] = Crossbar(name, d)
+            else:
+                self.nodes[name] = Node(name, d)
+        self.masters = []
+        for d in desc.get("masters", []):
+            self.masters.append(Master(d, self._period(d.get("clock"), "master " + d["name"])))
+        names = [m.name for m in self.masters]
+        if len(set(names)) != len(names):
+            raise PerfError("duplicate master names")
+        # Number the inputs of the crossbars in the declaration order
+        for up in self.masters + list(self.nodes.values()):
+            nxt = [up.next] if not isinstance(up, Crossbar) else [p.next for p in up.ports]
+            for n in nxt:
+                if isinstance(self.nodes.get(n), Crossbar):
+                    self.nodes[n].input(up.name)
+
+    def _period(self, clock, what):
+        clock = clock or self.default_clock
+        if clock not in self.periods:
+            raise PerfError("{}: unknown clock '{}'".format(what, clock))
+        return self.periods[clock]
+
+    def _node(self, name, what):
+        if name not in self.nodes:
+            raise PerfError("unknown node '{}' after {}".format(name, what))
+        return self.nodes[name]
+
+    def _set_period(self, obj, p_in, p_out):
+        if obj.p_in is None:
+            obj.setup(p_in, p_out)
+        elif (obj.p_in, obj.p_out) != (p_in, p_out):
+            raise PerfError("node {} is in several clock domains".format(obj.name))
+
+    def resolve(self, master):
+        """Paths of the transactions of MASTER (decoded on all the
+        transactions at once)."""
+        master.paths = []
+        master.path_id = np.zeros(len(master.address), dtype=np.int64)
+
+        def walk(name, up, period, idx, nodes, ports, depth):
+            if depth > len(self.nodes) + 1:
+                raise PerfError("master {}: loop in the topology".format(master.name))
+            obj = self._node(name, up)
+            if isinstance(obj, Crossbar):
+                if obj.period is None:
+                    obj.period = self._period(obj.clock, "crossbar " + name) if obj.clock else period
+                if obj.period != period:
+                    raise PerfError("crossbar {}: inputs in several clock domains".format(name))
+                inp = obj.input(up)
+                sel = np.full(len(idx), -1, dtype=np.int64)
+                adr = master.address[idx]
+                for i in reversed(range(len(obj.ports))):
+                    p = obj.ports[i]
+                    sel[(adr & p.mask) == p.address] = i
+                for i, p in enumerate(obj.ports):
+                    sub = idx[sel == i]
+                    if len(sub):
+                        walk(p.next, name, period, sub, nodes, ports + [(len(nodes), p, inp)],
+                             depth + 1)
+                sub = idx[sel < 0]
+                if len(sub):
+                    err = obj.error_port.next
+                    self._set_period(err, period, period)
+                    self._add_path(master, sub, nodes + [err],
+                                   ports + [(len(nodes), obj.error_port, inp)], True)
+                return
+            p_out = period
+            if obj.cross:
+                p_out = self._period(obj.clock, "node " + name)
+            elif obj.clock and self._period(obj.clock, "node " + name) != period:
+                raise PerfError("node {}: clock '{}' without a clock crossing".format(
+                    name, obj.clock))
+            self._set_period(obj, period, p_out)
+            if obj.is_slave:
+                self._add_path(master, idx, nodes + [obj], ports, False)
+            else:
+                walk(obj.next, name, p_out, idx, nodes + [obj], ports, depth + 1)
+
+        walk(master.next, master.name, master.period,
+             np.arange(len(master.address), dtype=np.int64), [], [], 0)
+
+    def _add_path(self, master, idx, nodes, ports, error):
+        master.path_id[idx] = len(master.paths)
+        master.paths.append(Path(nodes, ports, error))
+
+    def ports(self):
+        res = []
+        for obj in self.nodes.values():
+            if isinstance(obj, Crossbar):
+                res.extend(obj.ports + [obj.error_port])
+        return res
+
+    def stages(self):
+        """Nodes on the paths, including the error slaves."""
+        res = [obj for obj in self.nodes.values() if isinstance(obj, Node)]
+        res += [obj.error_port.next for obj in self.nodes.values() if isinstance(obj, Crossbar)]
+        return res
+
+    def load_trace(self, trace):
+        """Load TRACE, a list of (cycle, master name, write, address)."""
+        by_master = dict((m.name, ([], [], [])) for m in self.masters)
+        for cycle, name, we, address in trace:
+            if name not in by_master:
+                raise PerfError("unknown master '{}' in the trace".format(name))
+            c, w, a = by_master[name]
+            c.append(cycle)
+            w.append(we)
+            a.append(address)
+        for m in self.masters:
+            c, w, a = by_master[m.name]
+            order = np.argsort(np.asarray(c, dtype=np.int64), kind="stable")
+            m.load(np.asarray(c, dtype=np.int64)[order], np.asarray(w, dtype=bool)[order],
+                   np.asarray(a, dtype=np.int64)[order])
+
+    def run(self):
+        """Replay the loaded trace."""
+        for obj in self.nodes.values():
+            if isinstance(obj, Crossbar):
+                obj.period = None
+                for p in obj.ports + [obj.error_port]:
+                    p.reset()
+                obj.error_port.next.p_in = None
+            else:
+                obj.p_in = None
+        for m in self.masters:
+            self.resolve(m)
+            m.reset()
+        for st in self.stages():
+            st.reset()
+
+        # Events: (time, order, sequence, kind, object, argument).  At the
+        # same time, releases come before the requests, then arbitration.
+        events = []
+        seq = [0]
+
+        def push(t, order, kind, obj, arg=None):
+            seq[0] += 1
+            heapq.heappush(events, (t, order, seq[0], kind, obj, arg))
+
+        def step(m, gen, value):
+            try:
+                port, t, inp = gen.send(value)
+            except StopIteration as e:
+                for port, t in e.value:
+                    push(t, 0, "release", port)
+                if m.pos < len(m.ready):
+                    push(max(m._ready[m.pos], m.free), 1, "start", m)
+                return
+            push(_edge(t, port.xbar.period), 1, "request", port, (t, inp, m, gen))
+
+        for m in self.masters:
+            if len(m.ready):
+                push(m._ready[0], 1, "start", m)
+        while events:
+            now, _, _, kind, obj, arg = heapq.heappop(events)
+            if kind == "start":
+                gen = self._cycle(obj)
+                step(obj, gen, None)
+            elif kind == "request":
+                obj.waiters.append(arg)
+                push(now, 2, "arbitrate", obj)
+            elif kind == "release":
+                obj.holder = None
+                obj.busy += now - obj.granted_at
+                if obj.waiters:
+                    push(now, 2, "arbitrate", obj)
+            elif kind == "arbitrate":
+                if obj.holder is not None or not obj.waiters:
+                    continue
+                n = len(obj.xbar.inputs)
+                if obj.xbar.arbiter == "round-robin":
+                    k = min(range(len(obj.waiters)),
+                            key=lambda i: (obj.waiters[i][1] - obj.last - 1) % n)
+                else:
+                    k = min(range(len(obj.waiters)), key=lambda i: obj.waiters[i][1])
+                t, inp, m, gen = obj.waiters.pop(k)
+                grant = now + (obj.xbar.period if obj.xbar.registered else 0)
+                obj.holder = m
+                obj.last = inp
+                obj.grants += 1
+                if now > t:
+                    # Not granted on arrival: held by another master
+                    obj.stalled += 1
+                obj.granted_at = grant
+                obj.wait += grant - t
+                obj.max_wait = max(obj.max_wait, grant - t)
+                step(m, gen, grant)
+        for m in self.masters:
+            m.done()
+
+    def _cycle(self, m):
+        """Generator of a Wishbone cycle (CYC high) of master M, from its next
+        transaction: yields (port, arrival time, crossbar input) for each
+        crossbar port on the path and gets the grant time, and returns the
+        release times of the ports."""
+        j = m.pos
+        ready = m._ready
+        pid = m._pid
+        we = m._we
+        n_trans = len(ready)
+        path = m.paths[pid[j]]
+        nodes = path.nodes
+        error = path.error
+        last = len(nodes) - 1
+        pm = m.period
+        burst = m.burst
+        mresps = m.resps
+        accs = [0] * len(nodes)
+        # The trace and the responses are on edges of the master clock
+        start = max(ready[j], m.free)
+        arrivals = []
+        segments = path.first
+        count = 0
+        want = start
+        while True:
+            if mresps is not None and len(mresps) == m.outstanding and mresps[0] > want:
+                want = mresps[0]
+            pres = want
+            # Request, through the nodes (and the crossbar ports, for the
+            # first request of the cycle)
+            lo = 0
+            up = None
+            for hi, port, inp in segments:
+                for i in range(lo, hi):
+                    st = nodes[i]
+                    acc = pres
+                    t = st.last_acc + st.interval
+                    if t > acc:
+                        acc = t
+                    q = st.resps
+                    if q is not None and len(q) == st.outstanding and q[0] + st.gap > acc:
+                        acc = _edge(q[0] + st.gap, st.p_in)
+                    q = st.downs
+                    if q is not None and len(q) == st.depth and q[0] > acc:
+                        acc = q[0]
+                    if up is not None and up.downs is not None:
+                        up.downs.append(acc)
+                    if acc > pres:
+                        st.stall += acc - pres
+                        st.stalled += 1
+                    st.last_acc = acc
+                    accs[i] = acc
+                    if st.cross:
+                        pres = _edge(acc + st.p_in, st.p_out) + st.fwd
+                    else:
+                        pres = acc + st.fwd
+                    up = st
+                if port is not None:
+                    arrivals.append((port, pres))
+                    grant = yield port, pres, inp
+                    if grant > pres:
+                        pres = grant
+                lo = hi
+            segments = path.others
+            issue = accs[0]
+            # Response, back to the master
+            st = nodes[last]
+            resp = accs[last] + (st.write_latency if we[j] else st.latency)
+            if resp < st.last_resp + st.p_in:
+                resp = st.last_resp + st.p_in
+            st.last_resp = resp
+            st.count += 1
+            if st.resps is not None:
+                st.resps.append(resp)
+            for i in range(last - 1, -1, -1):
+                st = nodes[i]
+                if st.cross:
+                    resp = _edge(resp + st.p_out, st.p_in) + st.ret
+                else:
+                    resp += st.ret
+                t = st.last_resp + st.p_in
+                if resp < t:
+                    resp = t
+                if error and st.timeout and resp < accs[i] + st.timeout:
+                    resp = accs[i] + st.timeout
+                st.last_resp = resp
+                st.count += 1
+                if st.resps is not None:
+                    st.resps.append(resp)
+            t = m.last_resp + pm
+            if resp < t:
+                resp = t
+            m.last_resp = resp
+            if mresps is not None:
+                mresps.append(resp)
+            m._issue[j] = issue
+            m._resp[j] = resp
+            m._err[j] = error
+            count += 1
+            j += 1
+            # CYC stays high while the master has requests for the same slave
+            # before the last ACK
+            if j >= n_trans or pid[j] != pid[j - 1] or ready[j] > resp \
+               or (burst and count >= burst):
+                break
+            want = ready[j]
+            if want < issue + pm:
+                want = issue + pm
+        m.pos = j
+        # CYC falls the cycle after the last ACK
+        m.free = m.last_resp + pm
+        return [(port, _edge(m.free + t - start, port.xbar.period)) for port, t in arrivals]
+
+    def report(self):
+        """Statistics of the last run."""
+        t0 = min([int(m.ready[0]) for m in self.masters if len(m.ready)] or [0])
+        t1 = max([int(m.resp[-1]) for m in self.masters if len(m.resp)] or [0])
+        span = max(t1 - t0, 1)
+        res = {"time_ns": span / 1000.0, "masters": [], "slaves": [], "hotspots": []}
+        for m in self.masters:
+            n = len(m.ready)
+            if n == 0:
+                res["masters"].append({"name": m.name, "transactions": 0})
+                continue
+            lat = (m.resp - m.issue) / 1000.0
+            wait = (m.issue - m.ready) / 1000.0
+            p50, p90, p99 = np.percentile(lat, [50, 90, 99])
+            res["masters"].append({
+                "name": m.name,
+                "transactions": n,
+                "reads": int(n - m.we.sum()),
+                "writes": int(m.we.sum()),
+                "errors": int(m.err.sum()),
+                "bandwidth_MBps": n * DATA_BYTES * 1e6 / span,
+                "latency_ns": {"mean": float(lat.mean()), "p50": float(p50), "p90": float(p90),
+                               "p99": float(p99), "max": float(lat.max())},
+                "wait_ns": {"mean": float(wait.mean()), "max": float(wait.max())},
+            })
+        for st in self.stages():
+            if st.is_slave and st.count:
+                res["slaves"].append({
+                    "name": st.name,
+                    "transactions": st.count,
+                    "bandwidth_MBps": st.count * DATA_BYTES * 1e6 / span,
+                    "utilization": st.count * st.interval / float(span),
+                })
+        spots = []
+        for st in self.stages():
+            if st.stall:
+                spots.append({"name": st.name, "kind": "stall", "stalled": st.stalled,
+                              "time_ns": st.stall / 1000.0})
+        for p in self.ports():
+            if p.wait:
+                spots.append({"name": "{}/{}".format(p.xbar.name, p.name), "kind": "arbitration",
+                              "stalled": p.stalled, "time_ns": p.wait / 1000.0,
+                              "max_ns": p.max_wait / 1000.0,
+                              "busy": p.busy / float(span)})
+        res["hotspots"] = sorted(spots, key=lambda s: -s["time_ns"])
+        return res
+
+
+def read_trace(fname):
+    """(cycle, master, write, address) of the trace FNAME."""
+    res = []
+    with open(fname) as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].split()
+            if not line:
+                continue
+            try:
+                cycle, master, op, address = line
+                if op not in ("r", "w", "R", "W"):
+                    raise ValueError("bad operation '{}'".format(op))
+                res.append((int(cycle), master, op in ("w", "W"), int(address, 16)))
+            except ValueError as e:
+                raise PerfError("{}:{}: {}".format(fname, lineno, e))
+    return res
+
+
+def generate(model, seed=None):
+    """Trace of the "traffic" of the masters of MODEL."""
+    rng = np.random.default_rng(seed)
+    res = []
+    for m in model.masters:
+        t = m.traffic
+        if not t:
+            continue
+        count = _int(t.get("count", 10000))
+        burst = max(float(t.get("burst", 1)), 1.0)
+        load = min(max(float(t.get("load", 0.5)), 1e-6), 1.0)
+        ranges = t.get("ranges") or [{"base": 0, "size": 1 << 32}]
+        bases = np.array([_int(r["base"]) for r in ranges], dtype=np.int64)
+        sizes = np.array([max(_int(r["size"]) // DATA_BYTES, 1) for r in ranges], dtype=np.int64)
+        weights = np.array([float(r.get("weight", 1)) for r in ranges])
+        # Bursts of geometric length, separated by idle gaps so that the
+        # average load is LOAD
+        lengths = rng.geometric(1.0 / burst, count)
+        nb = int(np.searchsorted(np.cumsum(lengths), count)) + 1
+        lengths = lengths[:nb]
+        mean_gap = burst * (1.0 - load) / load
+        gaps = rng.geometric(1.0 / (mean_gap + 1.0), nb) - 1
+        which = rng.choice(len(ranges), nb, p=weights / weights.sum())
+        first = rng.integers(0, sizes[which])
+        reads = rng.random(nb) < float(t.get("reads", 0.5))
+        before = np.cumsum(lengths) - lengths
+        burst_id = np.repeat(np.arange(nb), lengths)[:count]
+        offset = np.arange(len(burst_id)) - before[burst_id]
+        cycles = (np.cumsum(gaps) + before)[burst_id] + offset
+        words = (first[burst_id] + offset) % sizes[which[burst_id]]
+        address = bases[which[burst_id]] + words * DATA_BYTES
+        we = ~reads[burst_id]
+        res.extend(zip(cycles.astype(int).tolist(), [m.name] * len(cycles), we.tolist(),
+                       address.astype(int).tolist()))
+    return res
+
+
+def write_trace(trace, fname):
+    with open(fname, "w") as f:
+        f.write("# cycle master r|w address\n")
+        for cycle, master, we, address in trace:
+            f.write("{} {} {} {:08x}\n".format(cycle, master, "w" if we else "r", address))
+
+
+def print_report(rep, top=10):
+    print("{:.1f} us simulated".format(rep["time_ns"] / 1000.0))
+    print("{:<16} {:>9} {:>9} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+        "master", "trans", "MB/s", "errors", "lat mean", "lat p50", "lat p99", "lat max",
+        "wait"))
+    for m in rep["masters"]:
+        if not m["transactions"]:
+            print("{:<16} {:>9}".format(m["name"], 0))
+            continue
+        lat = m["latency_ns"]
+        print("{:<16} {:>9} {:>9.1f} {:>6} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f}".format(
+            m["name"], m["transactions"], m["bandwidth_MBps"], m["errors"], lat["mean"],
+            lat["p50"], lat["p99"], lat["max"], m["wait_ns"]["mean"]))
+    print("{:<24} {:>9} {:>9} {:>6}".format("slave", "trans", "MB/s", "util"))
+    for s in rep["slaves"]:
+        print("{:<24} {:>9} {:>9.1f} {:>5.0f}%".format(
+            s["name"], s["transactions"], s["bandwidth_MBps"], 100 * s["utilization"]))
+    if rep["hotspots"]:
+        print("{:<24} {:<12} {:>9} {:>12}".format("hotspot", "", "requests", "time (ns)"))
+        for h in rep["hotspots"][:top]:
+            print("{:<24} {:<12} {:>9} {:>12.0f}".format(
+                h["name"], h["kind"], h["stalled"], h["time_ns"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog=PROG, description="Transaction-level performance model of Wishbone buses")
+    sub = parser.add_subparsers(dest="command")
+    sub.required = True
+
+    p = sub.add_parser("replay", help="replay a trace and report the performance")
+    p.add_argument("topology", help="JSON topology")
+    p.add_argument("trace", nargs="?",
+                   help="trace file (default is the traffic of the masters)")
+    p.add_argument("-s", "--seed", type=int, help="seed of the generated traffic")
+    p.add_argument("-n", "--top", type=int, default=10, help="number of hotspots shown")
+    p.add_argument("--json", help="write the report as JSON")
+
+    p = sub.add_parser("generate", help="write a trace from the traffic of the masters")
+    p.add_argument("topology", help="JSON topology")
+    p.add_argument("-o", "--output", required=True, help="trace file")
+    p.add_argument("-s", "--seed", type=int, help="seed of the generated traffic")
+    args = parser.parse_args()
+
+    try:
+        model = Model(args.topology)
+        if args.command == "generate":
+            write_trace(generate(model, args.seed), args.output)
+            return 0
+        trace = read_trace(args.trace) if args.trace else generate(model, args.seed)
+        model.load_trace(trace)
+        model.run()
+        rep = model.report()
+        print_report(rep, args.top)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(rep, f, indent=2)
+    except (PerfError, ValueError, KeyError, OSError) as e:
+        print("{}: {}".format(PROG, e), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
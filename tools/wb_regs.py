@@ -0,0 +1,759 @@
+#!/usr/bin/env python3
+# Python access to the registers of the cheby maps
+#
+# The host software accesses the cores through buses where every access is a
+# round trip (PCIe BAR, Etherbone, UART bridges).  This module is the runtime
+# of the classes generated from the .cheby maps by "gen": a class per map, with
+# a class per register and a typed attribute per field (a bool for one bit, an
+# int otherwise, checked against the width of the field):
+#   regs = wb_vic_regs(wb_regs.MmapBackend(".../resource0"), base=0x1000)
+#   regs.CTL.ENABLE               one read
+#   regs.CTL.ENABLE = 1           one read-modify-write
+#   with regs.transaction() as t: one write per register, and one read (all
+#       t.CTL.ENABLE = 1          the reads of the transaction at once) for
+#       t.CTL.EMU_LEN = 100       the registers with fields that are not
+#       t.IER.write(0xff)         written, when the transaction commits
+#   s = regs.snapshot()           the readable registers, in block reads
+#   s.CTL.EMU_LEN, int(s.RISR)    no bus access
+#   regs.IVT_RAM.read(0, 32)      one block read of a memory
+#
+# In a transaction, the updates of the fields of a register are merged into
+# one write, in the order of the first update of each register.  Writes with
+# side effects (registers with a write strobe or autoclear fields) are kept:
+# a register with side effects is written again when a field is updated
+# twice, and the updates after such a write are not merged into the writes
+# before it.  The fields that are not written keep the value read at the start
+# of the transaction (or written before in the transaction); autoclear fields
+# are written 0 unless they are updated, and write-only registers are not
+# read.  With shadow=True, the block remembers the values written to the
+# plain registers (read-write, no wire field, no side effect) and does not
+# read them again.
+#
+# A backend accesses 32-bit words at byte addresses: subclasses of Backend
+# define read() and write(), and those that can send several accesses in one
+# bus transaction (Etherbone records, bursts of a bridge) also define
+# read_many(), write_many() and read_block().  MmapBackend maps a file: a PCIe
+# resource file, /dev/mem, or a plain file for tests.  Counter counts the
+# accesses of a backend.
+#
+# The generated modules need this file in the Python path.  "load" builds the
+# class of a map at run time instead (PyYAML is needed to read the maps).
+#
+# Examples:
+#   wb_regs.py gen modules/wishbone/wb_vic/wb_vic_regs.cheby
+#   wb_regs.py dump modules/wishbone/wb_vic/wb_vic_regs.cheby bar0.bin --offset 0x1000
+
+import argparse
+import array
+import keyword
+import mmap
+import os
+import sys
+
+PROG = os.path.basename(__file__)
+
+WORD = 4  # bytes of a bus word (wb-32)
+
+
+class RegsError(Exception):
+    pass
+
+
+class Backend(object):
+    """Access to a bus by 32-bit words at byte addresses."""
+
+    def read(self, addr):
+        raise NotImplementedError
+
+    def write(self, addr, value):
+        raise NotImplementedError
+
+    def read_many(self, addrs):
+        return [self.read(a) for a in addrs]
+
+    def write_many(self, writes):
+        for a, v in writes:
+            self.write(a, v)
+
+    def read_block(self, addr, count):
+        return self.read_many(range(addr, addr + WORD * count, WORD))
+
+    def write_block(self, addr, words):
+        self.write_many(zip(range(addr, addr + WORD * len(words), WORD), words))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MmapBackend(Backend):
+    """Words (in the byte order of the host) of the file FNAME mapped from
+    OFFSET, for SIZE bytes (default is up to the end of the file)."""
+
+    def __init__(self, fname, offset=0, size=None):
+        if offset % WORD:
+            raise RegsError("{}: offset {:#x} is not aligned".format(fname, offset))
+        self._file = open(fname, "r+b")
+        try:
+            if size is None:
+                size = os.fstat(self._file.fileno()).st_size - offset
+            size -= size % WORD
+            if size <= 0:
+                raise RegsError("{}: nothing to map at {:#x}".format(fname, offset))
+            start = offset - offset % mmap.ALLOCATIONGRANULARITY
+            self._map = mmap.mmap(self._file.fileno(), size + offset - start, offset=start)
+        except (RegsError, OSError, ValueError):
+            self._file.close()
+            raise
+        self._words = memoryview(self._map)[offset - start:].cast("I")
+        self.size = size
+
+    def read(self, addr):
+        return self._words[addr >> 2]
+
+    def write(self, addr, value):
+        self._words[addr >> 2] = value
+
+    def read_block(self, addr, count):
+        return self._words[addr >> 2:(addr >> 2) + count].tolist()
+
+    def write_block(self, addr, words):
+        self._words[addr >> 2:(addr >> 2) + len(words)] = array.array("I", words)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._words.release()
+        self._map.close()
+        self._file.close()
+
+
+class Counter(Backend):
+    """Accesses of BACKEND: words read and written, and requests (the calls
+    to the backend, one bus transaction each for a backend that merges
+    accesses)."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.reads = 0
+        self.writes = 0
+        self.requests = 0
+
+    def read(self, addr):
+        self.reads += 1
+        self.requests += 1
+        return self.backend.read(addr)
+
+    def write(self, addr, value):
+        self.writes += 1
+        self.requests += 1
+        self.backend.write(addr, value)
+
+    def read_many(self, addrs):
+        addrs = list(addrs)
+        self.reads += len(addrs)
+        self.requests += 1
+        return self.backend.read_many(addrs)
+
+    def write_many(self, writes):
+        writes = list(writes)
+        self.writes += len(writes)
+        self.requests += 1
+        self.backend.write_many(writes)
+
+    def read_block(self, addr, count):
+        self.reads += count
+        self.requests += 1
+        return self.backend.read_block(addr, count)
+
+    def write_block(self, addr, words):
+        self.writes += len(words)
+        self.requests += 1
+        self.backend.write_block(addr, words)
+
+    def close(self):
+        self.backend.close()
+
+    def __str__(self):
+        return "{} requests, {} reads, {} writes".format(self.requests, self.reads, self.writes)
+
+
+class Field(object):
+    """Bits LSB to LSB+WIDTH-1 of a register."""
+
+    def __init__(self, lsb, width, doc=None, pulse=False):
+        self.name = None
+        self.lsb = lsb
+        self.width = width
+        self.mask = ((1 << width) - 1) << lsb
+        self.pulse = pulse
+        self.__doc__ = doc
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, reg, owner=None):
+        if reg is None:
+            return self
+        v = (reg._io.get(reg) & self.mask) >> self.lsb
+        return bool(v) if self.width == 1 else v
+
+    def __set__(self, reg, value):
+        reg._io.set(reg, self.mask, self.encode(reg, value))
+
+    def encode(self, reg, value):
+        v = int(value)
+        if v < 0 or v >> self.width:
+            raise ValueError("{}.{}: {} does not fit in {} bits".format(
+                type(reg).__name__, self.name, value, self.width))
+        return v << self.lsb
+
+
+class Value(object):
+    """A register value, for registers used as values: field updates are
+    local."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value=0):
+        self.value = value
+
+    def get(self, reg):
+        return self.value
+
+    def set(self, reg, mask, value):
+        self.value = self.value & ~mask | value
+
+
+class Reg(object):
+    """A register of a block, bound to the block (bus accesses), to a
+    transaction, to a snapshot or to a Value."""
+
+    _address = 0        # offset in the block (bytes)
+    _width = 32
+    _access = "rw"      # rw, ro or wo
+    _strobe = False     # writes have side effects (write strobe)
+    _read_strobe = False
+    _volatile = False   # reads may differ from the last write (wire fields)
+
+    __slots__ = ("_io",)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = [f for f in vars(cls).values() if isinstance(f, Field)]
+        cls._fields = tuple(f.name for f in sorted(fields, key=lambda f: f.lsb))
+        cls._words = max(1, cls._width // 32)
+        cls._full = (1 << cls._width) - 1
+        cls._defined = sum(f.mask for f in fields) or cls._full
+        cls._pulse = sum(f.mask for f in fields if f.pulse)
+        cls._effects = cls._strobe or cls._pulse != 0
+
+    def __init__(self, io):
+        self._io = io
+
+    def read(self):
+        """The value of the register, as a register bound to a Value."""
+        return type(self)(Value(self._io.get(self)))
+
+    def write(self, value=None, **fields):
+        """Write VALUE with FIELDS replaced, or only FIELDS (the other fields
+        are read) if VALUE is None."""
+        mask, word = (0, 0) if value is None else (self._full, int(value) & self._full)
+        for name, v in fields.items():
+            f = getattr(type(self), name, None)
+            if not isinstance(f, Field):
+                raise AttributeError("{} has no field {}".format(type(self).__name__, name))
+            word = word & ~f.mask | f.encode(self, v)
+            mask |= f.mask
+        self._io.set(self, mask, word)
+
+    def __int__(self):
+        return self._io.get(self)
+
+    def __index__(self):
+        return self._io.get(self)
+
+    def __repr__(self):
+        v = self._io.get(self)
+        value = type(self)(Value(v))
+        fields = ", ".join("{}={}".format(n, getattr(value, n)) for n in self._fields)
+        return "{}({:#0{}x}{}{})".format(type(self).__name__, v, self._width // 4 + 2,
+                                          ": " if fields else "", fields)
+
+
+class Memory(object):
+    """A memory (submap) of 32-bit words of a block."""
+
+    _address = 0
+    _size = 0  # bytes
+
+    __slots__ = ("_block",)
+
+    def __init__(self, block):
+        self._block = block
+
+    def __len__(self):
+        return self._size // WORD
+
+    def _check(self, index, count):
+        if index < 0 or count < 0 or index + count > len(self):
+            raise IndexError("{}: words {} to {} out of {}".format(
+                type(self).__name__, index, index + count - 1, len(self)))
+        return self._block._base + self._address + WORD * index
+
+    def read(self, index=0, count=None):
+        """COUNT words (default is up to the end) from word INDEX, in one
+        block read."""
+        count = len(self) - index if count is None else count
+        return self._block._backend.read_block(self._check(index, count), count)
+
+    def write(self, index, words):
+        words = list(words)
+        self._block._backend.write_block(self._check(index, len(words)), words)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            return self.read(start, max(stop - start, 0))[::step]
+        if index < 0:
+            index += len(self)
+        return self.read(index, 1)[0]
+
+    def __setitem__(self, index, value):
+        if index < 0:
+            index += len(self)
+        self.write(index, [value])
+
+
+def _split(block, reg, value):
+    """Words of the value of the register REG, in address order."""
+    words = [(value >> (32 * i)) & 0xffffffff for i in range(reg._words)]
+    return words[::-1] if block._big_endian else words
+
+
+def _join(block, reg, words):
+    if not block._big_endian:
+        words = words[::-1]
+    v = 0
+    for w in words:
+        v = v << 32 | w
+    return v
+
+
+def _addresses(block, reg):
+    a = block._base + reg._address
+    return range(a, a + WORD * reg._words, WORD)
+
+
+class Block(object):
+    """A map at BASE on BACKEND.  The registers and memories are attributes
+    (classes in the class, bound to the block in the instances)."""
+
+    _size = 0
+    _big_endian = True  # word order of the registers wider than 32 bits
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        members = [(n, c) for n, c in vars(cls).items()
+                   if isinstance(c, type) and issubclass(c, (Reg, Memory))]
+        members.sort(key=lambda m: m[1]._address)
+        cls._regs = tuple(n for n, c in members if issubclass(c, Reg))
+        cls._memories = tuple(n for n, c in members if issubclass(c, Memory))
+
+    def __init__(self, backend, base=0, shadow=False):
+        self._backend = backend
+        self._base = base
+        self._shadow = {} if shadow else None
+        for name in self._regs + self._memories:
+            setattr(self, name, getattr(type(self), name)(self))
+
+    def get(self, reg):
+        if reg._words == 1:
+            return self._backend.read(self._base + reg._address)
+        return _join(self, reg, self._backend.read_many(_addresses(self, reg)))
+
+    def set(self, reg, mask, value):
+        t = Transaction(self)
+        t.set(reg, mask, value)
+        t.commit()
+
+    def transaction(self):
+        """A transaction: the field updates are merged, and done by commit()
+        (at the end of a with statement)."""
+        return Transaction(self)
+
+    def snapshot(self, *regs):
+        """Read REGS (registers or names; default is the readable registers
+        without read strobe), in as few block reads as possible."""
+        if regs:
+            regs = [getattr(type(self), r) if isinstance(r, str) else type(r) for r in regs]
+        else:
+            regs = [getattr(type(self), n) for n in self._regs]
+            regs = [r for r in regs if r._access != "wo" and not r._read_strobe]
+        addrs = sorted(set(a for r in regs for a in _addresses(self, r)))
+        words = {}
+        i = 0
+        while i < len(addrs):
+            j = i + 1
+            while j < len(addrs) and addrs[j] == addrs[j - 1] + WORD:
+                j += 1
+            words.update(zip(addrs[i:j], self._backend.read_block(addrs[i], j - i)))
+            i = j
+        return Snapshot(self, words)
+
+
+class _Views(object):
+    """Registers of a block bound to this object, made on first use."""
+
+    def __getattr__(self, name):
+        cls = getattr(type(self._block), name, None)
+        if not (isinstance(cls, type) and issubclass(cls, Reg)):
+            raise AttributeError("{} has no register {}".format(type(self._block).__name__, name))
+        view = cls(self)
+        setattr(self, name, view)
+        return view
+
+
+class Snapshot(_Views):
+    """Values of registers of BLOCK, read at once."""
+
+    def __init__(self, block, words):
+        self._block = block
+        self._words = words
+
+    def get(self, reg):
+        try:
+            return _join(self._block, reg, [self._words[a] for a in _addresses(self._block, reg)])
+        except KeyError:
+            raise RegsError("{}: not in the snapshot".format(type(reg).__name__))
+
+    def set(self, reg, mask, value):
+        raise RegsError("{}: a snapshot is read-only".format(type(reg).__name__))
+
+    def __iter__(self):
+        """The registers of the snapshot, by address."""
+        b = self._block
+        for name in b._regs:
+            reg = getattr(type(b), name)
+            if all(a in self._words for a in _addresses(b, reg)):
+                yield getattr(self, name)
+
+
+class Transaction(_Views):
+    """Field updates of BLOCK, merged and written by commit()."""
+
+    def __init__(self, block):
+        self._block = block
+        self._writes = []   # [register class, mask, value]
+        self._last = {}     # address -> index of the last write in _writes
+        self._barrier = 0   # index of the last write with side effects
+
+    def get(self, reg):
+        raise RegsError("{}: registers are write-only in a transaction".format(
+            type(reg).__name__))
+
+    def set(self, reg, mask, value):
+        cls = type(reg)
+        if cls._access == "ro":
+            raise RegsError("{}: read-only register".format(cls.__name__))
+        i = self._last.get(cls._address)
+        if (i is not None and i >= self._barrier
+                and not (cls._effects and self._writes[i][1] & mask)):
+            w = self._writes[i]
+            w[1] |= mask
+            w[2] = w[2] & ~mask | value
+        else:
+            i = len(self._writes)
+            self._writes.append([cls, mask, value])
+            self._last[cls._address] = i
+        if cls._effects:
+            self._barrier = i
+
+    def commit(self):
+        """Do the reads, then the writes; return the number of writes (of
+        registers)."""
+        b = self._block
+        writes = self._writes
+        self._writes, self._last, self._barrier = [], {}, 0
+        shadow = b._shadow if b._shadow is not None else {}
+
+        # Registers with fields not written, and not known
+        known = set(shadow)
+        reads = []
+        for reg, mask, _ in writes:
+            a = reg._address
+            if reg._defined & ~mask == 0:
+                known.add(a)
+            elif reg._access == "rw" and a not in known:
+                known.add(a)
+                reads.append(reg)
+        cur = {}
+        if reads:
+            addrs = [a for reg in reads for a in _addresses(b, reg)]
+            words = b._backend.read_many(addrs)
+            k = 0
+            for reg in reads:
+                cur[reg._address] = _join(b, reg, words[k:k + reg._words])
+                k += reg._words
+
+        out = []
+        for reg, mask, value in writes:
+            a = reg._address
+            base = cur.get(a, shadow.get(a, 0)) if reg._access == "rw" else 0
+            word = (base & ~reg._pulse & ~mask | value) & reg._full
+            cur[a] = word & ~reg._pulse
+            if b._shadow is not None and reg._access == "rw" and not (reg._volatile or reg._effects):
+                b._shadow[a] = word
+            out.extend(zip(_addresses(b, reg), _split(b, reg, word)))
+        if out:
+            b._backend.write_many(out)
+        return len(writes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+
+
+# Names used by the runtime
+_RESERVED = set(n for c in (Block, Reg, Memory, Transaction, Snapshot) for n in dir(c))
+
+
+def _int(v):
+    return int(v, 0) if isinstance(v, str) else int(v)
+
+
+def _align(v, a):
+    return (v + a - 1) // a * a
+
+
+def _pow2(v):
+    return 1 << max(v - 1, 0).bit_length()
+
+
+def _doc(node):
+    parts = [str(node.get(k)).strip() for k in ("description", "comment") if node.get(k)]
+    return "\n\n".join(parts) or None
+
+
+def _name(fname, node, what, reserved):
+    name = node.get("name")
+    if (not isinstance(name, str) or not name.isidentifier() or keyword.iskeyword(name)
+            or name.startswith("_") or name in reserved):
+        raise RegsError("{}: {} name {!r} cannot be used in Python".format(fname, what, name))
+    return name
+
+
+def _xhdl(node, key):
+    return (node.get("x-hdl") or {}).get(key)
+
+
+def _fields(fname, reg, width):
+    res = []
+    used = 0
+    for child in reg.get("children") or []:
+        (kind, node), = child.items()
+        if kind != "field":
+            raise RegsError("{}: {}: {} in a register".format(fname, reg.get("name"), kind))
+        name = _name(fname, node, "field", _RESERVED)
+        r = str(node.get("range", "")).replace(" ", "")
+        try:
+            hi, lo = (int(x) for x in r.split("-")) if "-" in r else (int(r), int(r))
+        except ValueError:
+            raise RegsError("{}: {}.{}: bad range {!r}".format(fname, reg["name"], name, r))
+        mask = ((1 << (hi - lo + 1)) - 1) << lo
+        if lo < 0 or hi < lo or hi >= width or used & mask:
+            raise RegsError("{}: {}.{}: range {} overlaps or is outside the register".format(
+                fname, reg["name"], name, r))
+        used |= mask
+        res.append({"name": name, "lsb": lo, "width": hi - lo + 1, "doc": _doc(node),
+                    "pulse": _xhdl(node, "type") == "autoclear",
+                    "wire": _xhdl(node, "type") == "wire"})
+    return res
+
+
+def parse_map(fname):
+    """Layout of the cheby map FNAME."""
+    try:
+        import yaml
+    except ImportError:
+        raise RegsError("PyYAML is needed to read the cheby maps")
+    with open(fname) as f:
+        try:
+            desc = yaml.safe_load(f)
+        except yaml.YAMLError as e:
+            raise RegsError("{}: {}".format(fname, e))
+    mm = (desc or {}).get("memory-map")
+    if not isinstance(mm, dict):
+        raise RegsError("{}: no memory-map".format(fname))
+    bus = str(mm.get("bus", "wb-32-be"))
+    if not bus.startswith("wb-32"):
+        raise RegsError("{}: bus {} is not supported".format(fname, bus))
+    name = str(mm.get("name", "")) + str(_xhdl(mm, "name-suffix") or "")
+    layout = {"name": name, "doc": _doc(mm), "big_endian": not bus.endswith("-le"),
+              "regs": [], "memories": []}
+    if not name.isidentifier() or keyword.iskeyword(name):
+        raise RegsError("{}: map name {!r} cannot be used in Python".format(fname, name))
+
+    addr = 0
+    names = set()
+    spans = []
+    for child in mm.get("children") or []:
+        (kind, node), = child.items()
+        if kind == "reg":
+            width = int(node.get("width", 32))
+            if width % 32:
+                raise RegsError("{}: {}: width {} is not a multiple of 32".format(
+                    fname, node.get("name"), width))
+            size = width // 8
+        elif kind == "submap" and "filename" not in node and "size" in node:
+            size = _int(node["size"])
+        else:
+            raise RegsError("{}: {} {} is not supported".format(
+                fname, "submap with a filename" if kind == "submap" else kind, node.get("name")))
+        name = _name(fname, node, kind, _RESERVED)
+        if name in names:
+            raise RegsError("{}: two {}".format(fname, name))
+        names.add(name)
+        align = _pow2(size)
+        a = node.get("address", "next")
+        a = _align(addr, align) if a in (None, "next") else _int(a)
+        if a % align:
+            raise RegsError("{}: {} at {:#x} is not aligned on {:#x} bytes".format(
+                fname, name, a, align))
+        spans.append((a, a + size, name))
+        addr = a + size
+        item = {"name": name, "address": a, "doc": _doc(node)}
+        if kind == "submap":
+            item["size"] = size
+            layout["memories"].append(item)
+            continue
+        fields = _fields(fname, node, width)
+        access = str(node.get("access", "rw"))
+        if access not in ("rw", "ro", "wo"):
+            raise RegsError("{}: {}: access {} is not supported".format(fname, name, access))
+        item.update(width=width, access=access, fields=fields,
+                    strobe=bool(_xhdl(node, "write-strobe")),
+                    read_strobe=bool(_xhdl(node, "read-strobe")),
+                    volatile=(_xhdl(node, "type") == "wire"
+                              or any(f["wire"] or f["pulse"] for f in fields)))
+        layout["regs"].append(item)
+    spans.sort()
+    for (_, end, n1), (start, _, n2) in zip(spans, spans[1:]):
+        if start < end:
+            raise RegsError("{}: {} and {} overlap".format(fname, n1, n2))
+    layout["size"] = spans[-1][1] if spans else 0
+    return layout
+
+
+def _docstring(doc, indent):
+    if not doc:
+        return []
+    doc = doc.replace("\\", "\\\\").replace('"""', '\\"\\"\\"')
+    lines = doc.split("\n")
+    res = [indent + '"""' + lines[0]]
+    res += [(indent + l).rstrip() for l in lines[1:]]
+    res[-1] += '"""'
+    return res
+
+
+def _class(layout):
+    """Lines of the Python class of LAYOUT."""
+    lines = ["class {}(wb_regs.Block):".format(layout["name"])]
+    lines += _docstring(layout["doc"], "    ")
+    lines += ["", "    _size = {:#x}".format(layout["size"]),
+              "    _big_endian = {}".format(layout["big_endian"])]
+    for reg in layout["regs"]:
+        lines += ["", "    class {}(wb_regs.Reg):".format(reg["name"])]
+        lines += _docstring(reg["doc"], "        ")
+        lines.append("        _address = {:#x}".format(reg["address"]))
+        if reg["width"] != 32:
+            lines.append("        _width = {}".format(reg["width"]))
+        if reg["access"] != "rw":
+            lines.append('        _access = "{}"'.format(reg["access"]))
+        for key in ("strobe", "read_strobe", "volatile"):
+            if reg[key]:
+                lines.append("        _{} = True".format(key))
+        for f in reg["fields"]:
+            args = [str(f["lsb"]), str(f["width"]), repr(f["doc"])]
+            if f["pulse"]:
+                args.append("pulse=True")
+            lines.append("        {} = Field({})".format(f["name"], ", ".join(args)))
+    for mem in layout["memories"]:
+        lines += ["", "    class {}(wb_regs.Memory):".format(mem["name"])]
+        lines += _docstring(mem["doc"], "        ")
+        lines += ["        _address = {:#x}".format(mem["address"]),
+                  "        _size = {:#x}".format(mem["size"])]
+    return lines
+
+
+def gen_module(layout, source):
+    """Source of the Python module of LAYOUT (from the map SOURCE)."""
+    lines = [
+        "# Generated by {} from {}; do not edit".format(PROG, os.path.basename(source)),
+        "#",
+        "# Needs wb_regs.py (tools directory of general-cores) in the Python path.",
+        "",
+        "import wb_regs",
+        "from wb_regs import Field",
+        "",
+        "",
+    ]
+    return "\n".join(lines + _class(layout)) + "\n"
+
+
+def load(fname):
+    """The class of the cheby map FNAME, built at run time."""
+    layout = parse_map(fname)
+    env = {"wb_regs": sys.modules[__name__], "Field": Field, "__name__": layout["name"]}
+    exec(compile("\n".join(_class(layout)), fname, "exec"), env)
+    return env[layout["name"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog=PROG, description="Python access to the registers of the cheby maps")
+    sub = parser.add_subparsers(dest="cmd")
+    sub.required = True
+    p = sub.add_parser("gen", help="generate the Python module of a map")
+    p.add_argument("map", help="cheby map")
+    p.add_argument("-o", "--output",
+                   help="output file (default is <name>.py next to the map)")
+    p = sub.add_parser("dump", help="print the registers of a map in a mapped file")
+    p.add_argument("map", help="cheby map")
+    p.add_argument("file", help="file to map (PCIe resource file, /dev/mem, ...)")
+    p.add_argument("--offset", type=lambda v: int(v, 0), default=0,
+                   help="offset of the map in the file")
+    p.add_argument("-v", "--verbose", action="store_true", help="print the number of accesses")
+    args = parser.parse_args()
+
+    try:
+        if args.cmd == "gen":
+            layout = parse_map(args.map)
+            out = args.output or os.path.join(os.path.dirname(args.map), layout["name"] + ".py")
+            with open(out, "w") as f:
+                f.write(gen_module(layout, args.map))
+            return 0
+        cls = load(args.map)
+        size = max([getattr(cls, n)._address + getattr(cls, n)._words * WORD
+                    for n in cls._regs] or [WORD])
+        with Counter(MmapBackend(args.file, args.offset, size)) as backend:
+            for reg in cls(backend).snapshot():
+                print("{:#06x} {!r}".format(reg._address, reg))
+            if args.verbose:
+                print(backend)
+    except (RegsError, IOError, OSError) as e:
+        print("{}: {}".format(PROG, e), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+# SPI flash programmer for xwb_xc7_fw_update
+#
+# The core has one register, FAR: a write sends DATA to the flash (if XFER is
+# set) with the chip select CS, and a read returns READY and the byte received.
+# Without FIFO (g_fifo_depth = 0), every byte is a write followed by reads of
+# FAR until READY.  In burst mode (g_fifo_depth > 0) the writes of a sequence
+# of commands (write enable, page program with its 256 bytes, read status) are
+# sent at once, in one request of the backend; the bytes to receive are marked
+# (bit 9 of the write) and read from the RX FIFO of the core, by batches of up
+# to --fifo bytes, and at most the depth of its FIFOs (read from FAR.DEPTH):
+# the core drops the bytes received while its RX FIFO is full, and sets
+# FAR.OVF, which is an error.  The mode is probed unless --burst or --no-burst
+# is given.
+#
+# An image is programmed by sectors (--sector, 64 KiB): the CRC-32 of the
+# content of each sector (read back) is compared to the one of the image, and
+# the sector is skipped when they are equal.  Otherwise it is erased (unless it
+# is blank), its pages that are not blank are programmed, and its CRC is read
+# back again.  With --crc-cache, the CRCs of the sectors written are kept in a
+# file, and the sectors whose CRC in the cache is the one of the image are
+# skipped without reading them (use "verify" to read everything).
+#
+# The commands are those of the usual SPI NOR flashes (Micron N25Q/MT25Q,
+# Spansion S25FL, ...): RDID 9F, WREN 06, RDSR 05, READ 03, PP 02, SE D8, or
+# READ4 13, PP4 12, SE4 DC with --addr-bytes 4.
+#
+# The core is accessed through a mapped file (--mmap: a PCIe resource file or
+# /dev/mem, with the offset of the core), or simulated (--sim IMAGE: a model
+# of the core and of a flash whose content is the file IMAGE, blank if it does
+# not exist; --sim-fifo gives the depth of the FIFOs of the burst mode).  -v
+# prints the accesses to the core (requests are the calls of the backend: one
+# round trip each for a backend that batches the accesses).
+#
+# Examples:
+#   xc7_flash.py --mmap /sys/bus/pci/devices/0000:01:00.0/resource0 --offset 0x1000 id
+#   xc7_flash.py --mmap /dev/mem --offset 0xa0001000 program top.bin --crc-cache top.crc
+#   xc7_flash.py --sim flash.bin --sim-fifo 512 -v program top.bin
+#   xc7_flash.py --sim flash.bin read 0 0x10000 -o head.bin
+
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+from collections import deque
+
+PROG = os.path.basename(__file__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, "modules", "wishbone", "wb_xc7_fw_update"))
+import wb_regs  # noqa: E402
+from wb_xc7_fw_update_regs import wb_xc7_fw_update_regs as Regs  # noqa: E402
+
+FAR = Regs.far
+DATA = FAR.data.mask
+XFER = FAR.xfer.mask
+KEEP = FAR.ready.mask  # written: keep the byte received (burst mode)
+READY = FAR.ready.mask
+CS = FAR.cs.mask
+OVF = FAR.ovf.mask
+DEPTH = FAR.depth.mask
+
+# Opcodes (3 and 4 address bytes)
+RDID = 0x9f
+WREN = 0x06
+RDSR = 0x05
+READ = {3: 0x03, 4: 0x13}
+PP = {3: 0x02, 4: 0x12}
+SE = {3: 0xd8, 4: 0xdc}
+SR_WIP = 0x01
+SR_WEL = 0x02
+
+CACHE_VERSION = 1
+
+
+class FlashError(Exception):
+    pass
+
+
+class Spi(object):
+    """Transfers through FAR at ADDR of BACKEND, in burst mode if BURST (None
+    to probe the core), with at most FIFO bytes (and the depth of the FIFOs
+    of the core) waiting in the RX FIFO."""
+
+    def __init__(self, backend, addr=0, burst=None, fifo=256, timeout=2.0):
+        self.backend = backend
+        self.addr = addr + FAR._address
+        self.fifo = fifo
+        self.timeout = timeout
+        self.burst = self.probe() if burst is None else burst
+        self.depth = 0
+        if self.burst:
+            self.setup()
+
+    def _poll(self):
+        """Read FAR until READY."""
+        deadline = time.time() + self.timeout
+        while True:
+            v = self.backend.read(self.addr)
+            if v & READY:
+                return v
+            if time.time() > deadline:
+                raise FlashError("timeout waiting for READY")
+
+    def probe(self):
+        """Burst mode: a transfer (with CS inactive) with its byte kept is
+        returned with XFER set."""
+        self.backend.write(self.addr, XFER | KEEP)
+        v = self._poll()
+        return bool((v | self.backend.read(self.addr)) & XFER)
+
+    def setup(self):
+        """Read the depth of the FIFOs, drop the bytes left in the RX FIFO and
+        clear OVF."""
+        v = self._poll()
+        while v & XFER:
+            v = self.backend.read(self.addr)
+        self.depth = (v & DEPTH) >> FAR.depth.lsb
+        if self.depth:
+            self.fifo = min(self.fifo, self.depth)
+        self.backend.write(self.addr, OVF)
+
+    def _receive(self, count):
+        res = bytearray()
+        deadline = time.time() + self.timeout
+        while len(res) < count:
+            words = self.backend.read_many([self.addr] * (count - len(res)))
+            if any(w & OVF for w in words):
+                raise FlashError("RX FIFO overflow: received bytes were lost")
+            res.extend(w & DATA for w in words if w & XFER)
+            if time.time() > deadline:
+                raise FlashError("timeout waiting for {} bytes".format(count - len(res)))
+        return res
+
+    def run(self, commands, rx=0):
+        """Send COMMANDS (sequences of bytes, each one with CS active), the
+        last one followed by RX bytes received; return them."""
+        if not self.burst:
+            return self._run_direct(commands, rx)
+        words = []
+        for cmd in commands[:-1]:
+            words += [CS | XFER | b for b in cmd] + [0]
+        words += [CS | XFER | b for b in commands[-1]]
+        sent = min(rx, self.fifo)
+        words += [CS | XFER | KEEP] * sent
+        if sent == rx:
+            words.append(0)
+        self.backend.write_many([(self.addr, w) for w in words])
+        res = bytearray()
+        while len(res) < rx:
+            res += self._receive(min(max(self.fifo // 2, 1), sent - len(res)))
+            more = min(rx - sent, self.fifo - (sent - len(res)))
+            if more:
+                sent += more
+                words = [CS | XFER | KEEP] * more + ([0] if sent == rx else [])
+                self.backend.write_many([(self.addr, w) for w in words])
+        return bytes(res)
+
+    def _run_direct(self, commands, rx):
+        res = bytearray()
+        for i, cmd in enumerate(commands):
+            n = rx if i == len(commands) - 1 else 0
+            for k, b in enumerate(list(cmd) + [0] * n):
+                self.backend.write(self.addr, CS | XFER | b)
+                v = self._poll()
+                if k >= len(cmd):
+                    res.append(v & DATA)
+            self.backend.write(self.addr, 0)
+        return bytes(res)
+
+
+class Flash(object):
+    """SPI NOR flash behind SPI."""
+
+    def __init__(self, spi, addr_bytes=3, page=256, sector=0x10000):
+        self.spi = spi
+        self.addr_bytes = addr_bytes
+        self.page = page
+        self.sector = sector
+
+    def _cmd(self, op, addr):
+        if addr >> (8 * self.addr_bytes):
+            raise FlashError("address {:#x} needs more than {} bytes".format(addr, self.addr_bytes))
+        return [op[self.addr_bytes]] + list(addr.to_bytes(self.addr_bytes, "big"))
+
+    def id(self):
+        return self.spi.run([[RDID]], 3)
+
+    def read(self, addr, count):
+        return self.spi.run([self._cmd(READ, addr)], count)
+
+    def _write(self, cmd, pause, timeout):
+        """Write enable, CMD, then read the status until the write ends."""
+        status = self.spi.run([[WREN], cmd, [RDSR]], 1)[0]
+        deadline = time.time() + timeout
+        while status & SR_WIP:
+            if time.time() > deadline:
+                raise FlashError("timeout (status {:#04x})".format(status))
+            time.sleep(pause)
+            status = self.spi.run([[RDSR]], 1)[0]
+
+    def erase(self, addr):
+        self._write(self._cmd(SE, addr), 0.001, 10.0)
+
+    def program(self, addr, data):
+        self._write(self._cmd(PP, addr) + list(data), 0, 1.0)
+
+
+def _blank(data):
+    return data.count(0xff) == len(data)
+
+
+def load_cache(fname, ident, sector):
+    try:
+        with open(fname) as f:
+            data = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    if (data.get("version"), data.get("id"), data.get("sector")) != (CACHE_VERSION, ident, sector):
+        return {}
+    return dict((int(k, 0), v) for k, v in data.get("crcs", {}).items())
+
+
+def save_cache(fname, ident, sector, crcs):
+    tmp = fname + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": CACHE_VERSION, "id": ident, "sector": sector,
+                   "crcs": dict(("{:#x}".format(k), v) for k, v in sorted(crcs.items()))},
+                  f, indent=1)
+    os.replace(tmp, fname)
+
+
+def program(flash, image, address, skip=True, cache=None):
+    """Program IMAGE at ADDRESS by sectors; return the number of sectors
+    skipped, erased and written, and of pages programmed.  CACHE is a dict
+    sector address -> CRC-32, updated."""
+    sz = flash.sector
+    stats = {"sectors": 0, "skipped": 0, "erased": 0, "pages": 0}
+    cache = {} if cache is None else cache
+    end = address + len(image)
+    for start in range(address - address % sz, end, sz):
+        stats["sectors"] += 1
+        lo, hi = max(start, address), min(start + sz, end)
+        part = image[lo - address:hi - address]
+        whole = lo == start and hi == start + sz
+        if skip and whole and cache.get(start) == zlib.crc32(part):
+            stats["skipped"] += 1
+            continue
+        old = flash.read(start, sz)
+        new = old[:lo - start] + part + old[hi - start:]
+        crc = zlib.crc32(new)
+        if skip and zlib.crc32(old) == crc:
+            cache[start] = crc
+            stats["skipped"] += 1
+            continue
+        if not _blank(old):
+            flash.erase(start)
+            stats["erased"] += 1
+        for p in range(0, sz, flash.page):
+            data = new[p:p + flash.page]
+            if not _blank(data):
+                flash.program(start + p, data)
+                stats["pages"] += 1
+        if zlib.crc32(flash.read(start, sz)) != crc:
+            cache.pop(start, None)
+            raise FlashError("verify failed in sector {:#x}".format(start))
+        cache[start] = crc
+    return stats
+
+
+class FlashModel(object):
+    """SPI NOR flash with the content DATA (a bytearray).  A write keeps the
+    flash busy for BUSY reads of the status."""
+
+    def __init__(self, data, addr_bytes=3, page=256, sector=0x10000,
+                 ident=b"\x20\xba\x18", busy=2):
+        self.data = data
+        self.addr_bytes = addr_bytes
+        self.page = page
+        self.sector = sector
+        self.ident = ident
+        self.busy = busy
+        self.selected = False
+        self.cmd = bytearray()
+        self.wel = False
+        self.wip = 0
+
+    def _addr(self):
+        n = self.addr_bytes
+        return int.from_bytes(self.cmd[1:1 + n], "big") % len(self.data), 1 + n
+
+    def select(self, cs):
+        if self.selected and not cs:
+            self._end()
+        self.selected = cs
+        self.cmd = bytearray()
+
+    def xfer(self, b):
+        if not self.selected:
+            return 0xff
+        self.cmd.append(b)
+        op, n = self.cmd[0], len(self.cmd) - 1
+        if op == RDSR:
+            return (SR_WIP if self.wip else 0) | (SR_WEL if self.wel else 0)
+        if op == RDID and 1 <= n <= len(self.ident):
+            return self.ident[n - 1]
+        if op == READ[self.addr_bytes] and not self.wip:
+            a, hdr = self._addr()
+            if n >= hdr:
+                return self.data[(a + n - hdr) % len(self.data)]
+        return 0xff
+
+    def _end(self):
+        op = self.cmd[0] if self.cmd else None
+        if op == RDSR:
+            self.wip = max(self.wip - 1, 0)
+            return
+        if self.wip:
+            return
+        if op == WREN:
+            self.wel = True
+        elif op in (PP[self.addr_bytes], SE[self.addr_bytes]) and self.wel:
+            a, hdr = self._addr()
+            if op == SE[self.addr_bytes]:
+                a -= a % self.sector
+                self.data[a:a + self.sector] = b"\xff" * self.sector
+            else:
+                base = a - a % self.page
+                for i, v in enumerate(self.cmd[hdr:hdr + self.page]):
+                    j = base + (a + i) % self.page
+                    self.data[j] &= v
+            self.wel = False
+            self.wip = self.busy
+
+
+class SimCore(wb_regs.Backend):
+    """Model of xwb_xc7_fw_update with FLASH, in burst mode with FIFOs of
+    DEPTH bytes if DEPTH > 0.  The transfers are immediate."""
+
+    def __init__(self, flash, depth=0):
+        self.flash = flash
+        self.depth = depth
+        self.rx = deque()
+        self.last = 0
+        self.cs = False
+        self.ovf = False
+
+    def write(self, addr, value):
+        if self.depth and value & OVF:
+            self.ovf = False
+            return
+        cs = bool(value & CS)
+        if cs != self.cs:
+            self.flash.select(cs)
+            self.cs = cs
+        if value & XFER:
+            b = self.flash.xfer(value & DATA)
+            if not self.depth:
+                self.last = b
+            elif value & KEEP:
+                if len(self.rx) >= self.depth:
+                    self.ovf = True
+                else:
+                    self.rx.append(b)
+
+    def read(self, addr):
+        if not self.depth:
+            return self.last | READY
+        v = READY | (self.depth << FAR.depth.lsb) | (OVF if self.ovf else 0)
+        if self.rx:
+            return self.rx.popleft() | XFER | v
+        return v
+
+
+def _int(v):
+    return int(v, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog=PROG, description="Program the SPI flash of xwb_xc7_fw_update")
+    bus = parser.add_mutually_exclusive_group(required=True)
+    bus.add_argument("--mmap", metavar="FILE", help="mapped file of the bus (PCIe resource, /dev/mem)")
+    bus.add_argument("--sim", metavar="IMAGE", help="simulated flash with the content of IMAGE")
+    parser.add_argument("--offset", type=_int, default=0, help="offset of the core in the mapped file")
+    parser.add_argument("--sim-size", type=_int, default=16 << 20,
+                        help="size of a new simulated flash (default is 16 MiB)")
+    parser.add_argument("--sim-fifo", type=_int, default=0,
+                        help="FIFO depth of the simulated core (default is 0, no burst mode)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--burst", dest="burst", action="store_true", default=None,
+                      help="the core has the burst mode (default is to probe it)")
+    mode.add_argument("--no-burst", dest="burst", action="store_false")
+    parser.add_argument("--fifo", type=_int, default=256,
+                        help="bytes received at most at once in burst mode (default is"
+                             " 256, and at most the FIFO depth read from the core)")
+    parser.add_argument("--addr-bytes", type=int, choices=(3, 4), default=3,
+                        help="address bytes of the flash commands (default is 3)")
+    parser.add_argument("--sector", type=_int, default=0x10000,
+                        help="erase sector size (default is 64 KiB)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print the accesses to the core")
+    sub = parser.add_subparsers(dest="cmd")
+    sub.required = True
+    sub.add_parser("id", help="print the JEDEC id of the flash")
+    p = sub.add_parser("read", help="read the flash")
+    p.add_argument("address", type=_int)
+    p.add_argument("size", type=_int)
+    p.add_argument("-o", "--output", required=True, help="output file")
+    for name, text in (("program", "program an image"), ("verify", "compare the flash to an image")):
+        p = sub.add_parser(name, help=text)
+        p.add_argument("image", help="raw binary image")
+        p.add_argument("-a", "--address", type=_int, default=0, help="flash address of the image")
+        if name == "program":
+            p.add_argument("--no-skip", action="store_true",
+                           help="write all the sectors, even those with the right content")
+            p.add_argument("--crc-cache", help="file of the CRCs of the sectors written")
+    args = parser.parse_args()
+
+    start = time.time()
+    sim = None
+    try:
+        if args.sim:
+            if os.path.exists(args.sim):
+                with open(args.sim, "rb") as f:
+                    sim = bytearray(f.read())
+            else:
+                sim = bytearray(b"\xff" * args.sim_size)
+            backend = SimCore(FlashModel(sim, args.addr_bytes, sector=args.sector), args.sim_fifo)
+        else:
+            backend = wb_regs.MmapBackend(args.mmap, args.offset, Regs._size)
+        backend = wb_regs.Counter(backend)
+        spi = Spi(backend, burst=args.burst, fifo=args.fifo)
+        flash = Flash(spi, args.addr_bytes, sector=args.sector)
+        ident = flash.id().hex()
+        if args.cmd == "id":
+            print(ident)
+        elif args.cmd == "read":
+            data = flash.read(args.address, args.size)
+            with open(args.output, "wb") as f:
+                f.write(data)
+        else:
+            with open(args.image, "rb") as f:
+                image = f.read()
+            if args.cmd == "verify":
+                bad = []
+                for a in range(0, len(image), args.sector):
+                    part = image[a:a + args.sector]
+                    if flash.read(args.address + a, len(part)) != part:
+                        bad.append(args.address + a)
+                if bad:
+                    raise FlashError("{} sectors differ, the first at {:#x}".format(len(bad), bad[0]))
+                print("{} bytes verified".format(len(image)))
+            else:
+                cache = None
+                if args.crc_cache:
+                    cache = load_cache(args.crc_cache, ident, args.sector)
+                try:
+                    stats = program(flash, image, args.address, not args.no_skip, cache)
+                finally:
+                    if args.crc_cache:
+                        save_cache(args.crc_cache, ident, args.sector, cache)
+                print("{sectors} sectors: {skipped} skipped, {erased} erased, "
+                      "{pages} pages programmed".format(**stats))
+        if args.verbose:
+            mode = "burst (FIFO depth {})".format(spi.depth) if spi.burst else "direct"
+            print("{} mode, {}, {:.1f}s".format(mode, backend, time.time() - start))
+    except (FlashError, wb_regs.RegsError, IOError, OSError) as e:
+        print("{}: {}".format(PROG, e), file=sys.stderr)
+        return 1
+    finally:
+        if sim is not None and args.cmd not in ("id", "read", "verify"):
+            with open(args.sim, "wb") as f:
+                f.write(sim)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
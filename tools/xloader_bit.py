@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# Bitstream loader for wb_xilinx_fpga_loader
+#
+# The input is a .bit file of bitgen (its header, with the design and part
+# names, is stripped) or a raw image (.bin).  The core shifts out each word of
+# its FIFO MSB first, which is the bit order of bitgen; images with the bits of
+# each byte reversed (the SelectMAP .bin/.mcs of promgen) are detected by their
+# sync word (AA 99 55 66, or 55 99 AA 66 reversed) and reversed back by table
+# lookup (--bits forces the order).  The bytes are packed into big-endian words
+# (CSR.MSBF set), padded with zeros up to a word.  All this is done with NumPy,
+# on the whole image at once.
+#
+# The CRC-32 (the one of zlib) of the resulting stream is printed by "info" and
+# "convert"; "load --crc" checks it before touching the core, so that a
+# truncated or damaged file does not erase a running FPGA.
+#
+# Loading writes the size field of FIFO_R0 once, then only the data words to
+# FIFO_R1 (each write pushes a word), by chunks of up to the free space of the
+# FIFO (256 words), in one request of the backend each; FIFO_CSR and CSR are
+# read together in one request between two chunks.  The last word goes with its
+# size and XLAST.  The FPGA may raise DONE before the end of the stream (the
+# padding of the bitstream), which ends the load.  --exit then writes
+# CSR.EXIT to start the FPGA.
+#
+# The core is accessed through a mapped file (--mmap, with the offset of the
+# core), or simulated (--sim FILE: a model of the core, whose serial output is
+# written to FILE; --sim-rate gives the words shifted out per access, the ratio
+# of the CCLK rate to the bus rate).  -v prints the id of the core, the count
+# of its accesses and the time taken.
+#
+# Examples:
+#   xloader_bit.py info top.bit
+#   xloader_bit.py convert top.bit -o top.bin
+#   xloader_bit.py --mmap /dev/mem --offset 0x80000 load top.bit --crc 0x1d2e3f40 --exit
+#   xloader_bit.py --sim out.bin -v load top.bit
+
+import argparse
+import os
+import sys
+import time
+import zlib
+
+import numpy as np
+
+import wb_regs
+
+PROG = os.path.basename(__file__)
+
+# Registers (sim/regs/xloader_regs.vh)
+ADDR_CSR = 0x0
+ADDR_IDR = 0xc
+ADDR_FIFO_R0 = 0x10
+ADDR_FIFO_R1 = 0x14
+ADDR_FIFO_CSR = 0x18
+SIZE = 0x20
+
+CSR_START = 1 << 0
+CSR_DONE = 1 << 1
+CSR_ERROR = 1 << 2
+CSR_BUSY = 1 << 3
+CSR_MSBF = 1 << 4
+CSR_SWRST = 1 << 5
+CSR_EXIT = 1 << 6
+CSR_CLKDIV_OFFSET = 8
+CSR_CLKDIV = 0x3f << CSR_CLKDIV_OFFSET
+
+FIFO_R0_XSIZE = 0x3
+FIFO_R0_XLAST = 1 << 2
+FIFO_CSR_FULL = 1 << 16
+FIFO_CSR_EMPTY = 1 << 17
+FIFO_CSR_USEDW = 0xff
+
+# Words of the FIFO of the core (xloader_wb.wb)
+FIFO_DEPTH = 256
+
+BIT_MAGIC = b"\x00\x09\x0f\xf0\x0f\xf0\x0f\xf0\x0f\xf0\x00\x00\x01"
+SYNC = b"\xaa\x99\x55\x66"
+SYNC_REVERSED = b"\x55\x99\xaa\x66"
+
+# Bytes searched for the sync word
+SYNC_SPAN = 1 << 16
+
+# Bit-reversed bytes
+REVERSE = np.array([int("{:08b}".format(i)[::-1], 2) for i in range(256)], dtype=np.uint8)
+
+HEADER_FIELDS = {"a": "design", "b": "part", "c": "date", "d": "time"}
+
+
+class LoaderError(Exception):
+    pass
+
+
+def parse_bit(data):
+    """Header fields and offset of the bitstream of the .bit file DATA, or
+    ({}, 0) for a raw image."""
+    if not data.startswith(BIT_MAGIC):
+        return {}, 0
+    info = {}
+    pos = len(BIT_MAGIC)
+    while True:
+        if pos >= len(data):
+            raise LoaderError("truncated .bit header")
+        key = chr(data[pos])
+        if key == "e":
+            if pos + 5 > len(data):
+                raise LoaderError("truncated .bit header")
+            length = int.from_bytes(data[pos + 1:pos + 5], "big")
+            pos += 5
+            if pos + length > len(data):
+                raise LoaderError("truncated bitstream: {} bytes instead of {}".format(
+                    len(data) - pos, length))
+            info["length"] = length
+            return info, pos
+        if key not in HEADER_FIELDS or pos + 3 > len(data):
+            raise LoaderError("bad .bit header field {!r} at {:#x}".format(key, pos))
+        length = int.from_bytes(data[pos + 1:pos + 3], "big")
+        value = bytes(data[pos + 3:pos + 3 + length]).rstrip(b"\0")
+        info[HEADER_FIELDS[key]] = value.decode(errors="replace")
+        pos += 3 + length
+
+
+def bit_order(payload):
+    """"msb" if PAYLOAD is in the bit order of bitgen, "lsb" if its bytes are
+    reversed."""
+    head = bytes(payload[:SYNC_SPAN])
+    normal, reversed_ = head.find(SYNC), head.find(SYNC_REVERSED)
+    if normal < 0 and reversed_ < 0:
+        raise LoaderError("no sync word in the first {} bytes, use --bits".format(SYNC_SPAN))
+    if reversed_ < 0 or 0 <= normal < reversed_:
+        return "msb"
+    return "lsb"
+
+
+class Bitstream(object):
+    """The stream of the file FNAME for the core: its bytes (STREAM, a uint8
+    array) and words (WORDS, uint32, the last one padded) in the order of
+    the core; BITS is "msb", "lsb" or None to detect it."""
+
+    def __init__(self, fname, bits=None):
+        with open(fname, "rb") as f:
+            data = f.read()
+        self.info, pos = parse_bit(data)
+        if "length" in self.info:
+            data = data[:pos + self.info["length"]]
+        payload = np.frombuffer(data, dtype=np.uint8, offset=pos)
+        if not len(payload):
+            raise LoaderError("{}: empty bitstream".format(fname))
+        self.bits = bits or bit_order(payload)
+        self.stream = REVERSE[payload] if self.bits == "lsb" else payload
+        padded = np.zeros(-(-len(self.stream) // 4) * 4, dtype=np.uint8)
+        padded[:len(self.stream)] = self.stream
+        self.words = padded.view(">u4").astype(np.uint32)
+        self.crc = zlib.crc32(self.stream)
+
+    def __len__(self):
+        return len(self.stream)
+
+
+class Loader(object):
+    """Loading of bitstreams through the core at ADDR of BACKEND, at most
+    CHUNK words at once."""
+
+    def __init__(self, backend, addr=0, chunk=FIFO_DEPTH, clkdiv=0, timeout=5.0):
+        self.backend = backend
+        self.addr = addr
+        self.chunk = max(min(chunk, FIFO_DEPTH), 1)
+        self.clkdiv = clkdiv
+        self.timeout = timeout
+
+    def _poll(self):
+        """Free words of the FIFO and CSR, when there are any or DONE."""
+        deadline = time.time() + self.timeout
+        while True:
+            fifo, csr = self.backend.read_many([self.addr + ADDR_FIFO_CSR, self.addr + ADDR_CSR])
+            free = 0 if fifo & FIFO_CSR_FULL else FIFO_DEPTH - (fifo & FIFO_CSR_USEDW)
+            if free or csr & CSR_DONE:
+                return free, csr
+            if time.time() > deadline:
+                raise LoaderError("timeout waiting for the FIFO")
+
+    def ident(self):
+        return self.backend.read(self.addr + ADDR_IDR)
+
+    def load(self, bitstream):
+        """Reset the core and send BITSTREAM; return the words sent."""
+        words = bitstream.words.tolist()
+        tail = len(bitstream) - 4 * (len(words) - 1)
+        r0, r1 = self.addr + ADDR_FIFO_R0, self.addr + ADDR_FIFO_R1
+        self.backend.write_many([
+            (self.addr + ADDR_CSR, CSR_SWRST),
+            (self.addr + ADDR_CSR, CSR_START | CSR_MSBF | (self.clkdiv << CSR_CLKDIV_OFFSET)),
+            (r0, 3)])
+        sent = 0
+        while sent < len(words):
+            free, csr = self._poll()
+            if csr & CSR_DONE:
+                # DONE before the end: the rest is padding
+                break
+            n = min(free, self.chunk, len(words) - sent)
+            writes = [(r1, w) for w in words[sent:sent + n]]
+            if sent + n == len(words):
+                writes[-1:] = [(r0, (tail - 1) | FIFO_R0_XLAST), writes[-1]]
+            self.backend.write_many(writes)
+            sent += n
+        return sent
+
+    def wait_done(self):
+        """Wait for DONE; raise LoaderError if the core reports an error."""
+        deadline = time.time() + self.timeout
+        while True:
+            csr = self.backend.read(self.addr + ADDR_CSR)
+            if csr & CSR_DONE:
+                break
+            if time.time() > deadline:
+                raise LoaderError("timeout waiting for DONE")
+        if csr & CSR_ERROR:
+            raise LoaderError("configuration failed (DONE/INIT_B timeout)")
+
+    def exit(self):
+        self.backend.write(self.addr + ADDR_CSR, CSR_EXIT | CSR_MSBF
+                           | (self.clkdiv << CSR_CLKDIV_OFFSET))
+
+
+class SimCore(wb_regs.Backend):
+    """Model of wb_xilinx_fpga_loader and of the FPGA: RATE words of the FIFO
+    are shifted out per access, and DONE rises after the words of LENGTH bytes
+    (all of them if None).  The bytes shifted out are in OUTPUT."""
+
+    def __init__(self, rate=1, length=None):
+        self.rate = rate
+        self.length = length
+        self.output = bytearray()
+        self.fifo = []
+        self.head = 0
+        self.csr = 0
+        self.r0 = 0
+        self.active = False
+        self.done = False
+        self.error = False
+
+    def _shift(self):
+        n = min(self.rate, len(self.fifo) - self.head)
+        if not self.active or self.done:
+            n = 0
+        for r0, word in self.fifo[self.head:self.head + n]:
+            size = (r0 & FIFO_R0_XSIZE) + 1
+            if not self.csr & CSR_MSBF:
+                word = int.from_bytes(word.to_bytes(4, "little"), "big")
+            self.output += word.to_bytes(4, "big")[:size]
+            if self.length is not None and len(self.output) >= self.length:
+                self.done = True
+            elif r0 & FIFO_R0_XLAST:
+                self.done = True
+                self.error = self.length is not None
+            if self.done:
+                self.active = False
+                break
+        self.head += n
+        if self.head == len(self.fifo):
+            self.fifo, self.head = [], 0
+
+    def write(self, addr, value):
+        if addr == ADDR_CSR:
+            if value & CSR_SWRST:
+                self.active = self.done = self.error = False
+            if value & CSR_START:
+                self.active = True
+                self.done = self.error = False
+                self.output = bytearray()
+            self.csr = value & (CSR_MSBF | CSR_CLKDIV)
+        elif addr == ADDR_FIFO_R0:
+            self.r0 = value
+        elif addr == ADDR_FIFO_R1:
+            if len(self.fifo) - self.head >= FIFO_DEPTH:
+                raise LoaderError("FIFO overflow (the word would be lost)")
+            self.fifo.append((self.r0, value))
+        self._shift()
+
+    def read(self, addr):
+        self._shift()
+        if addr == ADDR_CSR:
+            return (self.csr | (CSR_DONE if self.done else 0) | (CSR_ERROR if self.error else 0)
+                    | (CSR_BUSY if self.active else 0))
+        if addr == ADDR_IDR:
+            return 0x626f6f74
+        if addr == ADDR_FIFO_CSR:
+            used = len(self.fifo) - self.head
+            return ((used & FIFO_CSR_USEDW) | (FIFO_CSR_FULL if used == FIFO_DEPTH else 0)
+                    | (FIFO_CSR_EMPTY if not used else 0))
+        return 0
+
+
+def _int(v):
+    return int(v, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog=PROG, description="Load bitstreams through wb_xilinx_fpga_loader")
+    bus = parser.add_mutually_exclusive_group()
+    bus.add_argument("--mmap", metavar="FILE", help="mapped file of the bus (PCIe resource, /dev/mem)")
+    bus.add_argument("--sim", metavar="FILE", help="simulated core, its serial output written to FILE")
+    parser.add_argument("--offset", type=_int, default=0, help="offset of the core in the mapped file")
+    parser.add_argument("--sim-rate", type=_int, default=1,
+                        help="words shifted out by the simulated core per access (default is 1)")
+    parser.add_argument("--bits", choices=("msb", "lsb"),
+                        help="bit order of the image: msb (bitgen) or lsb (reversed bytes);"
+                             " default is to find it from the sync word")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print the id of the core, its accesses and the timings")
+    sub = parser.add_subparsers(dest="cmd")
+    sub.required = True
+    p = sub.add_parser("info", help="print the header and the CRC of a bitstream")
+    p.add_argument("bitstream", help=".bit file or raw image")
+    p = sub.add_parser("convert", help="write the stream sent to the FPGA")
+    p.add_argument("bitstream", help=".bit file or raw image")
+    p.add_argument("-o", "--output", required=True, help="output file (.bin)")
+    p = sub.add_parser("load", help="configure the FPGA")
+    p.add_argument("bitstream", help=".bit file or raw image")
+    p.add_argument("--crc", type=_int, help="expected CRC-32 of the stream (see info)")
+    p.add_argument("--chunk", type=_int, default=FIFO_DEPTH,
+                   help="words written at most at once (default is {})".format(FIFO_DEPTH))
+    p.add_argument("--clkdiv", type=_int, default=0,
+                   help="CCLK divider, CCLK = clk_sys / 2 / (CLKDIV + 1) (default is 0)")
+    p.add_argument("--timeout", type=float, default=5.0, help="timeout in seconds (default is 5)")
+    p.add_argument("--exit", action="store_true", help="start the FPGA once DONE")
+    args = parser.parse_args()
+
+    start = time.time()
+    backend = None
+    try:
+        bitstream = Bitstream(args.bitstream, args.bits)
+        prepared = time.time()
+        if args.cmd == "info":
+            for key in ("design", "part", "date", "time"):
+                if key in bitstream.info:
+                    print("{:8} {}".format(key + ":", bitstream.info[key]))
+            print("{:8} {} bytes, {} words".format("stream:", len(bitstream), len(bitstream.words)))
+            print("{:8} {}".format("bits:", "reversed" if bitstream.bits == "lsb" else "msb first"))
+            print("{:8} {:#010x}".format("crc:", bitstream.crc))
+        elif args.cmd == "convert":
+            with open(args.output, "wb") as f:
+                f.write(bitstream.stream.tobytes())
+            print("{}: {} bytes, crc {:#010x}".format(args.output, len(bitstream), bitstream.crc))
+        else:
+            if args.crc is not None and args.crc != bitstream.crc:
+                raise LoaderError("{}: crc {:#010x} instead of {:#010x}".format(
+                    args.bitstream, bitstream.crc, args.crc))
+            if not 0 <= args.clkdiv <= CSR_CLKDIV >> CSR_CLKDIV_OFFSET:
+                raise LoaderError("--clkdiv {} out of range".format(args.clkdiv))
+            if args.sim:
+                backend = SimCore(args.sim_rate, len(bitstream))
+            elif args.mmap:
+                backend = wb_regs.MmapBackend(args.mmap, args.offset, SIZE)
+            else:
+                raise LoaderError("load needs --mmap or --sim")
+            backend = wb_regs.Counter(backend)
+            loader = Loader(backend, chunk=args.chunk, clkdiv=args.clkdiv, timeout=args.timeout)
+            if args.verbose:
+                print("core id {:#010x}".format(loader.ident()))
+            sent = loader.load(bitstream)
+            loader.wait_done()
+            if args.exit:
+                loader.exit()
+            print("{} words of {} sent, DONE".format(sent, len(bitstream.words)))
+            if args.sim:
+                with open(args.sim, "wb") as f:
+                    f.write(backend.backend.output)
+        if args.verbose:
+            if backend is not None:
+                print(backend)
+            print("prepared in {:.3f}s, {:.3f}s in all".format(prepared - start, time.time() - start))
+    except (LoaderError, wb_regs.RegsError, IOError, OSError) as e:
+        print("{}: {}".format(PROG, e), file=sys.stderr)
+        return 1
+    finally:
+        if backend is not None:
+            backend.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
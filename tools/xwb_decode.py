@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# Address decode minimizer for xwb_crossbar
+#
+# xwb_crossbar compares the address of each master with every g_address/g_mask
+# pair: the request of a slave is an AND of all the bits of its mask, and the
+# request of the error slave a NOR of all the slave requests.  With many
+# slaves, or small ones, these comparators are wide and are the critical path
+# of the crossbar.
+#
+# This script builds a minimized prefix tree (crit-bit tree) of the slave
+# addresses: at each node, the slaves are split on the most significant bit
+# where their addresses differ.  The bits on the path of a slave are enough to
+# select it among the other slaves, so they give a sparse mask for g_mask, with
+# the same g_address bits.  A slave keeps its whole mask when a bit of its path
+# is not in the mask of the slave it is split from (masks that are not ranges
+# aligned from the top of the bus).  Such a configuration is a drop-in replacement for
+# xwb_crossbar (it passes f_ranges_ok), but the addresses that are not mapped
+# are decoded as one of the slaves instead of the error slave: use it for
+# buses where only valid addresses are accessed.
+#
+# The script reports, for the original and the sparse masks, the number of
+# compared bits and an estimate of the logic depth with LUT-k (a request is an
+# AND of the compared bits, CYC and STB; the error request adds a NOR of all
+# the requests, or it is built as any function of the decoded bits).  Densely packed
+# maps, such as the auto layout of SDB, need most of their bits anyway: the
+# savings are on sparse maps (wide masks, few slaves per region).
+#
+# The slave map is a JSON file: {"name": "bus", "slaves": [{"name": "uart",
+# "address": "0x100", "mask": "0xff00"}, ...]} (numbers may be strings), or
+# with --sdb a description for sdb_layout.py, decoded as the bus crossbar of
+# xwb_sdb_crossbar (SDB ROM included, as the last slave).
+#
+# Examples:
+#   xwb_decode.py map.json
+#   xwb_decode.py --sdb top.json -o top_decode_pkg.vhd
+
+import argparse
+import json
+import os
+import sys
+
+PROG = os.path.basename(__file__)
+
+ADDRESS_WIDTH = 32  # c_wishbone_address_width
+ADDRESS_MASK = (1 << ADDRESS_WIDTH) - 1
+
+
+class DecodeError(Exception):
+    pass
+
+
+def _int(v):
+    return int(v, 0) if isinstance(v, str) else int(v)
+
+
+def _popcount(v):
+    return bin(v).count("1")
+
+
+def lut_depth(inputs, k):
+    """Levels of LUT-K of a function of INPUTS inputs (a tree of ANDs)."""
+    depth = 0
+    while inputs > 1:
+        inputs = (inputs + k - 1) // k
+        depth += 1
+    return depth
+
+
+def function_depth(inputs, k):
+    """Levels of LUT-K of any function of INPUTS inputs: one level of LUTs,
+    then LUTs used as multiplexers by the remaining inputs."""
+    if inputs <= k:
+        return 1
+    sel = 1
+    while sel + 1 + (2 << sel) <= k:
+        sel += 1
+    return 1 + (inputs - k + sel - 1) // sel
+
+
+def is_disconnected(address, mask):
+    """Slave disabled in xwb_crossbar (all ones address, null mask)."""
+    return (mask | (~address & ADDRESS_MASK)) == 0
+
+
+class Decoder(object):
+    """Decision tree of the slaves (name, address, mask), split on the bits
+    of the address."""
+
+    def __init__(self, slaves):
+        self.slaves = [(name, address & ADDRESS_MASK, mask & ADDRESS_MASK)
+                       for name, address, mask in slaves]
+        self.check()
+        active = [i for i, (_, a, m) in enumerate(self.slaves) if not is_disconnected(a, m)]
+        # Bits tested on the path of each slave
+        self.paths = dict((i, 0) for i in range(len(self.slaves)))
+        self._split(active, 0)
+        self._fix(active)
+
+    def check(self):
+        """Checks of f_ranges_ok."""
+        s = self.slaves
+        for i, (name, a, m) in enumerate(s):
+            if is_disconnected(a, m):
+                continue
+            if a & ~m & ADDRESS_MASK:
+                raise DecodeError("Address bits not in mask; slave #{} ({}) [{:#x}/{:#x}]"
+                                  .format(i, name, a, m))
+            if m & 3:
+                raise DecodeError("Address space smaller than a wishbone register;"
+                                  " slave #{} ({}) [{:#x}/{:#x}]".format(i, name, a, m))
+        for i in range(len(s)):
+            for j in range(i + 1, len(s)):
+                (ni, ai, mi), (nj, aj, mj) = s[i], s[j]
+                if is_disconnected(ai, mi) or is_disconnected(aj, mj):
+                    continue
+                if (mi & mj & (ai ^ aj)) == 0:
+                    raise DecodeError("Address ranges must be distinct (slaves {} ({}) and"
+                                      " {} ({}))".format(i, ni, j, nj))
+
+    def _split(self, idx, path):
+        """Crit-bit tree: split on the most significant bit where the
+        addresses differ."""
+        for i in idx:
+            self.paths[i] |= path
+        if len(idx) <= 1:
+            return
+        diff = 0
+        for i in idx[1:]:
+            diff |= self.slaves[i][1] ^ self.slaves[idx[0]][1]
+        bit = diff.bit_length() - 1
+        zero = [i for i in idx if not self.slaves[i][1] >> bit & 1]
+        one = [i for i in idx if self.slaves[i][1] >> bit & 1]
+        self._split(zero, path | 1 << bit)
+        self._split(one, path | 1 << bit)
+
+    def _fix(self, active):
+        """Keep the whole mask of the slaves that are not distinguished from
+        another one by a bit of both masks (the crit bit of two slaves is in
+        their masks when they are aligned ranges from the top)."""
+        for n, i in enumerate(active):
+            for j in active[n + 1:]:
+                (_, ai, mi), (_, aj, mj) = self.slaves[i], self.slaves[j]
+                if (self.paths[i] & mi & self.paths[j] & mj & (ai ^ aj)) == 0:
+                    self.paths[i] = mi
+                    self.paths[j] = mj
+
+    def sparse(self):
+        """(address, mask) of each slave with the bits of its path only."""
+        res = []
+        for i, (_, a, m) in enumerate(self.slaves):
+            if is_disconnected(a, m):
+                res.append((a, m))
+            else:
+                res.append((a & self.paths[i] & m, self.paths[i] & m))
+        return res
+
+    def stats(self, masks, k):
+        """Compared bits and LUT-K depths of the requests for MASKS."""
+        active = [m for (_, a, _), m in zip(self.slaves, masks)
+                  if not is_disconnected(a, m)]
+        bits = [_popcount(m) for m in active] or [0]
+        union = 0
+        for m in active:
+            union |= m
+        # + CYC and STB
+        depth = max(lut_depth(b + 2, k) for b in bits)
+        # The error request is a function of the decoded bits too
+        error = min(lut_depth(len(active), k) + depth,
+                    function_depth(_popcount(union) + 2, k))
+        return {
+            "max_bits": max(bits),
+            "total_bits": sum(bits),
+            "union_bits": _popcount(union),
+            "request_depth": depth,
+            "error_depth": error,
+        }
+
+    def selects(self, address, masks=None):
+        """Slaves selected by ADDRESS, with MASKS (default is the original
+        ones)."""
+        res = []
+        for i, (_, a, m) in enumerate(self.slaves):
+            if masks is not None:
+                a, m = masks[i]
+            if not is_disconnected(a, m) and address & m == a:
+                res.append(i)
+        return res
+
+
+def load_map(fname, sdb=False):
+    """(name, [(slave name, address, mask)]) of the slave map FNAME."""
+    if sdb:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import sdb_layout
+        try:
+            plan = sdb_layout.Plan(fname)
+        except sdb_layout.SdbError as e:
+            raise DecodeError(str(e))
+        names = [plan.names[i] for i in sorted(plan.slave_index)] + ["SDB ROM"]
+        return plan.name, list(zip(names, plan.address, plan.mask))
+    with open(fname) as f:
+        desc = json.load(f)
+    slaves = [(s.get("name", str(i)), _int(s["address"]), _int(s["mask"]))
+              for i, s in enumerate(desc["slaves"])]
+    return desc.get("name", "bus"), slaves
+
+
+def _ident(s):
+    res = "".join(c if c.isalnum() else "_" for c in s.strip().lower())
+    return res.strip("_") or "bus"
+
+
+def write_package(name, dec, sparse, fname, package=None, source=None):
+    """VHDL package of the sparse g_address/g_mask."""
+    package = package or "{}_decode_pkg".format(_ident(name))
+    p = "c_" + _ident(name)
+    n = len(sparse)
+    lines = [
+        "-- Generated by {}{}; do not edit".format(
+            PROG, " from " + os.path.basename(source) if source else ""),
+        "",
+        "library ieee;",
+        "use ieee.std_logic_1164.all;",
+        "",
+        "use work.wishbone_pkg.all;",
+        "",
+        "package {} is".format(package),
+        "",
+        "  -- Sparse g_address/g_mask of xwb_crossbar: the addresses that are not",
+        "  -- mapped are decoded as one of the slaves, not as the error slave.",
+    ]
+    for what, k in (("address", 0), ("mask", 1)):
+        lines.append("  constant {}_{} : t_wishbone_address_array({} downto 0) := (".format(
+            p, what, n - 1))
+        for i, v in enumerate(sparse):
+            sep = "," if i < n - 1 else ");"
+            comment = "  -- {}".format(dec.slaves[i][0]) if k == 0 else ""
+            lines.append('    {} => x"{:08x}"{}{}'.format(i, v[k], sep, comment))
+    lines += ["", "end package {};".format(package)]
+    with open(fname, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog=PROG, description="Minimize the address decode of an xwb_crossbar")
+    parser.add_argument("map", help="JSON slave map (or SDB description with --sdb)")
+    parser.add_argument("--sdb", action="store_true",
+                        help="the map is a description for sdb_layout.py")
+    parser.add_argument("-k", "--lut", type=int, default=6,
+                        help="number of LUT inputs for the depth estimate (default is 6)")
+    parser.add_argument("-o", "--output", help="write the sparse masks as a VHDL package")
+    parser.add_argument("-p", "--package", help="package name (default is <name>_decode_pkg)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print the masks")
+    args = parser.parse_args()
+
+    try:
+        name, slaves = load_map(args.map, args.sdb)
+        dec = Decoder(slaves)
+    except (DecodeError, ValueError, KeyError, OSError) as e:
+        print("{}: {}: {}".format(PROG, args.map, e), file=sys.stderr)
+        return 1
+    sparse = dec.sparse()
+    before = dec.stats([m for _, _, m in dec.slaves], args.lut)
+    after = dec.stats([m for _, m in sparse], args.lut)
+
+    print("{}: {} slaves".format(name, len(slaves)))
+    if args.verbose:
+        for (sname, a, m), (sa, sm) in zip(dec.slaves, sparse):
+            print("  {:<24} {:#010x}/{:#010x} -> {:#010x}/{:#010x}".format(sname, a, m, sa, sm))
+    print("{:<28} {:>8} {:>8}".format("", "masks", "sparse"))
+    for key, label in (("max_bits", "compared bits (max)"),
+                       ("total_bits", "compared bits (total)"),
+                       ("union_bits", "decoded address bits"),
+                       ("request_depth", "request depth (LUT{})".format(args.lut)),
+                       ("error_depth", "error depth (LUT{})".format(args.lut))):
+        print("{:<28} {:>8} {:>8}".format(label, before[key], after[key]))
+    print("{} LUT levels saved on the error slave, {} on the slave requests".format(
+        before["error_depth"] - after["error_depth"],
+        before["request_depth"] - after["request_depth"]))
+    if args.output:
+        write_package(name, dec, sparse, args.output, args.package, args.map)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())